@@ -1,5 +1,4 @@
 import random
-import configparser
 from pathlib import Path
 from itertools import count
 from collections import deque
@@ -11,7 +10,12 @@ import torch
 import torch.optim as optim
 import torch.multiprocessing as mp
 
+import utils
+import profiling
 from fc import FCAC
+from evaluation import VectorizedEvaluator, greedy_discrete
+
+tm = utils.TELEMETRY
 
 
 class MultiprocessEnv(object):
@@ -37,11 +41,12 @@ class MultiprocessEnv(object):
     def work(self, worker_id, child_process):
         seed = self.seed + worker_id
         env = gym.make(self.env_name)
+        env.reset(seed=seed)  # seed once, later resets continue the same random sequence
 
         # Execute the received command 
         while True:
             cmd, kwargs = child_process.recv()
-            if cmd == 'reset': child_process.send(env.reset(seed=seed)[0])
+            if cmd == 'reset': child_process.send(env.reset()[0])
             elif cmd == 'step': child_process.send(env.step(**kwargs))
             else:
                 env.close()
@@ -62,7 +67,7 @@ class MultiprocessEnv(object):
         if worker_id is not None:
             main_process, _ = self.pipes[worker_id]
             self.send_msg(('reset', {}), worker_id)
-            state = main_process.recv()[0]
+            state = main_process.recv()
             return state
         
         self.broadcast_msg(('reset', {}))
@@ -86,13 +91,13 @@ class MultiprocessEnv(object):
             main_process, _ = self.pipes[worker_id]
             state, reward, done, info, _ = main_process.recv()
             results.append(
-                (state, np.array(reward, dtype=np.float), np.array(done, dtype=np.float), info)
+                (state, np.array(reward, dtype=np.float64), np.array(done, dtype=np.float64), info)
             )
         
         # return array of 2d arrays.
         # index 0 contains 2d arrays of states
         # index 1 contains 2d arrays of rewards ... 
-        return [np.vstack(block) for block in np.array(results).T]
+        return [np.vstack(block) for block in np.array(results, dtype=object).T]
     
 
     def close(self):
@@ -136,10 +141,13 @@ class A2C():
 
     def interact_with_environment(self, states, mp_env):
        # Infer on batch of states
-        actions, logpas, entropies, values = self.ac_model.full_pass(states)
+        with tm.timer("action_selection"):
+            actions, logpas, entropies, values = self.ac_model.full_pass(states)
 
         # send the 'step' cmd from main process to child process
-        new_states, rewards, dones, _ = mp_env.step(actions)
+        with tm.timer("env_step"):
+            new_states, rewards, dones, _ = mp_env.step(actions)
+        tm.count("env_steps", self.n_workers)
 
         self.logpas.append(logpas)
         self.entropies.append(entropies)
@@ -216,9 +224,11 @@ class A2C():
                 self.entropy_loss_weight * entropy_loss        
 
         self.optimizer.zero_grad()
-        loss.backward()
+        with tm.timer("backward"):
+            loss.backward()
         torch.nn.utils.clip_grad_norm_(self.ac_model.parameters(), self.max_grad)
-        self.optimizer.step()
+        with tm.timer("optimizer_step"):
+            self.optimizer.step()
 
 
     def evaluate_one_episode(self, env, seed):
@@ -250,13 +260,7 @@ class A2C():
 
 if __name__ == "__main__":
     
-    folder = Path("/home/medhyvinceslas/Documents/courses/gdrl_rl_spe/deep_rl/policy_based_and_ac")
-    config_file = folder / "config.ini"
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    
-    conf = config["DEFAULT"]
-    conf_a2c = config["A2C"]
+    folder, conf, conf_a2c, device = utils.get_project_configuration(project_id="A2C")
 
     seed = conf.getint("seed")
     model_path = Path(folder / conf_a2c.get("model_name"))
@@ -274,8 +278,8 @@ if __name__ == "__main__":
     np.random.seed(seed)
     random.seed(seed)
 
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     agent = A2C(conf_a2c, seed, device)
+    utils.start_telemetry(folder, conf, "A2C")
     
     
 
@@ -290,13 +294,22 @@ if __name__ == "__main__":
         
         episode, n_steps_start = 0, 0
         max_n_steps = conf_a2c.getint("max_n_steps")
-        evaluation_scores = deque(maxlen=100)
+        evaluation_scores = deque(maxlen=100)  # returns of the last 100 evaluation episodes
+        learning_curve = []
         goal_mean_100_reward = conf_a2c.getint("goal_mean_100_reward")
+        n_episodes = conf_a2c.getint("n_episodes", fallback=None)  # None: until the goal is reached
+
+        # evaluate every eval_every finished episodes (of all the workers)
+        eval_every, last_eval_episode = conf_a2c.getint("eval_every", fallback=1), 0
+        evaluator = VectorizedEvaluator(lambda: gym.make(env_name),
+                                        conf_a2c.getint("n_eval_episodes", fallback=1), seed)
+        profiler = profiling.from_config(folder, conf, "A2C")
         
         # n-step Advantage Estimate :  Aᴳᴬᴱ(Sₜ, Aₜ) = ∑ λⁿ Rₜ₊ₙ - V(Sₜ)
 
         agent.reset_metrics()
         for t_step in count(start=1):
+            profiler.step()
             # ---- From here, everything is stacked (2d arrays of n rows = n_workers)
             states, dones = agent.interact_with_environment(states, mp_env)
 
@@ -306,29 +319,48 @@ if __name__ == "__main__":
                 agent.rewards.append(next_values)  #  ∑ Rₜ₊ₙ + V(Sₜ₊ₙ)
                 agent.values.append(torch.Tensor(next_values))
 
-                agent.learn()
+                with tm.timer("learn"):
+                    agent.learn()
+                tm.count("updates")
 
                 agent.reset_metrics()
                 n_steps_start = t_step
             
             if dones.sum() != 0.:  # at least one worker is done
-                mean_eval_score, _ = agent.evaluate_one_episode(env_eval, seed)
-                evaluation_scores.append(mean_eval_score)
-                mean_100_eval_score = np.mean(evaluation_scores)
-                print(f"Episode {episode}\tAverage mean 100 eval score: {mean_100_eval_score}")
-
-                if mean_100_eval_score >= goal_mean_100_reward:
-                    torch.save(agent.ac_model.state_dict(), model_path)
-                    break
-
                 # reset state of done workers so they can restart collecting while others continue.
                 for i in range(agent.n_workers):
                     if dones[i]:
                         states[i] = mp_env.reset(worker_id=i)
                         episode += 1
+                        tm.count("episodes")
 
+                training_done = n_episodes is not None and episode >= n_episodes
+
+                if episode - last_eval_episode >= eval_every or training_done:
+                    last_eval_episode = episode
+                    with tm.timer("evaluation"):
+                        scores = evaluator.evaluate(greedy_discrete(agent.ac_model))
+                    evaluation_scores.extend(scores["returns"])
+                    learning_curve.append(scores["mean"])
+                    mean_100_eval_score = np.mean(evaluation_scores)
+                    print(f"Episode {episode}\tAverage mean 100 eval score: {mean_100_eval_score}\t"
+                          f"(last eval: {scores['mean']:.1f} ± {scores['std']:.1f})")
+
+                    if mean_100_eval_score >= goal_mean_100_reward:
+                        torch.save(agent.ac_model.state_dict(), model_path)
+                        break
+
+                if training_done:
+                    torch.save(agent.ac_model.state_dict(), model_path)
+                    break
+
+        profiler.close()
+        evaluator.close()
+        utils.save_learning_curve(conf, learning_curve)
         mp_env.close()
 
+    tm.close()
+
 
     
 
@@ -0,0 +1,100 @@
+"""
+Import-time benchmark of the entry points.
+
+Each module is imported in a fresh interpreter (as a worker process or a short evaluation job
+would do) with `python -X importtime`, so nothing is cached between measures. For each module we
+report the wall time of the import, the heaviest imported packages, and fail if:
+- a heavy optional dependency (pybullet, plotting) is imported although it is only needed on
+  specific code paths
+- the import takes more than --target-ms, when given (importing torch alone takes 2 to 3 s on
+  a small CPU machine, so no target is set by default)
+
+python bench_imports.py --target-ms 4000
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+FOLDER = Path(__file__).parent
+
+ENTRY_POINTS = (
+    "utils", "fc", "recorder", "evaluation", "profiling", "reinforce", "vanilla_policy_gradient", "a2c", "ppo", "impala",
+    "ddpg", "td3", "sac",
+)
+
+# must not be imported just by importing an entry point
+LAZY_MODULES = ("pybullet_envs", "pybullet", "matplotlib", "imageio_ffmpeg")
+
+
+def parse_importtime(stderr, max_depth=1):
+    """
+    Return {package: cumulative time in ms} from -X importtime output, for the packages (not
+    their submodules) imported at most max_depth levels below the top: with the default, the
+    measured module and its direct imports. Deeper imports are already in the cumulative time of
+    their parent, counting them too would count them twice.
+    """
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumul_us, field = line[len("import time:"):].split("|")
+        # the name follows one space, plus 2 spaces per nesting level (tested before stripping)
+        depth = (len(field) - len(field.lstrip(" ")) - 1) // 2
+        name = field.strip()
+        if depth > max_depth or "." in name:
+            continue
+        cumulative[name] = max(cumulative.get(name, 0), int(cumul_us) / 1000.)
+    return cumulative
+
+
+def measure(module, python=sys.executable):
+    code = (
+        "import sys, time, json; t = time.perf_counter(); "
+        f"import {module}; "
+        "wall = (time.perf_counter() - t) * 1000; "
+        f"print(json.dumps({{'wall_ms': wall, 'lazy': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))"
+    )
+    out = subprocess.run(
+        [python, "-X", "importtime", "-c", code], cwd=FOLDER, capture_output=True, text=True)
+
+    if out.returncode != 0:
+        return {"module": module, "error": out.stderr.strip().splitlines()[-1]}
+
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["module"] = module
+    result["packages"] = parse_importtime(out.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--target-ms", type=float, default=None, help="fail above this import time (opt-in)")
+    parser.add_argument("--top", type=int, default=5, help="number of heaviest packages shown")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        r = measure(module)
+
+        if "error" in r:
+            print(f"{module:<25} ERROR {r['error']}")
+            failures.append(module)
+            continue
+
+        packages = {k: v for k, v in r["packages"].items() if k != module}
+        heaviest = sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]
+        heaviest = ", ".join(f"{name} {ms:.0f}ms" for name, ms in heaviest)
+        print(f"{module:<25} {r['wall_ms']:8.1f} ms   [{heaviest}]")
+
+        if args.target_ms is not None and r["wall_ms"] > args.target_ms:
+            print(f"{'':<25} over the target of {args.target_ms:.0f} ms")
+            failures.append(module)
+        if r["lazy"]:
+            print(f"{'':<25} eagerly imports {', '.join(r['lazy'])}")
+            failures.append(module)
+
+    sys.exit(1 if failures else 0)
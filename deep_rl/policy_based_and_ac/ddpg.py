@@ -11,7 +11,12 @@ import torch
 import torch.optim as optim
 
 import utils
+import profiling
 from fc import FCQV, FCDP
+from recorder import FrameRecorder
+from evaluation import VectorizedEvaluator, greedy_continuous
+
+tm = utils.TELEMETRY
 
 """
 Advanced AC methods: DDPG
@@ -65,7 +70,7 @@ class DDPG:
 
         self.training_strategy = utils.NormalNoiseStrategyContinuous(action_bounds,
                                                                      exploration_noise_ratio=0.1)
-        self.eval_strategy = utils.configparser(action_bounds)
+        self.eval_strategy = utils.GreedyStrategyContinuous(action_bounds)
     
     
     def interact_with_environment(self, state, env):
@@ -73,11 +78,14 @@ class DDPG:
 
         use_max_exploration = len(self.memory) < min_samples
 
-        action = self.training_strategy.select_action(self.actor,
-                                                      state,
-                                                      use_max_exploration)
+        with tm.timer("action_selection"):
+            action = self.training_strategy.select_action(self.actor,
+                                                          state,
+                                                          use_max_exploration)
         
-        next_state, reward, is_terminal, is_truncated, info = env.step(action)
+        with tm.timer("env_step"):
+            next_state, reward, is_terminal, is_truncated, info = env.step(action)
+        tm.count("env_steps")
         is_failure = is_terminal or is_truncated
 
         experience = (state, action, reward, next_state, float(is_failure))
@@ -89,7 +97,8 @@ class DDPG:
 
 
     def sample_and_learn(self):
-        states, actions, rewards, next_states, is_terminals = self.memory.sample(self.device)
+        with tm.timer("sample"):
+            states, actions, rewards, next_states, is_terminals = self.memory.sample(self.device)
         
         # update the critic: Li(θ) = ( r + γQ(s′,μ(s′; ϕ); θ) − Q(s,a;θi) )^2
 
@@ -102,9 +111,11 @@ class DDPG:
         critic_loss = error.pow(2).mul(0.5).mean()
 
         self.critic_optimizer.zero_grad()
-        critic_loss.backward()
+        with tm.timer("backward"):
+            critic_loss.backward()
         torch.nn.utils.clip_grad_norm_(self.critic.parameters(), self.max_grad)
-        self.critic_optimizer.step()
+        with tm.timer("optimizer_step"):
+            self.critic_optimizer.step()
 
         # update the actor: Li(ϕ) = -1/N * sum of Q(s, μ(s; ϕi); θi) 
           
@@ -113,9 +124,11 @@ class DDPG:
 
         actor_loss = -Q_pred.mean()
         self.actor_optimizer.zero_grad()
-        actor_loss.backward()
+        with tm.timer("backward"):
+            actor_loss.backward()
         torch.nn.utils.clip_grad_norm_(self.actor.parameters(), self.max_grad)        
-        self.actor_optimizer.step()
+        with tm.timer("optimizer_step"):
+            self.actor_optimizer.step()
  
 
     def evaluate_one_episode(self, env, seed):
@@ -150,29 +163,15 @@ class DDPG:
             if self.tau is None:
                 raise Exception("You are using Polyak averaging but TAU is None")
             
-            # mixe value networks
-            for t, b in zip(self.critic_target.parameters(), self.critic.parameters()):
-                target_ratio = (1.0 - self.tau) * t.data
-                behavior_ratio = self.tau * b.data
-                mixed_weights = target_ratio + behavior_ratio
-                t.data.copy_(mixed_weights.data)
-            
-            # mix policy networks
-            for t, b in zip(self.actor_target.parameters(), self.actor.parameters()):
-                target_ratio = (1.0 - self.tau) * t.data
-                behavior_ratio = self.tau * b.data
-                mixed_weights = target_ratio + behavior_ratio
-                t.data.copy_(mixed_weights.data)
+            utils.polyak_update(self.critic_target, self.critic, self.tau)
+            utils.polyak_update(self.actor_target, self.actor, self.tau)
         else:
             """
             target network was frozen during n steps, now we are update it with the behavior network
             weight.
             """
-            for t, b in zip(self.critic_target.parameters(), self.critic.parameters()):
-                t.data.copy_(b.data)
-            
-            for t, b in zip(self.actor_target.parameters(), self.actor.parameters()):
-                t.data.copy_(b.data)
+            utils.polyak_update(self.critic_target, self.critic, 1.)
+            utils.polyak_update(self.actor_target, self.actor, 1.)
 
 
 if __name__ == "__main__":
@@ -196,21 +195,28 @@ if __name__ == "__main__":
 
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     agent = DDPG(action_bounds, conf_project, seed, device)
+    utils.start_telemetry(folder, conf_default, "DDPG")
 
     if is_evaluation:
         agent.actor.load_state_dict(torch.load(model_path))
         eval_strategy = utils.GreedyStrategyContinuous(action_bounds)
-        total_rewards, frames = utils.inference(agent.actor, env, seed, eval_strategy)
-        utils.save_frames_as_gif(frames, filepath=str(folder / "gifs/ddpg.gif"))
+        with FrameRecorder(folder / "gifs/ddpg.gif", fps=60) as recorder:
+            total_rewards = utils.inference(agent.actor, env, seed, eval_strategy, recorder)
     else:
 
-        last_100_score = deque(maxlen=100)
-        mean_of_last_100 = deque(maxlen=100)
+        last_100_score = deque(maxlen=100)  # returns of the last 100 evaluation episodes
+        learning_curve = []
+
+        eval_every = conf_project.getint("eval_every", fallback=1)
+        evaluator = VectorizedEvaluator(lambda: gym.make(env_name),
+                                        conf_project.getint("n_eval_episodes", fallback=1), seed)
+        profiler = profiling.from_config(folder, conf_default, "DDPG")
 
         for i_episode in range(1, n_episodes + 1):
             state, is_terminal = env.reset(seed=seed)[0], False
 
             for t_step in count():
+                profiler.step()
                 state, action, reward, next_state, is_terminal = (
                         agent.interact_with_environment(state, env)
                 )
@@ -218,26 +224,42 @@ if __name__ == "__main__":
                 state = next_state
 
                 if len(agent.memory) > agent.memory.batch_size * agent.n_warmup_batches:
-                    agent.sample_and_learn()
-                    agent.sync_weights(use_polyak_averaging=True)
+                    with tm.timer("sample_and_learn"):
+                        agent.sample_and_learn()
+                    tm.count("updates")
+                    with tm.timer("target_sync"):
+                        agent.sync_weights(use_polyak_averaging=True)
                 
                 if is_terminal: break
             
+            tm.count("episodes")
+            training_done = i_episode >= n_episodes
+            if i_episode % eval_every != 0 and not training_done: continue  # always evaluate the last episode
+
             # Evaluate
-            total_rewards = agent.evaluate_one_episode(env, seed=seed)
-            last_100_score.append(total_rewards)
+            with tm.timer("evaluation"):
+                scores = evaluator.evaluate(greedy_continuous(agent.actor, action_bounds))
+            last_100_score.extend(scores["returns"])
+            learning_curve.append(scores["mean"])
             
             if len(last_100_score) >= 100:
                 mean_100_score = np.mean(last_100_score)
-                print(f"Episode {i_episode}\tAverage mean 100 eval score: {mean_100_score}")
+                print(f"Episode {i_episode}\tAverage mean 100 eval score: {mean_100_score}\t"
+                      f"(last eval: {scores['mean']:.1f} ± {scores['std']:.1f}, "
+                      f"p5 {scores['p5']:.1f}, p95 {scores['p95']:.1f})")
             
                 if(mean_100_score >= goal_mean_100_reward):
                     torch.save(agent.actor.state_dict(), model_path)
                     break
             else:
                 print(f"Length eval score: {len(last_100_score)}")
-    
+
+        profiler.close()
+        evaluator.close()
+        utils.save_learning_curve(conf_default, learning_curve)
         env.close()
 
+    tm.close()
+
 
 
@@ -0,0 +1,126 @@
+import numpy as np
+import torch
+
+"""
+Vectorized evaluation harness.
+
+Instead of running a single greedy episode after each training episode (on the training env for
+DDPG), N evaluation episodes are run in N separate env instances stepped in lockstep. At each
+step, the states of the still running episodes are stacked and the greedy actions are selected
+with a single batched forward pass.
+
+The evaluation envs are created once and reset with fixed seeds (seed, seed+1, ..., seed+N-1),
+so every evaluation of a run is done on the same episodes and the scores are comparable.
+"""
+
+
+def reset_env(env, seed):
+    """Reset an env with the gym >= 0.26 API (obs, info) or the old one (obs)"""
+    try:
+        out = env.reset(seed=seed)
+    except TypeError:  # old API (pybullet envs): no seed argument on reset
+        env.seed(seed)
+        out = env.reset()
+    return out[0] if isinstance(out, tuple) else out
+
+
+def step_env(env, action):
+    """Step an env with the 5-tuple API or the old 4-tuple one, return (s, r, terminal, truncated)"""
+    out = env.step(action)
+    if len(out) == 5:
+        s, r, terminal, truncated, _ = out
+    else:
+        s, r, done, info = out
+        truncated = info.get("TimeLimit.truncated", False)
+        terminal = done and not truncated
+    return s, r, terminal, truncated
+
+
+def greedy_discrete(model):
+    """Greedy actions of a policy outputting logits (FCDAP) or (logits, value) (FCAC)"""
+    def select_actions(states):
+        states = torch.as_tensor(states, device=model.device, dtype=torch.float32)
+        with torch.no_grad():
+            out = model(states)
+        logits = out[0] if isinstance(out, tuple) else out
+        return logits.argmax(dim=-1).cpu().numpy()
+    return select_actions
+
+
+def greedy_continuous(model, bounds):
+    """Actions of a deterministic policy (FCDP), clipped to the action bounds"""
+    low, high = bounds
+    def select_actions(states):
+        states = torch.as_tensor(states, device=model.device, dtype=torch.float32)
+        with torch.no_grad():
+            actions = model(states).cpu().numpy()
+        return np.clip(actions, low, high)
+    return select_actions
+
+
+def greedy_gaussian(model):
+    """Mean actions of a Gaussian policy (FCGP), squashed and rescaled to the action bounds"""
+    def select_actions(states):
+        states = torch.as_tensor(states, device=model.device, dtype=torch.float32)
+        with torch.no_grad():
+            mean, _ = model(states)
+            actions = torch.tanh(mean) * model.action_scale + model.action_bias
+        return actions.cpu().numpy()
+    return select_actions
+
+
+def summarize(returns):
+    return {
+        "mean": float(np.mean(returns)),
+        "std": float(np.std(returns)),
+        "min": float(np.min(returns)),
+        "p5": float(np.percentile(returns, 5)),
+        "p25": float(np.percentile(returns, 25)),
+        "median": float(np.median(returns)),
+        "p75": float(np.percentile(returns, 75)),
+        "p95": float(np.percentile(returns, 95)),
+        "max": float(np.max(returns)),
+        "returns": returns.tolist(),
+    }
+
+
+class VectorizedEvaluator():
+    """
+    - env_fn: factory returning a new evaluation env (never the training env)
+    - n_episodes: number of evaluation episodes, one env instance each
+    """
+
+    def __init__(self, env_fn, n_episodes, seed):
+        self.n_episodes = n_episodes
+        self.seeds = [seed + i for i in range(n_episodes)]
+        self.envs = [env_fn() for _ in range(n_episodes)]
+
+    def evaluate(self, select_actions, max_steps=None):
+        """
+        Run the N episodes until they are all done. select_actions maps a batch of states [n, nS]
+        to a batch of actions, it is only called on the episodes still running.
+        """
+        states = np.stack([reset_env(env, seed) for env, seed in zip(self.envs, self.seeds)])
+        returns = np.zeros(self.n_episodes)
+        running = np.ones(self.n_episodes, dtype=bool)
+
+        t = 0
+        while running.any():
+            idx = np.flatnonzero(running)
+            actions = select_actions(states[idx])
+
+            for i, action in zip(idx, actions):
+                s, r, terminal, truncated = step_env(self.envs[i], action)
+                states[i] = s
+                returns[i] += r
+                if terminal or truncated:
+                    running[i] = False
+
+            t += 1
+            if max_steps is not None and t >= max_steps: break
+
+        return summarize(returns)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
@@ -213,6 +213,15 @@ class FCAC(nn.Module):  # Fully connected actor-critic A2C (Discrete action)
         return value
 
 
+    def get_predictions(self, states, actions):
+        """Log probabilities and entropies of given actions, and state-values, for a batch"""
+        logits, values = self.forward(states)
+        dist = torch.distributions.Categorical(logits=logits)
+        logpas = dist.log_prob(actions)
+        entropies = dist.entropy()
+        return logpas, entropies, values.squeeze(-1)
+
+
 class FCQV(nn.Module):  # Fully connected Q-function Q(s, a)
 
     def __init__(self, device, in_dim, out_dim, hidden_dims=(32,32), activation_fc=F.relu):
@@ -323,6 +332,91 @@ class FCDP(nn.Module):  # fully connected deterministic policy (for continous ac
         return self.rescale_fn(x)
 
 
+class FCGP(nn.Module):  # fully connected Gaussian policy (for continous action, used in SAC)
+    def __init__(
+            self, device, in_dim, action_bounds,
+            hidden_dims=(32,32), activation_fc=F.relu, log_std_min=-20, log_std_max=2):
+        """
+        Stochastic policy: output the mean and the log standard deviation of a Gaussian per action
+        dimension. Actions are sampled from the Gaussian, squashed with tanh into (-1, 1) then
+        rescaled to the action bounds.
+        """
+        super(FCGP, self).__init__()
+
+        self.device = device
+        self.activation_fc = activation_fc
+        self.log_std_min = log_std_min
+        self.log_std_max = log_std_max
+
+        self.lower, self.upper = action_bounds
+        nA = len(self.upper)
+
+        self.input_layer = nn.Linear(in_dim, hidden_dims[0])
+        self.hidden_layers = nn.ModuleList()
+
+        for i in range(len(hidden_dims)-1):
+            hidden_layer = nn.Linear(hidden_dims[i], hidden_dims[i+1])
+            self.hidden_layers.append(hidden_layer)
+
+        self.output_layer_mean = nn.Linear(hidden_dims[-1], nA)
+        self.output_layer_log_std = nn.Linear(hidden_dims[-1], nA)
+        self.to(self.device)
+
+        self.lower = torch.tensor(self.lower, device=self.device, dtype=torch.float32)
+        self.upper = torch.tensor(self.upper, device=self.device, dtype=torch.float32)
+
+        # tanh outputs are in range (-1, 1): action = tanh(u) * scale + bias
+        self.action_scale = (self.upper - self.lower) / 2.
+        self.action_bias = (self.upper + self.lower) / 2.
+
+    def _format(self, state):
+        x = state
+        if not isinstance(x, torch.Tensor):
+            x = torch.tensor(x, device=self.device, dtype=torch.float32)
+            x = x.unsqueeze(0)
+        return x
+
+    def forward(self, state):
+        x = self._format(state)
+        x = self.activation_fc(self.input_layer(x))
+
+        for hidden_layer in self.hidden_layers:
+            x = self.activation_fc(hidden_layer(x))
+
+        mean = self.output_layer_mean(x)
+        log_std = self.output_layer_log_std(x).clamp(self.log_std_min, self.log_std_max)
+        return mean, log_std
+
+    def full_pass(self, state):
+        """
+        Sample a batch of actions with the reparameterization trick and return their log
+        probabilities, everything stays on the device.
+        """
+        mean, log_std = self.forward(state)
+
+        dist = torch.distributions.Normal(mean, log_std.exp())
+        u = dist.rsample()  # rsample keeps the gradient flowing through the sampled action
+        action = torch.tanh(u) * self.action_scale + self.action_bias
+
+        # change of variable of the tanh squashing: log π(a|s) = log μ(u|s) - ∑ log(scale * (1 - tanh²(u)))
+        # with log(1 - tanh²(u)) = 2 * (log(2) - u - softplus(-2u)), numerically stable
+        log_1_minus_tanh_sq = 2. * (np.log(2.) - u - F.softplus(-2. * u))
+        logpa = dist.log_prob(u) - log_1_minus_tanh_sq - torch.log(self.action_scale)
+        logpa = logpa.sum(dim=AS_NEW_COLUMN, keepdim=True)
+
+        greedy_action = torch.tanh(mean) * self.action_scale + self.action_bias
+        return action, logpa, greedy_action
+
+    def select_action(self, state):
+        action, _, _ = self.full_pass(state)
+        return action.detach().cpu().numpy().squeeze(0)
+
+    def select_greedy_action(self, state):
+        mean, _ = self.forward(state)
+        greedy_action = torch.tanh(mean) * self.action_scale + self.action_bias
+        return greedy_action.detach().cpu().numpy().squeeze(0)
+
+
 class FCTQV(nn.Module):  # fullu connected Twin Q-value network
 
     def __init__(self, device, in_dim, out_dim, hidden_dims=(32,32), activation_fc=F.relu):
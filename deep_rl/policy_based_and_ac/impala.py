@@ -0,0 +1,369 @@
+import queue
+import random
+from pathlib import Path
+from itertools import count
+from collections import deque
+import warnings ; warnings.filterwarnings('ignore')
+
+import gym
+import numpy as np
+import torch
+import torch.optim as optim
+import torch.multiprocessing as mp
+
+import utils
+import profiling
+from fc import FCAC
+from evaluation import VectorizedEvaluator, greedy_discrete
+
+"""
+IMPALA: Importance Weighted Actor-Learner Architecture
+
+In A2C the learner (main process) does the inference for every worker, and the workers only
+step their env. So every step of every env waits for a forward pass in the main process.
+
+In IMPALA the roles are decoupled:
+- Each actor (child process) holds its own CPU copy of the actor-critic network, acts locally
+  at full env speed and ships whole trajectory chunks (states, actions, rewards, behavior log
+  probabilities μ(At|St)) to the learner.
+- The learner batches the chunks and updates the network. Weights are broadcast back to the
+  actors periodically, not every step.
+
+Because the actors may act with stale weights, the data is slightly off-policy: it was collected
+with μ (old weights) while the learner is updating π (current weights). V-trace corrects this
+with truncated importance sampling ratios:
+
+>>>> ρₜ = min(ρ̄, π(Aₜ|Sₜ) / μ(Aₜ|Sₜ))       cₜ = min(c̄, π(Aₜ|Sₜ) / μ(Aₜ|Sₜ))
+>>>> δₜ = ρₜ (Rₜ + γV(Sₜ₊₁) - V(Sₜ))
+>>>> vₜ = V(Sₜ) + δₜ + γcₜ(vₜ₊₁ - V(Sₜ₊₁))
+
+vₜ is the target of the value part, and ρₜ (Rₜ + γvₜ₊₁ - V(Sₜ)) is the advantage of the policy
+part.
+"""
+
+
+def vtrace(behavior_logpas, target_logpas, rewards, values, next_values, discounts,
+           rho_bar=1.0, c_bar=1.0):
+    """
+    All inputs are [T, B] tensors (time major), discounts being γ * (1 - done).
+    Return the V-trace value targets vₜ and the policy gradient advantages.
+    """
+    with torch.no_grad():
+        ratios = torch.exp(target_logpas - behavior_logpas)
+        rhos = torch.clamp(ratios, max=rho_bar)
+        cs = torch.clamp(ratios, max=c_bar)
+
+        deltas = rhos * (rewards + discounts * next_values - values)
+
+        # backward recursion: vₜ - V(Sₜ) = δₜ + γcₜ(vₜ₊₁ - V(Sₜ₊₁))
+        vs_minus_v = torch.zeros_like(values)
+        acc = torch.zeros_like(values[0])
+        for t in reversed(range(values.size(0))):
+            acc = deltas[t] + discounts[t] * cs[t] * acc
+            vs_minus_v[t] = acc
+        vs = values + vs_minus_v
+
+        # vₜ₊₁ for the advantage: bootstrap with V(S_T) at the end of the chunk
+        next_vs = torch.cat([vs[1:], next_values[-1:]], dim=0)
+        pg_advantages = rhos * (rewards + discounts * next_vs - values)
+
+    return vs, pg_advantages
+
+
+class IMPALA():
+    def __init__(self, config, seed, device):
+        self.nS = config.getint("nS")
+        self.nA = config.getint("nA")
+        self.config = config
+        self.seed = seed
+        self.device = device
+        self.gamma = config.getfloat("gamma")
+        self.hidden_dims = eval(config.get("hidden_dims"))
+        self.lr = config.getfloat("lr")
+
+        self.ac_model = FCAC(device, self.nS, self.nA, hidden_dims=self.hidden_dims)
+        self.optimizer = optim.RMSprop(self.ac_model.parameters(), lr=self.lr)
+        self.max_grad = config.getint("max_gradient")
+
+        self.policy_loss_weight = config.getfloat("policy_loss_weight")
+        self.value_loss_weight = config.getfloat("value_loss_weight")
+        self.entropy_loss_weight = config.getfloat("entropy_loss_weight")
+
+        self.n_actors = config.getint("n_actors")
+        self.unroll_length = config.getint("unroll_length")
+        self.batch_size = config.getint("batch_size")  # number of chunks per learner update
+        self.broadcast_every = config.getint("broadcast_every")
+        self.rho_bar = config.getfloat("rho_bar")
+        self.c_bar = config.getfloat("c_bar")
+
+        # Weights shared with the actors. They live in shared memory on the CPU, so a broadcast is
+        # a copy into these tensors, the actors pull them when the version number changes.
+        self.shared_model = FCAC(torch.device("cpu"), self.nS, self.nA, hidden_dims=self.hidden_dims)
+        self.shared_model.load_state_dict(self.ac_model.state_dict())
+        self.shared_model.share_memory()
+        self.weights_version = mp.Value('i', 0)
+        self.weights_lock = mp.Lock()
+
+        self.n_updates = 0
+
+
+    def broadcast_weights(self):
+        with self.weights_lock:
+            for s, p in zip(self.shared_model.parameters(), self.ac_model.parameters()):
+                s.data.copy_(p.data)
+            self.weights_version.value += 1
+
+
+    def learn(self, chunks):
+        """
+        chunks: list of B trajectory chunks of length T sent by the actors
+        """
+        # stack as time major [T, B, ...]
+        states = np.stack([c["states"] for c in chunks], axis=1)
+        next_states = np.stack([c["next_state"] for c in chunks], axis=0)
+        actions = np.stack([c["actions"] for c in chunks], axis=1)
+        rewards = np.stack([c["rewards"] for c in chunks], axis=1)
+        dones = np.stack([c["dones"] for c in chunks], axis=1)
+        behavior_logpas = np.stack([c["logpas"] for c in chunks], axis=1)
+
+        T, B = actions.shape
+        to_tensor = lambda x: torch.tensor(x, device=self.device, dtype=torch.float32)
+
+        states = to_tensor(states)
+        actions = torch.tensor(actions, device=self.device, dtype=torch.long)
+        rewards = to_tensor(rewards)
+        discounts = self.gamma * (1 - to_tensor(dones))
+        behavior_logpas = to_tensor(behavior_logpas)
+
+        # a single forward pass for the whole batch of chunks
+        logits, values = self.ac_model(states.view(T * B, -1))
+        logits, values = logits.view(T, B, -1), values.view(T, B)
+
+        with torch.no_grad():
+            bootstrap_value = self.ac_model.get_state_value(to_tensor(next_states)).view(1, B)
+        next_values = torch.cat([values[1:].detach(), bootstrap_value], dim=0)
+
+        dist = torch.distributions.Categorical(logits=logits)
+        target_logpas = dist.log_prob(actions)
+        entropies = dist.entropy()
+
+        vs, pg_advantages = vtrace(
+            behavior_logpas, target_logpas.detach(), rewards, values.detach(), next_values,
+            discounts, self.rho_bar, self.c_bar)
+
+        value_loss = (vs - values).pow(2).mul(0.5).mean()
+        policy_loss = -(pg_advantages * target_logpas).mean()
+        entropy_loss = -entropies.mean()
+
+        loss = self.policy_loss_weight * policy_loss + \
+                self.value_loss_weight * value_loss + \
+                self.entropy_loss_weight * entropy_loss
+
+        self.optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(self.ac_model.parameters(), self.max_grad)
+        self.optimizer.step()
+
+        self.n_updates += 1
+        if self.n_updates % self.broadcast_every == 0:
+            self.broadcast_weights()
+
+
+    def evaluate_one_episode(self, env, seed):
+        self.ac_model.eval()
+        eval_scores = []
+
+        s, d = env.reset(seed=seed)[0], False
+        eval_scores.append(0)
+
+        for _ in count():
+            with torch.no_grad():
+                a = self.ac_model.select_action(s)
+
+            s, r, d, trunc, _ = env.step(a)
+            eval_scores[-1] += r
+            if d or trunc: break
+
+        self.ac_model.train()
+        return np.mean(eval_scores), np.std(eval_scores)
+
+
+class Actors(object):
+    """
+    Actor processes. Each one holds a CPU copy of FCAC, acts locally and put trajectory chunks of
+    `unroll_length` steps into a queue read by the learner.
+    """
+
+    def __init__(self, agent, config, seed):
+        self.n_actors = config.getint("n_actors")
+        self.env_name = config.get("env_name")
+        self.unroll_length = config.getint("unroll_length")
+        self.seed = seed
+        self.nS, self.nA, self.hidden_dims = agent.nS, agent.nA, agent.hidden_dims
+
+        # bounded, so the actors cannot run arbitrarily far ahead of the learner
+        self.chunks_queue = mp.Queue(maxsize=config.getint("queue_size"))
+        self.episodes_queue = mp.Queue()
+        self.stop_event = mp.Event()
+
+        self.workers = []
+        for actor_id in range(self.n_actors):
+            w = mp.Process(
+                target=self.work,
+                args=(actor_id, agent.shared_model, agent.weights_version, agent.weights_lock))
+            self.workers.append(w)
+            w.start()
+
+
+    def work(self, actor_id, shared_model, weights_version, weights_lock):
+        torch.set_num_threads(1)
+        seed = self.seed + actor_id
+        torch.manual_seed(seed); np.random.seed(seed)
+        env = gym.make(self.env_name)
+
+        model = FCAC(torch.device("cpu"), self.nS, self.nA, hidden_dims=self.hidden_dims)
+        local_version = -1
+
+        state, episode_return = env.reset(seed=seed)[0], 0.
+
+        while not self.stop_event.is_set():
+            # pull the latest weights only at chunk boundaries, if a new version was broadcast
+            if weights_version.value != local_version:
+                with weights_lock:
+                    model.load_state_dict(shared_model.state_dict())
+                    local_version = weights_version.value
+
+            chunk = {
+                "states": np.zeros((self.unroll_length, len(state)), dtype=np.float32),
+                "actions": np.zeros(self.unroll_length, dtype=np.int64),
+                "rewards": np.zeros(self.unroll_length, dtype=np.float32),
+                "dones": np.zeros(self.unroll_length, dtype=np.float32),
+                "logpas": np.zeros(self.unroll_length, dtype=np.float32),
+            }
+
+            for t in range(self.unroll_length):
+                with torch.no_grad():
+                    logits, _ = model(state)
+                    dist = torch.distributions.Categorical(logits=logits)
+                    action = dist.sample()
+                    logpa = dist.log_prob(action)
+
+                next_state, reward, is_terminal, is_truncated, _ = env.step(action.item())
+                episode_return += reward
+
+                chunk["states"][t] = state
+                chunk["actions"][t] = action.item()
+                chunk["rewards"][t] = reward
+                chunk["dones"][t] = float(is_terminal)
+                chunk["logpas"][t] = logpa.item()
+
+                if is_terminal or is_truncated:
+                    self.episodes_queue.put(episode_return)
+                    # the chunk continues on the next episode, so we also cut the bootstrap when
+                    # the episode is truncated
+                    chunk["dones"][t] = 1.
+                    next_state, episode_return = env.reset()[0], 0.
+
+                state = next_state
+
+            chunk["next_state"] = np.array(state, dtype=np.float32)
+            self.chunks_queue.put(chunk)
+
+        env.close()
+
+
+    def get_chunks(self, batch_size):
+        return [self.chunks_queue.get() for _ in range(batch_size)]
+
+
+    @staticmethod
+    def _drain(q):
+        """Everything currently in the queue, without blocking (Queue.empty() is unreliable)"""
+        items = []
+        while True:
+            try:
+                items.append(q.get_nowait())
+            except queue.Empty:
+                return items
+
+
+    def get_finished_episodes(self):
+        return self._drain(self.episodes_queue)
+
+
+    def close(self):
+        self.stop_event.set()
+        # drain both queues: an actor blocked on the full chunks queue cannot see the stop event,
+        # and an actor cannot exit before its queue feeder thread has flushed what it put
+        while any(w.is_alive() for w in self.workers):
+            self._drain(self.chunks_queue)
+            self._drain(self.episodes_queue)
+            [w.join(timeout=0.1) for w in self.workers]
+
+
+
+if __name__ == "__main__":
+
+    folder, conf, conf_impala, device = utils.get_project_configuration(project_id="IMPALA")
+
+    seed = conf.getint("seed")
+    model_path = Path(folder / conf_impala.get("model_name"))
+    is_evaluation = conf.getboolean("evaluate_only")
+
+    env_name = conf_impala.get("env_name")
+    env_eval = gym.make(env_name)
+    nS, nA = env_eval.observation_space.shape[0], env_eval.action_space.n
+    conf_impala["nS"] = f"{nS}"
+    conf_impala["nA"] = f"{nA}"
+
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+
+    agent = IMPALA(conf_impala, seed, device)
+
+    if is_evaluation:
+        env_inference = gym.make(env_name, render_mode="human")
+        agent.ac_model.load_state_dict(torch.load(model_path))
+        mean_eval_score, _ = agent.evaluate_one_episode(env_inference, seed=seed)
+        print(mean_eval_score)
+    else:
+        actors = Actors(agent, conf_impala, seed)
+
+        evaluation_scores = deque(maxlen=100)  # returns of the last 100 evaluation episodes
+        train_returns = deque(maxlen=100)
+        goal_mean_100_reward = conf_impala.getint("goal_mean_100_reward")
+        learning_curve = []
+        n_updates = conf_impala.getint("n_updates", fallback=None)  # None: until the goal is reached
+
+        eval_every = conf_impala.getint("eval_every", fallback=1)
+        evaluator = VectorizedEvaluator(lambda: gym.make(env_name),
+                                        conf_impala.getint("n_eval_episodes", fallback=1), seed)
+        profiler = profiling.from_config(folder, conf, "IMPALA")
+
+        for update in count(start=1):
+            profiler.step()
+            chunks = actors.get_chunks(agent.batch_size)
+            agent.learn(chunks)
+            train_returns.extend(actors.get_finished_episodes())
+
+            training_done = n_updates is not None and update >= n_updates
+            if update % eval_every != 0 and not training_done: continue  # always evaluate the last update
+
+            scores = evaluator.evaluate(greedy_discrete(agent.ac_model))
+            evaluation_scores.extend(scores["returns"])
+            learning_curve.append(scores["mean"])
+            mean_100_eval_score = np.mean(evaluation_scores)
+            print(f"Update {update}\tAverage mean 100 eval score: {mean_100_eval_score}\t"
+                  f"(last eval: {scores['mean']:.1f} ± {scores['std']:.1f})\t"
+                  f"Average 100 train return: {np.mean(train_returns) if train_returns else 0}")
+
+            goal_reached = mean_100_eval_score >= goal_mean_100_reward
+            if goal_reached or training_done:
+                torch.save(agent.ac_model.state_dict(), model_path)
+                break
+
+        profiler.close()
+        evaluator.close()
+        utils.save_learning_curve(conf, learning_curve)
+        actors.close()
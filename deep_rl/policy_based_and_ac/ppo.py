@@ -0,0 +1,270 @@
+import random
+from pathlib import Path
+from itertools import count
+from collections import deque
+import warnings ; warnings.filterwarnings('ignore')
+
+import gym
+import numpy as np
+import torch
+import torch.optim as optim
+
+import utils
+import profiling
+from fc import FCAC
+from a2c import MultiprocessEnv
+from evaluation import VectorizedEvaluator, greedy_discrete
+
+"""
+PPO: Proximal Policy Optimization
+
+A2C collects a short rollout with the workers, takes a single gradient step and throws the data
+away. PPO collects a fixed size rollout (rollout_steps per worker), computes the GAE once, then
+reuses the same data for several epochs of shuffled minibatch updates.
+
+Since the policy changes during these epochs, the data becomes slightly off-policy. To avoid
+updates that move the policy too far from the one that collected the data, the objective is
+clipped:
+
+>>>> r(θ) = π(At|St; θ) / π(At|St; θ_old)
+>>>> L(θ) = -E[ min(r(θ) Aᴳᴬᴱ, clip(r(θ), 1 - ε, 1 + ε) Aᴳᴬᴱ) ]
+
+The value part is clipped the same way around the values predicted during the rollout.
+"""
+
+
+class PPO():
+    def __init__(self, config, seed, device):
+        self.nS = config.getint("nS")
+        self.nA = config.getint("nA")
+        self.config = config
+        self.seed = seed
+        self.device = device
+        self.gamma = config.getfloat("gamma")
+        self.lambdaa = config.getfloat("lambdaa")
+        self.hidden_dims = eval(config.get("hidden_dims"))
+        self.lr = config.getfloat("lr")
+
+        self.ac_model = FCAC(device, self.nS, self.nA, hidden_dims=self.hidden_dims)
+        self.optimizer = optim.Adam(self.ac_model.parameters(), lr=self.lr)
+        self.max_grad = config.getfloat("max_gradient")
+
+        self.value_loss_weight = config.getfloat("value_loss_weight")
+        self.entropy_loss_weight = config.getfloat("entropy_loss_weight")
+        self.policy_clip_range = config.getfloat("policy_clip_range")
+        self.value_clip_range = config.getfloat("value_clip_range")
+
+        self.n_workers = config.getint("n_workers")
+        self.rollout_steps = config.getint("rollout_steps")
+        self.n_epochs = config.getint("n_epochs")
+        self.n_minibatches = config.getint("n_minibatches")
+
+        # rollout storage, allocated once: [T, n_workers, ...]
+        T, W = self.rollout_steps, self.n_workers
+        self.states = np.zeros((T, W, self.nS), dtype=np.float32)
+        self.actions = np.zeros((T, W), dtype=np.int64)
+        self.logpas = np.zeros((T, W), dtype=np.float32)
+        self.rewards = np.zeros((T, W), dtype=np.float32)
+        self.dones = np.zeros((T, W), dtype=np.float32)
+        self.values = np.zeros((T + 1, W), dtype=np.float32)
+
+        self.episode_returns = np.zeros(W)
+        self.finished_episodes = []
+
+
+    def collect_rollout(self, states, mp_env):
+        """Run rollout_steps steps on every worker, the model is only used for inference here"""
+        for t in range(self.rollout_steps):
+            with torch.no_grad():
+                logits, values = self.ac_model(states)
+                dist = torch.distributions.Categorical(logits=logits)
+                actions = dist.sample()
+                logpas = dist.log_prob(actions)
+
+            actions = actions.cpu().numpy()
+            new_states, rewards, terminals, truncations = mp_env.step(actions)
+            rewards, terminals, truncations = rewards[:, 0], terminals[:, 0], truncations[:, 0]
+
+            # a truncated episode could have continued, so we bootstrap it in the reward
+            truncated_only = np.logical_and(truncations, np.logical_not(terminals))
+            if truncated_only.any():
+                with torch.no_grad():
+                    bootstrap = self.ac_model.get_state_value(new_states).cpu().numpy()[:, 0]
+                rewards = rewards + self.gamma * bootstrap * truncated_only
+
+            self.states[t] = states
+            self.actions[t] = actions
+            self.logpas[t] = logpas.cpu().numpy()
+            self.rewards[t] = rewards
+            self.values[t] = values.cpu().numpy()[:, 0]
+
+            dones = np.logical_or(terminals, truncations)
+            self.dones[t] = dones
+            self.episode_returns += rewards
+
+            # reset done workers so they keep collecting
+            for i in np.flatnonzero(dones):
+                new_states[i] = mp_env.reset(worker_id=i)
+                self.finished_episodes.append(self.episode_returns[i])
+                self.episode_returns[i] = 0
+
+            states = new_states
+
+        with torch.no_grad():
+            self.values[-1] = self.ac_model.get_state_value(states).cpu().numpy()[:, 0]
+
+        return states
+
+
+    def compute_gaes(self):
+        """
+        GAE computed once per rollout, with a single backward pass over time:
+        Aᴳᴬᴱₜ = δₜ + γλ(1 - doneₜ) Aᴳᴬᴱₜ₊₁     with δₜ = Rₜ + γ(1 - doneₜ)V(Sₜ₊₁) - V(Sₜ)
+        """
+        not_dones = 1. - self.dones
+        td_errors = self.rewards + self.gamma * self.values[1:] * not_dones - self.values[:-1]
+
+        gaes = np.zeros_like(td_errors)
+        gae = np.zeros(self.n_workers, dtype=np.float32)
+        for t in reversed(range(self.rollout_steps)):
+            gae = td_errors[t] + self.gamma * self.lambdaa * not_dones[t] * gae
+            gaes[t] = gae
+
+        returns = gaes + self.values[:-1]
+        return gaes, returns
+
+
+    def learn(self):
+        gaes, returns = self.compute_gaes()
+
+        to_tensor = lambda x: torch.tensor(x, device=self.device, dtype=torch.float32)
+        n_samples = self.rollout_steps * self.n_workers
+
+        states = to_tensor(self.states.reshape(n_samples, self.nS))
+        actions = torch.tensor(self.actions.reshape(-1), device=self.device, dtype=torch.long)
+        old_logpas = to_tensor(self.logpas.reshape(-1))
+        old_values = to_tensor(self.values[:-1].reshape(-1))
+        gaes = to_tensor(gaes.reshape(-1))
+        returns = to_tensor(returns.reshape(-1))
+
+        minibatch_size = n_samples // self.n_minibatches
+
+        for _ in range(self.n_epochs):
+            permutation = torch.randperm(n_samples, device=self.device)
+
+            for start in range(0, n_samples - minibatch_size + 1, minibatch_size):
+                idx = permutation[start:start + minibatch_size]
+
+                logpas, entropies, values = self.ac_model.get_predictions(states[idx], actions[idx])
+
+                mb_gaes = gaes[idx]
+                mb_gaes = (mb_gaes - mb_gaes.mean()) / (mb_gaes.std() + 1e-8)
+
+                ratios = (logpas - old_logpas[idx]).exp()
+                pi_obj = ratios * mb_gaes
+                pi_obj_clipped = ratios.clamp(
+                    1.0 - self.policy_clip_range, 1.0 + self.policy_clip_range) * mb_gaes
+                policy_loss = -torch.min(pi_obj, pi_obj_clipped).mean()
+
+                values_clipped = old_values[idx] + (values - old_values[idx]).clamp(
+                    -self.value_clip_range, self.value_clip_range)
+                value_loss = torch.max(
+                    (returns[idx] - values).pow(2), (returns[idx] - values_clipped).pow(2)
+                ).mul(0.5).mean()
+
+                entropy_loss = -entropies.mean()
+
+                loss = policy_loss + \
+                        self.value_loss_weight * value_loss + \
+                        self.entropy_loss_weight * entropy_loss
+
+                self.optimizer.zero_grad()
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(self.ac_model.parameters(), self.max_grad)
+                self.optimizer.step()
+
+
+    def evaluate_one_episode(self, env, seed):
+        self.ac_model.eval()
+        eval_scores = []
+
+        s, d = env.reset(seed=seed)[0], False
+        eval_scores.append(0)
+
+        for _ in count():
+            with torch.no_grad():
+                a = self.ac_model.select_action(s)
+
+            s, r, d, trunc, _ = env.step(a)
+            eval_scores[-1] += r
+            if d or trunc: break
+
+        self.ac_model.train()
+        return np.mean(eval_scores), np.std(eval_scores)
+
+
+
+if __name__ == "__main__":
+
+    folder, conf, conf_ppo, device = utils.get_project_configuration(project_id="PPO")
+
+    seed = conf.getint("seed")
+    model_path = Path(folder / conf_ppo.get("model_name"))
+    is_evaluation = conf.getboolean("evaluate_only")
+
+    env_name = conf_ppo.get("env_name")
+    env_eval = gym.make(env_name)
+    nS, nA = env_eval.observation_space.shape[0], env_eval.action_space.n
+    conf_ppo["nS"] = f"{nS}"
+    conf_ppo["nA"] = f"{nA}"
+
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+
+    agent = PPO(conf_ppo, seed, device)
+
+    if is_evaluation:
+        env_inference = gym.make(env_name, render_mode="human")
+        agent.ac_model.load_state_dict(torch.load(model_path))
+        mean_eval_score, _ = agent.evaluate_one_episode(env_inference, seed=seed)
+        print(mean_eval_score)
+    else:
+        mp_env = MultiprocessEnv(conf_ppo, seed)
+        states = mp_env.reset()
+
+        evaluation_scores = deque(maxlen=100)  # returns of the last 100 evaluation episodes
+        learning_curve = []
+        goal_mean_100_reward = conf_ppo.getint("goal_mean_100_reward")
+        n_updates = conf_ppo.getint("n_updates", fallback=None)  # None: until the goal is reached
+
+        eval_every = conf_ppo.getint("eval_every", fallback=1)
+        evaluator = VectorizedEvaluator(lambda: gym.make(env_name),
+                                        conf_ppo.getint("n_eval_episodes", fallback=1), seed)
+        profiler = profiling.from_config(folder, conf, "PPO")
+
+        for update in count(start=1):
+            profiler.step()
+            states = agent.collect_rollout(states, mp_env)
+            agent.learn()
+
+            training_done = n_updates is not None and update >= n_updates
+            if update % eval_every != 0 and not training_done: continue  # always evaluate the last update
+
+            scores = evaluator.evaluate(greedy_discrete(agent.ac_model))
+            evaluation_scores.extend(scores["returns"])
+            learning_curve.append(scores["mean"])
+            mean_100_eval_score = np.mean(evaluation_scores)
+            print(f"Update {update}\tEpisodes {len(agent.finished_episodes)}\t"
+                  f"Average mean 100 eval score: {mean_100_eval_score}\t"
+                  f"(last eval: {scores['mean']:.1f} ± {scores['std']:.1f})")
+
+            goal_reached = mean_100_eval_score >= goal_mean_100_reward
+            if goal_reached or training_done:
+                torch.save(agent.ac_model.state_dict(), model_path)
+                break
+
+        profiler.close()
+        evaluator.close()
+        utils.save_learning_curve(conf, learning_curve)
+        mp_env.close()
@@ -0,0 +1,109 @@
+import io
+import time
+import pstats
+import cProfile
+from pathlib import Path
+
+import torch
+
+import utils
+
+"""
+Profiling of a window of training steps, driven by the [DEFAULT] section of config.ini:
+
+    profile = true
+    profile_warmup_steps = 200    steps run normally before profiling (warmup, replay buffer filling)
+    profile_steps = 50            number of profiled steps
+    profile_dir = profiles        relative to run_dir
+
+A step is one iteration of the training loop of the entry point (an env step + update for
+DDPG/TD3/SAC, an episode for REINFORCE/VPG, an update for PPO/IMPALA...). The training loop only
+calls profiler.step() once per iteration. During the window, both profilers run:
+- torch profiler: operator level CPU (and CUDA) time and memory, with a chrome trace
+  (open torch_trace.json in chrome://tracing or https://ui.perfetto.dev)
+- cProfile: python level time, to see where the time goes outside of torch
+
+Outputs (in profile_dir/<project>_<timestamp>/):
+    torch_trace.json, torch_ops_cpu_time.txt, torch_ops_memory.txt, cprofile.prof, cprofile.txt
+"""
+
+
+class StepProfiler():
+
+    def __init__(self, out_dir, warmup_steps, n_steps, enabled=True):
+        self.out_dir = Path(out_dir)
+        self.warmup_steps = warmup_steps
+        self.n_steps = n_steps
+        self.enabled = enabled
+        self.t = 0
+        self.torch_profiler = None
+        self.cprofiler = None
+
+    def step(self):
+        if not self.enabled: return
+
+        if self.t == self.warmup_steps:
+            self._start()
+        elif self.t == self.warmup_steps + self.n_steps:
+            self._stop()
+        self.t += 1
+
+    def close(self):
+        """Write the traces if the training stopped during the window"""
+        if self.torch_profiler is not None:
+            self._stop()
+
+    def _start(self):
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+        self.torch_profiler = torch.profiler.profile(
+            activities=activities, record_shapes=True, profile_memory=True, with_stack=False)
+        self.cprofiler = cProfile.Profile()
+
+        self.torch_profiler.start()
+        self.cprofiler.enable()
+        self.t_start = time.perf_counter()
+
+    def _stop(self):
+        self.cprofiler.disable()
+        self.torch_profiler.stop()
+        n_profiled = self.t - self.warmup_steps
+        wall = time.perf_counter() - self.t_start
+        self.enabled = False
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        header = f"{n_profiled} steps after {self.warmup_steps} warmup steps, {wall:.3f}s wall\n\n"
+
+        self.torch_profiler.export_chrome_trace(str(self.out_dir / "torch_trace.json"))
+        averages = self.torch_profiler.key_averages()
+        sort_time = "cuda_time_total" if torch.cuda.is_available() else "cpu_time_total"
+        (self.out_dir / "torch_ops_cpu_time.txt").write_text(
+            header + averages.table(sort_by=sort_time, row_limit=50))
+        (self.out_dir / "torch_ops_memory.txt").write_text(
+            header + averages.table(sort_by="self_cpu_memory_usage", row_limit=50))
+
+        self.cprofiler.dump_stats(str(self.out_dir / "cprofile.prof"))
+        stream = io.StringIO()
+        stats = pstats.Stats(self.cprofiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(60)
+        (self.out_dir / "cprofile.txt").write_text(header + stream.getvalue())
+
+        self.torch_profiler, self.cprofiler = None, None
+        print(f"Profile of {n_profiled} steps written to {self.out_dir}")
+
+
+def from_config(folder, conf_default, project_id):
+    """StepProfiler configured by the [DEFAULT] section, does nothing if `profile` is false"""
+    enabled = conf_default.getboolean("profile", fallback=False)
+    profile_dir = Path(conf_default.get("profile_dir", fallback="profiles"))
+    if not profile_dir.is_absolute():
+        profile_dir = utils.get_run_dir(folder, conf_default) / profile_dir
+    out_dir = profile_dir / f"{project_id.lower()}_{time.strftime('%Y%m%d-%H%M%S')}"
+
+    return StepProfiler(
+        out_dir,
+        warmup_steps=conf_default.getint("profile_warmup_steps", fallback=100),
+        n_steps=conf_default.getint("profile_steps", fallback=50),
+        enabled=enabled)
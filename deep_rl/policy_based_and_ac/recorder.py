@@ -0,0 +1,123 @@
+import queue
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+# ffmpeg (codec, pixel format, extra output params) per output extension. ffmpeg receives the
+# frames through a pipe and writes them to the file as they arrive.
+# For gif, a palette is computed per frame, so there is no need to see all the frames first.
+GIF_PALETTE = "split[a][b];[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1"
+CODECS = {
+    ".gif": ("gif", "pal8", ["-vf", GIF_PALETTE]),
+    ".mp4": ("libx264", "yuv420p", []),
+    ".webm": ("libvpx", "yuv420p", []),
+    ".avi": ("mpeg4", "yuv420p", []),
+}
+
+
+class FrameRecorder():
+    """
+    Stream rendered frames to an encoder running in a background thread.
+
+    The rollout only pushes frames into a bounded queue, the encoding (ffmpeg through
+    imageio-ffmpeg) and the writing to disk happen in the thread, frame by frame. So the memory
+    used does not depend on the length of the episode: at most `max_queue_size` frames are held
+    at the same time.
+
+    - frame_skip: keep one frame every `frame_skip` frames
+    - downscale: keep one pixel every `downscale` pixels in both directions
+    - drop_when_full: if the encoder is late, drop frames instead of blocking the rollout
+    """
+
+    def __init__(self, filepath, fps=30, frame_skip=1, downscale=1, max_queue_size=64,
+                 drop_when_full=False):
+        self.filepath = Path(filepath)
+        self.fps = fps
+        self.frame_skip = frame_skip
+        self.downscale = downscale
+        self.drop_when_full = drop_when_full
+
+        if self.filepath.suffix not in CODECS:
+            raise ValueError(f"Unsupported output {self.filepath.suffix}, use one of {list(CODECS)}")
+
+        self.frames = queue.Queue(maxsize=max_queue_size)
+        self.n_seen = 0
+        self.n_written = 0
+        self.n_dropped = 0
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self._encode, daemon=True)
+        self.thread.start()
+        return self
+
+    def add(self, frame):
+        if frame is None: return
+
+        keep = self.n_seen % self.frame_skip == 0
+        self.n_seen += 1
+        if not keep: return
+
+        if self.downscale > 1:
+            # copy, so the full resolution frame can be freed right away
+            frame = np.ascontiguousarray(frame[::self.downscale, ::self.downscale])
+
+        try:
+            self.frames.put(frame, block=not self.drop_when_full)
+        except queue.Full:
+            self.n_dropped += 1
+
+    def close(self):
+        if self.thread is None: return
+        self.frames.put(None)  # sentinel: no more frames
+        self.thread.join()
+        self.thread = None
+
+        if self.error is not None:
+            raise RuntimeError(f"Could not write {self.filepath}") from self.error
+
+    def _encode(self):
+        writer = None
+        try:
+            import imageio_ffmpeg  # only needed when recording
+
+            codec, pix_fmt_out, output_params = CODECS[self.filepath.suffix]
+            height, width = None, None
+
+            while True:
+                frame = self.frames.get()
+                if frame is None: break
+
+                # the size of the video is known with the first frame
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    if pix_fmt_out == "yuv420p":  # chroma subsampling needs even dimensions
+                        height, width = height - height % 2, width - width % 2
+                    writer = imageio_ffmpeg.write_frames(
+                        str(self.filepath), (width, height), fps=self.fps, codec=codec,
+                        pix_fmt_out=pix_fmt_out, output_params=output_params, macro_block_size=1)
+                    writer.send(None)  # start the generator
+
+                frame = frame[:height, :width, :3]
+                writer.send(np.ascontiguousarray(frame, dtype=np.uint8))
+                self.n_written += 1
+        except Exception as e:
+            self.error = e
+            # keep consuming so the rollout never blocks on a full queue
+            while self.frames.get() is not None: pass
+        finally:
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception as e:
+                    self.error = self.error or e
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,4 +1,4 @@
-import configparser
+import random
 from pathlib import Path
 from itertools import count
 from collections import deque
@@ -9,8 +9,12 @@ import numpy as np
 import torch
 import torch.optim as optim
 
+import utils
+import profiling
 from fc import FCDAP
 
+tm = utils.TELEMETRY
+
 """Policy Based
 
 Goal is to maximize the true value function of a parameterized policy from all initial states.
@@ -59,8 +63,11 @@ class Reinforce():
     
     def interact_with_environment(self, state, env):
         self.policy.train()
-        action, logpa, _ = self.policy.full_pass(state)
-        next_state, reward, is_terminal, _, _ = env.step(action)
+        with tm.timer("action_selection"):
+            action, logpa, _ = self.policy.full_pass(state)
+        with tm.timer("env_step"):
+            next_state, reward, is_terminal, _, _ = env.step(action)
+        tm.count("env_steps")
 
         self.logpas.append(logpa)
         self.rewards.append(reward)
@@ -84,8 +91,10 @@ class Reinforce():
         loss = -(discounts * returns * self.logpas).mean()
 
         self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+        with tm.timer("backward"):
+            loss.backward()
+        with tm.timer("optimizer_step"):
+            self.optimizer.step()
     
 
     def evaluate(self, env, n_episodes, seed):
@@ -113,13 +122,7 @@ class Reinforce():
 
 
 if __name__ == "__main__":
-    folder = Path("/home/medhyvinceslas/Documents/courses/gdrl_rl_spe/deep_rl/policy_based_and_ac")
-    config_file = folder / "config.ini"
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    
-    conf = config["DEFAULT"]
-    conf_reinforce = config["REINFORCE"]
+    folder, conf, conf_reinforce, device = utils.get_project_configuration(project_id="REINFORCE")
 
     model_path = Path(folder / conf_reinforce.get("model_name"))
     is_evaluation = conf.getboolean("evaluate_only")
@@ -132,9 +135,10 @@ if __name__ == "__main__":
 
 
     # Monte-Carlo reinforce
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    agent = Reinforce(conf_reinforce, device)
     seed = conf.getint("seed")
+    torch.manual_seed(seed); np.random.seed(seed); random.seed(seed)
+    agent = Reinforce(conf_reinforce, device)
+    utils.start_telemetry(folder, conf, "REINFORCE")
     
     if is_evaluation:
         agent.policy.load_state_dict(torch.load(model_path))
@@ -142,10 +146,13 @@ if __name__ == "__main__":
     else:
 
         evaluation_scores = deque(maxlen=100)
+        learning_curve = []
         n_episodes = conf_reinforce.getint("n_episodes")
         goal_mean_100_reward = conf_reinforce.getint("goal_mean_100_reward")
+        profiler = profiling.from_config(folder, conf, "REINFORCE")
 
         for i_episode in range(1, n_episodes + 1):
+            profiler.step()
             state, is_terminal = env.reset(seed=seed)[0], False
 
             agent.reset_metrics()
@@ -154,9 +161,14 @@ if __name__ == "__main__":
                 state = new_state
                 if is_terminal: break
             
-            agent.learn()
-            mean_eval_score, _ = agent.evaluate(env, n_episodes=1, seed=seed)
+            with tm.timer("learn"):
+                agent.learn()
+            tm.count("updates")
+            tm.count("episodes")
+            with tm.timer("evaluation"):
+                mean_eval_score, _ = agent.evaluate(env, n_episodes=1, seed=seed)
             evaluation_scores.append(mean_eval_score)
+            learning_curve.append(mean_eval_score)
 
             if len(evaluation_scores) >= 100:
                 mean_100_eval_score = np.mean(evaluation_scores)
@@ -166,4 +178,8 @@ if __name__ == "__main__":
                     torch.save(agent.policy.state_dict(), model_path)
                     break
 
+        profiler.close()
+        utils.save_learning_curve(conf, learning_curve)
+
+    tm.close()
     env.close()
\ No newline at end of file
@@ -0,0 +1,222 @@
+import random
+from itertools import count
+from collections import deque
+
+import gym
+import torch
+import numpy as np
+import torch.optim as optim
+
+import utils
+import profiling
+from fc import FCTQV, FCGP
+from evaluation import VectorizedEvaluator, greedy_gaussian
+
+"""
+SAC: Soft Actor-Critic
+
+Off-policy actor-critic as DDPG/TD3, but with a stochastic policy and an entropy bonus added to
+the return. The agent maximizes the return while acting as randomly as possible:
+
+>>>> J(ϕ) = E[ Q(s, a) - α log π(a|s; ϕ) ]    with a ~ π(.|s; ϕ)
+
+- The policy is a squashed Gaussian: a = tanh(u) rescaled to the action bounds, u ~ N(μ(s), σ(s))
+- The critic is a twin network as in TD3, the target is the min of the 2 streams minus the
+  entropy term: Q_target = r + γ (min(Qa', Qb') - α log π(a'|s'))
+- α (temperature) is tuned automatically so the entropy of the policy stays close to a target
+  entropy (-nA)
+- No target policy network, only the critic has a target network (Polyak averaging)
+"""
+
+
+class SAC():
+    def __init__(self, action_bounds, config, seed, device):
+
+        self.config = config
+        self.device = device
+        buffer_size = config.getint("buffer_size")
+        bs = config.getint("batch_size")
+        nS = config.getint("nS")
+        nA = config.getint("nA")
+        hidden_dims = eval(config.get("hidden_dims"))
+        lr = config.getfloat("lr")
+        self.tau = config.getfloat("tau")
+        self.gamma = config.getfloat("gamma")
+        self.n_warmup_batches = config.getint("n_warmup_batches")
+
+        self.memory = utils.ReplayBuffer(buffer_size, bs, seed)
+        self.low, self.high = action_bounds
+
+        self.actor = FCGP(device, nS, action_bounds, hidden_dims)  # squashed Gaussian
+
+        self.critic = FCTQV(device, nS, nA, hidden_dims)  # using ReLu by default
+        self.critic_target = FCTQV(device, nS, nA, hidden_dims)
+
+        self.actor_optimizer = optim.Adam(self.actor.parameters(), lr=lr)
+        self.critic_optimizer = optim.Adam(self.critic.parameters(), lr=lr)
+
+        # automatic temperature tuning, we learn log α so α stays positive
+        self.target_entropy = -float(nA)
+        self.log_alpha = torch.zeros(1, requires_grad=True, device=device)
+        self.alpha_optimizer = optim.Adam([self.log_alpha], lr=lr)
+
+        self.max_grad = float('inf')
+
+        self.sync_weights(use_polyak_averaging=False)
+
+    def interact(self, state, env):
+        min_samples = self.memory.batch_size * self.n_warmup_batches
+
+        # uniform random actions until we have enough samples to start learning
+        if len(self.memory) < min_samples:
+            action = np.random.uniform(self.low, self.high).astype(np.float32)
+        else:
+            with torch.no_grad():
+                action = self.actor.select_action(state)
+
+        next_state, reward, is_terminal, is_truncated, _ = env.step(action)
+
+        # only a terminal state cuts the bootstrap, a truncated episode could have continued
+        experience = (state, action, reward, next_state, float(is_terminal))
+        return experience, is_terminal or is_truncated
+
+    def store_experience(self, state, action, reward, next_state, done):
+        self.memory.add(state, action, reward, next_state, done)
+
+    def sample_and_learn(self):
+        states, actions, rewards, next_states, is_terminals = self.memory.sample(self.device)
+        alpha = self.log_alpha.exp().detach()
+
+        with torch.no_grad():
+            a_next, logpa_next, _ = self.actor.full_pass(next_states)
+
+            # both streams in a single pass of the twin critic
+            Q_target_stream_a, Q_target_stream_b = self.critic_target(next_states, a_next)
+            Q_next = torch.min(Q_target_stream_a, Q_target_stream_b) - alpha * logpa_next
+            Q_target = rewards + self.gamma * Q_next * (1 - is_terminals)
+
+        # update the critic
+        Q_stream_a, Q_stream_b = self.critic(states, actions)
+        error_a = Q_stream_a - Q_target
+        error_b = Q_stream_b - Q_target
+
+        critic_loss = error_a.pow(2).mul(0.5).mean() + error_b.pow(2).mul(0.5).mean()
+        self.critic_optimizer.zero_grad()
+        critic_loss.backward()
+        torch.nn.utils.clip_grad_norm_(self.critic.parameters(), self.max_grad)
+        self.critic_optimizer.step()
+
+        # update the actor: maximize min(Qa, Qb) - α log π(a|s)
+        a_pred, logpa, _ = self.actor.full_pass(states)
+        Q_pred_stream_a, Q_pred_stream_b = self.critic(states, a_pred)
+        Q_pred = torch.min(Q_pred_stream_a, Q_pred_stream_b)
+
+        actor_loss = (alpha * logpa - Q_pred).mean()
+        self.actor_optimizer.zero_grad()
+        actor_loss.backward()
+        torch.nn.utils.clip_grad_norm_(self.actor.parameters(), self.max_grad)
+        self.actor_optimizer.step()
+
+        # update the temperature: increase α if the entropy is below the target, decrease otherwise
+        alpha_loss = -(self.log_alpha * (logpa.detach() + self.target_entropy)).mean()
+        self.alpha_optimizer.zero_grad()
+        alpha_loss.backward()
+        self.alpha_optimizer.step()
+
+    def evaluate_one_episode(self, env, seed):
+        total_rewards = 0
+
+        s, d = env.reset(seed=seed)[0], False
+
+        for _ in count():
+            with torch.no_grad():
+                a = self.actor.select_greedy_action(s)
+
+            s, r, d, trunc, _ = env.step(a)
+            total_rewards += r
+            if d or trunc: break
+
+        return total_rewards
+
+    def sync_weights(self, use_polyak_averaging=True):
+        tau = self.tau if use_polyak_averaging else 1.  # or a full copy, SAC has no target actor
+        utils.polyak_update(self.critic_target, self.critic, tau)
+
+
+if __name__ == "__main__":
+
+    folder, conf_default, conf_project, device = utils.get_project_configuration(project_id="SAC")
+
+    seed = conf_default.getint("seed")
+    is_evaluation = conf_default.getboolean("evaluate_only")
+    env_name = conf_project.get("env_name")
+    n_episodes = conf_project.getint("n_episodes")
+    goal_mean_100_reward = conf_project.getint("goal_mean_100_reward")
+    model_path = folder / conf_project.get("model_name")
+
+    env = gym.make(env_name, render_mode="human") if is_evaluation else gym.make(env_name)
+
+    action_bounds = env.action_space.low, env.action_space.high
+    nS, nA = env.observation_space.shape[0], env.action_space.shape[0]
+    conf_project["nS"] = f"{nS}"
+    conf_project["nA"] = f"{nA}"
+
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+
+    agent = SAC(action_bounds, conf_project, seed, device)
+
+    if is_evaluation:
+        agent.actor.load_state_dict(torch.load(model_path))
+        total_rewards = agent.evaluate_one_episode(env, seed=seed)
+        print(total_rewards)
+    else:
+        last_100_score = deque(maxlen=100)  # returns of the last 100 evaluation episodes
+        learning_curve = []
+
+        eval_every = conf_project.getint("eval_every", fallback=1)
+        evaluator = VectorizedEvaluator(lambda: gym.make(env_name),
+                                        conf_project.getint("n_eval_episodes", fallback=1), seed)
+        profiler = profiling.from_config(folder, conf_default, "SAC")
+
+        for i_episode in range(1, n_episodes + 1):
+            state = env.reset(seed=seed + i_episode)[0]
+
+            for t_step in count():
+                profiler.step()
+                experience, episode_done = agent.interact(state, env)
+                agent.store_experience(*experience)
+                state = experience[3]
+
+                if len(agent.memory) > agent.memory.batch_size * agent.n_warmup_batches:
+                    agent.sample_and_learn()
+                    agent.sync_weights(use_polyak_averaging=True)
+
+                if episode_done: break
+
+            training_done = i_episode >= n_episodes
+            if i_episode % eval_every != 0 and not training_done: continue  # always evaluate the last episode
+
+            # Evaluate
+            scores = evaluator.evaluate(greedy_gaussian(agent.actor))
+            last_100_score.extend(scores["returns"])
+            learning_curve.append(scores["mean"])
+            mean_100_score = np.mean(last_100_score)
+
+            if i_episode % 100 == 0:
+                print(f"Episode {i_episode}\tAverage mean {len(last_100_score)} eval score: {mean_100_score}\t"
+                      f"(last eval: {scores['mean']:.1f} ± {scores['std']:.1f}, "
+                      f"p5 {scores['p5']:.1f}, p95 {scores['p95']:.1f})")
+
+            enough_sample = len(last_100_score) >= 100
+            goal_reached = mean_100_score >= goal_mean_100_reward
+
+            if ((enough_sample and goal_reached) or training_done):
+                torch.save(agent.actor.state_dict(), model_path)
+                break
+
+        profiler.close()
+        evaluator.close()
+        utils.save_learning_curve(conf_default, learning_curve)
+        env.close()
@@ -0,0 +1,187 @@
+"""
+Multi-seed / multi-config sweep over a section of config.ini.
+
+Every combination of seeds and hyperparameter overrides is a run. Each run gets its own folder
+with a copy of config.ini (seed and overrides applied), and the algorithm script is launched in
+its own process with RL_CONFIG pointing to that copy. Runs are scheduled on a pool sized to the
+available cores, with the number of threads of each run limited (torch, OpenMP, MKL), so they do
+not fight for the same cores.
+
+At the end, the learning curves (evaluation scores written by each script) and the final scores
+(mean of the last 100 evaluation scores) are aggregated into one results.json.
+
+python sweep.py TD3 --seeds 1 2 3 4 5 --set lr=0.0003,0.001 --set tau=0.005,0.01
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+import configparser
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+FOLDER = Path(__file__).parent
+
+SCRIPTS = {
+    "REINFORCE": "reinforce.py",
+    "VPG": "vanilla_policy_gradient.py",
+    "A2C": "a2c.py",
+    "PPO": "ppo.py",
+    "IMPALA": "impala.py",
+    "DDPG": "ddpg.py",
+    "TD3": "td3.py",
+    "SAC": "sac.py",
+}
+
+THREADS_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+VALUES_SEPARATOR = re.compile(r",(?![^(]*\))")  # a comma not inside parentheses
+
+
+def expand_grid(overrides):
+    """
+    ['lr=0.1,0.2', 'tau=0.005'] -> [{'lr': '0.1', 'tau': '0.005'}, {'lr': '0.2', 'tau': '0.005'}]
+    The commas inside parentheses are part of the value: 'hidden_dims=(64,64),(256,256)'
+    """
+    keys, values = [], []
+    for override in overrides:
+        key, _, value = override.partition("=")
+        keys.append(key.strip())
+        values.append([v.strip() for v in VALUES_SEPARATOR.split(value)])
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def config_id(overrides):
+    if not overrides: return "default"
+    return "_".join(f"{k}={v}" for k, v in sorted(overrides.items()))
+
+
+def write_run_config(section, seed, overrides, run_dir, config_file=FOLDER / "config.ini"):
+    config = configparser.ConfigParser()
+    config.read(config_file)
+
+    config["DEFAULT"]["seed"] = str(seed)
+    config["DEFAULT"]["evaluate_only"] = "false"
+    config["DEFAULT"]["results_file"] = str(run_dir / "curve.json")
+    config["DEFAULT"]["run_dir"] = str(run_dir)  # telemetry and profiling outputs
+
+    for key, value in overrides.items():
+        config[section][key] = value
+    config[section]["model_name"] = str(run_dir / "model.pt")  # absolute, so not under weigths/
+
+    run_config = run_dir / "config.ini"
+    with open(run_config, "w") as f:
+        config.write(f)
+    return run_config
+
+
+def launch(run, threads_per_run):
+    """Run one training script in its own process, return the run with its results"""
+    run_dir = run["run_dir"]
+    run_dir.mkdir(parents=True, exist_ok=True)
+    run_config = write_run_config(run["section"], run["seed"], run["overrides"], run_dir)
+
+    env = dict(os.environ, RL_CONFIG=str(run_config), MPLBACKEND="Agg")
+    env.update({var: str(threads_per_run) for var in THREADS_ENV_VARS})
+
+    start = time.monotonic()
+    with open(run_dir / "log.txt", "w") as log:
+        out = subprocess.run(
+            [sys.executable, SCRIPTS[run["section"]]], cwd=FOLDER, env=env,
+            stdout=log, stderr=subprocess.STDOUT)
+
+    curve_file = run_dir / "curve.json"
+    curve = json.loads(curve_file.read_text())["scores"] if curve_file.exists() else []
+
+    return {
+        "config_id": run["config_id"],
+        "overrides": run["overrides"],
+        "seed": run["seed"],
+        "returncode": out.returncode,
+        "wall_time_s": time.monotonic() - start,
+        "curve": curve,
+        "final_score": float(np.mean(curve[-100:])) if curve else None,
+        "run_dir": str(run_dir),
+    }
+
+
+def summarize(results):
+    """Aggregate the seeds of each configuration: final score mean/std and mean learning curve"""
+    summary = []
+    for cid, runs in itertools.groupby(
+            sorted(results, key=lambda r: r["config_id"]), key=lambda r: r["config_id"]):
+        runs = list(runs)
+        finals = [r["final_score"] for r in runs if r["final_score"] is not None]
+        curves = [r["curve"] for r in runs if r["curve"]]
+
+        # curves can have different lengths (early stop on the goal), align on the shortest
+        mean_curve = []
+        if curves:
+            length = min(len(c) for c in curves)
+            mean_curve = np.mean([c[:length] for c in curves], axis=0).tolist()
+
+        summary.append({
+            "config_id": cid,
+            "overrides": runs[0]["overrides"],
+            "n_seeds": len(runs),
+            "n_failed": sum(r["returncode"] != 0 for r in runs),
+            "final_score_mean": float(np.mean(finals)) if finals else None,
+            "final_score_std": float(np.std(finals)) if finals else None,
+            "mean_curve": mean_curve,
+        })
+    return sorted(summary, key=lambda s: np.inf if s["final_score_mean"] is None  # failed ones last
+                                             else -s["final_score_mean"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("section", choices=sorted(SCRIPTS))
+    parser.add_argument("--seeds", type=int, nargs="+", default=[12, 34, 56, 78, 90])
+    parser.add_argument("--set", dest="overrides", action="append", default=[],
+                        help="key=v1,v2,... hyperparameter values of the section, can be repeated")
+    parser.add_argument("--threads-per-run", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="runs in parallel, default: available cores // threads per run")
+    parser.add_argument("--out", type=Path, default=FOLDER / "sweeps")
+    args = parser.parse_args()
+
+    n_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    n_workers = args.workers or max(1, n_cores // args.threads_per_run)
+
+    sweep_dir = args.out / f"{args.section}_{time.strftime('%Y%m%d-%H%M%S')}"
+    runs = []
+    for overrides in expand_grid(args.overrides):
+        cid = config_id(overrides)
+        for seed in args.seeds:
+            runs.append({
+                "section": args.section, "seed": seed, "overrides": overrides, "config_id": cid,
+                "run_dir": sweep_dir / cid / f"seed_{seed}",
+            })
+
+    print(f"{len(runs)} runs of {args.section} on {n_workers} workers -> {sweep_dir}")
+
+    results = []
+    # threads are enough to schedule: each run is a separate process doing the actual work
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(launch, run, args.threads_per_run) for run in runs]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            status = "ok" if r["returncode"] == 0 else f"failed ({r['returncode']})"
+            print(f"[{len(results)}/{len(runs)}] {r['config_id']} seed {r['seed']}: {status}, "
+                  f"final score {r['final_score']}, {r['wall_time_s']:.0f}s")
+
+    summary = summarize(results)
+    with open(sweep_dir / "results.json", "w") as f:
+        json.dump({"section": args.section, "summary": summary, "runs": results}, f, indent=2)
+
+    for s in summary:
+        print(f"{s['config_id']:<40} {s['final_score_mean']} ± {s['final_score_std']} "
+              f"({s['n_seeds']} seeds, {s['n_failed']} failed)")
@@ -7,7 +7,11 @@ import numpy as np
 import torch.optim as optim
 
 import utils
+import profiling
 from fc import FCTQV, FCDP
+from evaluation import VectorizedEvaluator, greedy_continuous
+
+tm = utils.TELEMETRY
 
 """
 TD3: Twin Delayed DDPG add some improvement to the ddpg algorithm
@@ -61,9 +65,12 @@ class TD3():
 
         min_samples = self.memory.batch_size * self.n_warmup_batches
         use_max_exploration = len(self.memory) < min_samples
-        action = self.training_strategy.select_action(self.actor, state, use_max_exploration)
+        with tm.timer("action_selection"):
+            action = self.training_strategy.select_action(self.actor, state, use_max_exploration)
 
-        next_state, reward, is_terminal, _ = env.step(action)
+        with tm.timer("env_step"):
+            next_state, reward, is_terminal, _ = env.step(action)
+        tm.count("env_steps")
 
         experience = (state, action, reward, next_state, is_terminal)
         return experience
@@ -72,7 +79,8 @@ class TD3():
         self.memory.add(state, action, reward, next_state, done)
 
     def sample_and_learn(self, t_step):
-        states, actions, rewards, next_states, is_terminals = self.memory.sample(self.device)
+        with tm.timer("sample"):
+            states, actions, rewards, next_states, is_terminals = self.memory.sample(self.device)
 
         with torch.no_grad():
             # compute noise for target action (in ddpg noise is only applied on the online action)
@@ -103,9 +111,11 @@ class TD3():
 
         critic_loss = error_a.pow(2).mul(0.5).mean() + error_b.pow(2).mul(0.5).mean()
         self.critic_optimizer.zero_grad()
-        critic_loss.backward()
+        with tm.timer("backward"):
+            critic_loss.backward()
         torch.nn.utils.clip_grad_norm_(self.critic.parameters(), self.max_grad)
-        self.critic_optimizer.step()
+        with tm.timer("optimizer_step"):
+            self.critic_optimizer.step()
 
         # delay actor update, so the critic is updated at higher rate. This give the critic the time
         # to settle into more accurate values because it is more sensible
@@ -117,9 +127,11 @@ class TD3():
 
             actor_loss = -Q_pred.mean()
             self.actor_optimizer.zero_grad()
-            actor_loss.backward()
+            with tm.timer("backward"):
+                actor_loss.backward()
             torch.nn.utils.clip_grad_norm_(self.actor.parameters(), self.max_grad)
-            self.actor_optimizer.step()
+            with tm.timer("optimizer_step"):
+                self.actor_optimizer.step()
 
     def evaluate_one_episode(self, env, seed):
         total_rewards = 0
@@ -137,28 +149,9 @@ class TD3():
         return total_rewards
 
     def sync_weights(self, use_polyak_averaging=True):
-        if (use_polyak_averaging):
-
-            # mixe value networks
-            for t, b in zip(self.critic_target.parameters(), self.critic.parameters()):
-                target_ratio = (1.0 - self.tau) * t.data
-                behavior_ratio = self.tau * b.data
-                mixed_weights = target_ratio + behavior_ratio
-                t.data.copy_(mixed_weights.data)
-
-            # mix policy networks
-            for t, b in zip(self.actor_target.parameters(), self.actor.parameters()):
-                target_ratio = (1.0 - self.tau) * t.data
-                behavior_ratio = self.tau * b.data
-                mixed_weights = target_ratio + behavior_ratio
-                t.data.copy_(mixed_weights.data)
-        else:
-
-            for t, b in zip(self.critic_target.parameters(), self.critic.parameters()):
-                t.data.copy_(b.data)
-
-            for t, b in zip(self.actor_target.parameters(), self.actor.parameters()):
-                t.data.copy_(b.data)
+        tau = self.tau if use_polyak_averaging else 1.  # or a full copy
+        utils.polyak_update(self.critic_target, self.critic, tau)
+        utils.polyak_update(self.actor_target, self.actor, tau)
 
 
 if __name__ == "__main__":
@@ -185,44 +178,66 @@ if __name__ == "__main__":
     random.seed(seed)
 
     agent = TD3(action_bounds, conf_project, seed, device)
+    utils.start_telemetry(folder, conf_default, "TD3")
 
     if is_evaluation:
         agent.actor.load_state_dict(torch.load(model_path))
         total_rewards = agent.evaluate_one_episode(env, seed=seed)
     else:
-        last_100_score = deque(maxlen=100)
-        mean_of_last_100 = deque(maxlen=100)
+        last_100_score = deque(maxlen=100)  # returns of the last 100 evaluation episodes
+        learning_curve = []
+
+        eval_every = conf_project.getint("eval_every", fallback=1)
+        evaluator = VectorizedEvaluator(lambda: utils.make_pybullet_env(env_name, False),
+                                        conf_project.getint("n_eval_episodes", fallback=1), seed)
+        profiler = profiling.from_config(folder, conf_default, "TD3")
 
         for i_episode in range(1, n_episodes + 1):
             state, is_terminal = env.reset(), False
 
             for t_step in count():
+                profiler.step()
                 state, action, reward, next_state, is_terminal = agent.interact(state, env)
                 agent.store_experience(state, action, reward, next_state, is_terminal)
                 state = next_state
 
                 if len(agent.memory) > agent.memory.batch_size * agent.n_warmup_batches:
-                    agent.sample_and_learn(t_step=t_step)
+                    with tm.timer("sample_and_learn"):
+                        agent.sample_and_learn(t_step=t_step)
+                    tm.count("updates")
 
                 if t_step % 2 == 0:
-                    agent.sync_weights(use_polyak_averaging=True)
+                    with tm.timer("target_sync"):
+                        agent.sync_weights(use_polyak_averaging=True)
 
                 if is_terminal: break
 
+            tm.count("episodes")
+            training_done = i_episode >= n_episodes
+            if i_episode % eval_every != 0 and not training_done: continue
+
             # Evaluate
-            total_rewards = agent.evaluate_one_episode(env, seed=seed)
-            last_100_score.append(total_rewards)
+            with tm.timer("evaluation"):
+                scores = evaluator.evaluate(greedy_continuous(agent.actor, action_bounds))
+            last_100_score.extend(scores["returns"])
+            learning_curve.append(scores["mean"])
             mean_100_score = np.mean(last_100_score)
 
             if i_episode % 100 == 0:
-                print(f"Episode {i_episode}\tAverage mean {len(last_100_score)} eval score: {mean_100_score}")
+                print(f"Episode {i_episode}\tAverage mean {len(last_100_score)} eval score: {mean_100_score}\t"
+                      f"(last eval: {scores['mean']:.1f} ± {scores['std']:.1f}, "
+                      f"p5 {scores['p5']:.1f}, p95 {scores['p95']:.1f})")
 
             enough_sample = len(last_100_score) >= 100
             goal_reached = mean_100_score >= goal_mean_100_reward
-            training_done = i_episode >= n_episodes
 
             if ((enough_sample and goal_reached) or training_done):
                 torch.save(agent.actor.state_dict(), model_path)
                 break
 
+        profiler.close()
+        evaluator.close()
+        utils.save_learning_curve(conf_default, learning_curve)
         env.close()
+
+    tm.close()
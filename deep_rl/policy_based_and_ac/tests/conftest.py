@@ -0,0 +1,31 @@
+import sys
+import importlib
+from pathlib import Path
+
+AC_DIR = Path(__file__).resolve().parent.parent
+_utils = None  # the utils module of this directory
+
+
+def use_ac_modules():
+    """
+    The modules import their siblings directly (import utils, from fc import ...), and rl/ has its
+    own utils module: put this directory first on the path and make "utils" this directory's module
+    again, before importing and before running the tests of this directory.
+    """
+    global _utils
+    if str(AC_DIR) in sys.path: sys.path.remove(str(AC_DIR))
+    sys.path.insert(0, str(AC_DIR))
+    if _utils is None:
+        utils = sys.modules.get("utils")
+        if utils is not None and Path(utils.__file__).parent != AC_DIR:
+            del sys.modules["utils"]  # kept by the other conftest
+        _utils = importlib.import_module("utils")
+    sys.modules["utils"] = _utils  # the same module object, its classes stay the same
+
+
+def pytest_pycollect_makemodule(module_path, parent):
+    use_ac_modules()
+
+
+def pytest_runtest_setup(item):
+    use_ac_modules()
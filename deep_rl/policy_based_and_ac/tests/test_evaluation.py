@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from evaluation import VectorizedEvaluator, greedy_gaussian, summarize
+from fc import FCGP
+
+
+def test_summarize():
+    returns = np.arange(1., 101.)
+    scores = summarize(returns)
+    assert scores["mean"] == 50.5 and scores["min"] == 1. and scores["max"] == 100.
+    assert scores["median"] == 50.5 and scores["p5"] == pytest.approx(5.95) and scores["p95"] == pytest.approx(95.05)
+    assert scores["p25"] == pytest.approx(25.75) and scores["p75"] == pytest.approx(75.25)
+    assert scores["std"] == pytest.approx(np.std(returns)) and scores["returns"] == returns.tolist()
+    assert all(type(v) is float for k, v in scores.items() if k != "returns")  # json serializable
+
+
+class CountdownEnv():
+    """Gym >= 0.26 env: the state is the number of steps left (the seed), reward 1 per step"""
+    def reset(self, seed=None):
+        self.left = seed
+        return np.array([self.left], dtype=np.float32), {}
+
+    def step(self, action):
+        self.left -= 1
+        return np.array([self.left], dtype=np.float32), 1., self.left == 0, False, {}
+
+    def close(self):
+        pass
+
+
+def test_vectorized_evaluator_steps_the_running_episodes_only():
+    evaluator = VectorizedEvaluator(CountdownEnv, n_episodes=3, seed=2)  # episodes of 2, 3 and 4 steps
+    batch_sizes = []
+    def select_actions(states):
+        batch_sizes.append(len(states))
+        return np.zeros(len(states))
+
+    for _ in range(2):  # the same episodes at every evaluation
+        batch_sizes.clear()
+        scores = evaluator.evaluate(select_actions)
+        assert scores["returns"] == [2., 3., 4.] and batch_sizes == [3, 3, 2, 1]
+    assert evaluator.evaluate(select_actions, max_steps=2)["returns"] == [2., 2., 2.]
+
+
+def test_greedy_gaussian():
+    policy = FCGP("cpu", 3, (np.array([-2.]), np.array([2.])), hidden_dims=(8,))
+    states = np.random.default_rng(0).normal(size=(4, 3)).astype(np.float32)
+    actions = greedy_gaussian(policy)(states)
+    assert actions.shape == (4, 1)
+    np.testing.assert_allclose(actions[0], policy.select_greedy_action(states[0]), rtol=1e-6)
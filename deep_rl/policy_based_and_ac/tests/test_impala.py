@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import torch
+
+import impala
+
+
+def naive_vtrace(behavior_logpas, target_logpas, rewards, values, next_values, discounts, rho_bar, c_bar):
+    """
+    vₛ = V(xₛ) + ∑ₜ (∏ᵢ₌ₛᵗ⁻¹ γᵢcᵢ) ρₜ(rₜ + γₜV(xₜ₊₁) - V(xₜ)) of the IMPALA paper (eq. 1), with the
+    sums and products written out, and the advantages ρₛ(rₛ + γₛvₛ₊₁ - V(xₛ))
+    """
+    ratios = np.exp(target_logpas - behavior_logpas)
+    rhos, cs = np.minimum(ratios, rho_bar), np.minimum(ratios, c_bar)
+    T, B = values.shape
+    vs = np.zeros((T, B))
+    for b in range(B):
+        for s in range(T):
+            vs[s, b] = values[s, b]
+            for t in range(s, T):
+                trace = np.prod([discounts[i, b] * cs[i, b] for i in range(s, t)])
+                vs[s, b] += trace * rhos[t, b] * (rewards[t, b] + discounts[t, b] * next_values[t, b] - values[t, b])
+
+    advantages = np.zeros((T, B))
+    for b in range(B):
+        for s in range(T):
+            next_v = vs[s + 1, b] if s + 1 < T else next_values[s, b]
+            advantages[s, b] = rhos[s, b] * (rewards[s, b] + discounts[s, b] * next_v - values[s, b])
+    return vs, advantages
+
+
+def random_rollout(T=6, B=3, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(T + 1, B))
+    dones = rng.random((T, B)) < 0.2
+    return dict(behavior_logpas=rng.normal(-1, 0.5, (T, B)), target_logpas=rng.normal(-1, 0.5, (T, B)),
+                rewards=rng.normal(size=(T, B)), values=values[:-1], next_values=values[1:],
+                discounts=0.9 * (1 - dones))
+
+
+@pytest.mark.parametrize("rho_bar, c_bar", [(1., 1.), (2., 0.5), (np.inf, np.inf)])
+def test_vtrace_matches_the_paper_definition(rho_bar, c_bar):
+    rollout = random_rollout()
+    vs, advantages = impala.vtrace(**{k: torch.tensor(v) for k, v in rollout.items()}, rho_bar=rho_bar, c_bar=c_bar)
+    expected_vs, expected_advantages = naive_vtrace(**rollout, rho_bar=rho_bar, c_bar=c_bar)
+    np.testing.assert_allclose(vs.numpy(), expected_vs, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(advantages.numpy(), expected_advantages, rtol=1e-10, atol=1e-10)
+
+
+def test_vtrace_on_policy_is_the_n_step_return():
+    """With π = μ (ratios of 1) vₛ is the bootstrapped n-step return ∑ γᵗ⁻ˢrₜ + γᵀ⁻ˢV(x_T)"""
+    rollout = random_rollout(T=5, B=1)
+    rollout["target_logpas"] = rollout["behavior_logpas"]
+    rollout["discounts"] = np.full((5, 1), 0.9)
+    vs, _ = impala.vtrace(**{k: torch.tensor(v) for k, v in rollout.items()})
+    for s in range(5):
+        n_step_return = sum(0.9 ** (t - s) * rollout["rewards"][t, 0] for t in range(s, 5))
+        n_step_return += 0.9 ** (5 - s) * rollout["next_values"][-1, 0]
+        assert vs[s, 0].item() == pytest.approx(n_step_return, abs=1e-10)
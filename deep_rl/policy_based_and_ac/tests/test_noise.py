@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+import torch
+
+import utils
+
+BOUNDS = np.array([-2., -1.]), np.array([2., 1.])
+DEVICES = ["cpu", pytest.param("cuda", marks=pytest.mark.skipif(not torch.cuda.is_available(), reason="no GPU"))]
+
+
+class ConstantPolicy():
+    """Greedy actions `actions` [nA] for every state, on the device of the states"""
+    def __init__(self, actions):
+        self.actions = torch.tensor(actions, dtype=torch.float32)
+
+    def __call__(self, states):
+        return self.actions.to(states.device).expand(len(states), -1)
+
+
+def decay(k, init=0.5, min_=0.1, decay_steps=10):
+    """Noise ratio after k steps of an env"""
+    return np.clip(init - (init - min_) * k / decay_steps, min_, init)
+
+
+@pytest.mark.parametrize("device", DEVICES)
+@pytest.mark.parametrize("make_strategy", [
+    lambda device: utils.BatchNormalNoiseStrategyContinuous(BOUNDS, device, exploration_noise_ratio=0.5),
+    lambda device: utils.BatchNormalNoiseDecayStrategyContinuous(BOUNDS, device, n_envs=64),
+])
+def test_select_action_shape_clipping_and_device(make_strategy, device):
+    strategy = make_strategy(device)
+    states = np.zeros((64, 3), dtype=np.float32)
+    for greedy in ([0., 0.], [1.9, -0.9]):  # the second one close to the bounds, often clipped
+        actions = strategy.select_action(ConstantPolicy(greedy), states)
+        assert actions.shape == (64, 2) and actions.device.type == device
+        low, high = strategy.low, strategy.high
+        assert torch.all((actions >= low) & (actions <= high))
+        assert strategy.ratio_noise_injected.shape == (64,)
+
+    actions = strategy.select_action(ConstantPolicy([1.9, -0.9]), states, max_exploration=True)
+    assert torch.any(actions == strategy.high) and torch.any(actions == strategy.low)
+
+
+def test_noise_scale():
+    torch.manual_seed(0)
+    strategy = utils.BatchNormalNoiseStrategyContinuous(BOUNDS, "cpu", exploration_noise_ratio=0.1)
+    actions = strategy.select_action(ConstantPolicy([0., 0.]), np.zeros((20_000, 3)))
+    np.testing.assert_allclose(actions.std(dim=0), [0.2, 0.1], rtol=0.05)  # ratio * high, never clipped
+
+
+def test_decay_per_env():
+    strategy = utils.BatchNormalNoiseDecayStrategyContinuous(BOUNDS, "cpu", n_envs=3, decay_steps=10)
+    policy, states = ConstantPolicy([0., 0.]), np.zeros((3, 3))
+    active = [True, False, True]
+    for step in range(6):
+        strategy.select_action(policy, states, active=active if step % 2 else None)
+
+    steps = np.array([6, 3, 6])  # the 2nd env only stepped on the even steps
+    np.testing.assert_array_equal(strategy.t, steps)
+    np.testing.assert_allclose(strategy.noise_ratio, decay(steps), rtol=1e-6)
+
+    for _ in range(20):  # past decay_steps, every env stays at min_noise_ratio
+        strategy.select_action(policy, states)
+    np.testing.assert_allclose(strategy.noise_ratio, 0.1, rtol=1e-6)
+
+
+def test_reset_mask():
+    strategy = utils.BatchNormalNoiseDecayStrategyContinuous(BOUNDS, "cpu", n_envs=3, decay_steps=10)
+    policy, states = ConstantPolicy([0., 0.]), np.zeros((3, 3))
+    for _ in range(4):
+        strategy.select_action(policy, states)
+
+    strategy.reset(np.array([False, True, False]))  # e.g. the 2nd env autoreset
+    np.testing.assert_array_equal(strategy.t, [4, 0, 4])
+    np.testing.assert_allclose(strategy.noise_ratio, [decay(4), 0.5, decay(4)], rtol=1e-6)
+
+    strategy.select_action(policy, states)
+    np.testing.assert_allclose(strategy.noise_ratio, decay(np.array([5, 1, 5])), rtol=1e-6)
+
+    strategy.reset()
+    np.testing.assert_array_equal(strategy.t, 0)
+    np.testing.assert_allclose(strategy.noise_ratio, 0.5)
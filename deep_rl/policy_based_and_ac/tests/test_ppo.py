@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import ppo
+
+
+def naive_gaes(rewards, values, dones, gamma, lambdaa):
+    """Aᴳᴬᴱₜ = ∑ₗ (γλ)ˡ δₜ₊ₗ up to the end of the episode (or of the rollout), worker by worker"""
+    T, W = rewards.shape
+    gaes = np.zeros((T, W))
+    for w in range(W):
+        for t in range(T):
+            for l in range(T - t):
+                k = t + l
+                delta = rewards[k, w] + gamma * values[k + 1, w] * (1 - dones[k, w]) - values[k, w]
+                gaes[t, w] += (gamma * lambdaa) ** l * delta
+                if dones[k, w]: break  # the next steps belong to the next episode
+    return gaes
+
+
+@pytest.mark.parametrize("gamma, lambdaa", [(0.99, 0.95), (0.9, 1.), (0.9, 0.)])
+def test_compute_gaes_matches_the_sum(gamma, lambdaa):
+    rng = np.random.default_rng(0)
+    T, W = 8, 3
+    rollout = SimpleNamespace(
+        rewards=rng.normal(size=(T, W)).astype(np.float32), values=rng.normal(size=(T + 1, W)).astype(np.float32),
+        dones=(rng.random((T, W)) < 0.25).astype(np.float32), gamma=gamma, lambdaa=lambdaa,
+        rollout_steps=T, n_workers=W)
+
+    gaes, returns = ppo.PPO.compute_gaes(rollout)
+    expected = naive_gaes(rollout.rewards, rollout.values, rollout.dones, gamma, lambdaa)
+    np.testing.assert_allclose(gaes, expected, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(returns, expected + rollout.values[:-1], rtol=1e-5, atol=1e-5)
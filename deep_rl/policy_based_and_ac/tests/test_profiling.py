@@ -0,0 +1,34 @@
+import configparser
+
+import torch
+
+import profiling
+
+OUTPUTS = {"torch_trace.json", "torch_ops_cpu_time.txt", "torch_ops_memory.txt", "cprofile.prof", "cprofile.txt"}
+
+
+def test_profiled_window(tmp_path):
+    profiler = profiling.StepProfiler(tmp_path, warmup_steps=2, n_steps=3)
+    for t in range(8):
+        profiler.step()
+        assert (profiler.torch_profiler is not None) == (2 <= t < 5)
+        torch.ones(4) @ torch.ones(4)
+    assert {p.name for p in tmp_path.iterdir()} == OUTPUTS
+    assert (tmp_path / "cprofile.txt").read_text().startswith("3 steps after 2 warmup steps")
+
+
+def test_close_during_the_window(tmp_path):
+    profiler = profiling.StepProfiler(tmp_path, warmup_steps=0, n_steps=100)
+    profiler.step()
+    profiler.close()
+    assert (tmp_path / "cprofile.txt").read_text().startswith("1 steps after 0 warmup steps")
+
+
+def test_disabled_by_config(tmp_path):
+    config = configparser.ConfigParser()
+    config.read_string(f"[DEFAULT]\nrun_dir = {tmp_path}\n")
+    profiler = profiling.from_config(tmp_path, config["DEFAULT"], "PPO")
+    for _ in range(200):
+        profiler.step()
+    profiler.close()
+    assert not profiler.enabled and not any(tmp_path.iterdir())
@@ -0,0 +1,74 @@
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from recorder import FrameRecorder
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    """imageio_ffmpeg replaced by a writer keeping the frames it receives (ffmpeg is not needed)"""
+    received = SimpleNamespace(frames=[], size=None, codec=None, closed=False)
+
+    def write_frames(path, size, fps, codec, pix_fmt_out, output_params, macro_block_size):
+        received.size, received.codec = size, codec
+        try:
+            while True:
+                frame = yield
+                if frame is not None: received.frames.append(frame)
+        finally:
+            received.closed = True
+
+    monkeypatch.setitem(sys.modules, "imageio_ffmpeg", SimpleNamespace(write_frames=write_frames))
+    return received
+
+
+def frames(n, height=7, width=9):
+    """RGBA frames whose first pixel is their index"""
+    return [np.full((height, width, 4), i, dtype=np.uint8) for i in range(n)]
+
+
+def test_frames_are_streamed(tmp_path, encoder):
+    with FrameRecorder(tmp_path / "episode.mp4", frame_skip=2, downscale=2, max_queue_size=2) as recorder:
+        for frame in frames(9):
+            recorder.add(frame)
+        recorder.add(None)  # env.render() without a render mode
+
+    assert recorder.n_seen == 9 and recorder.n_written == 5 and encoder.closed
+    assert [f[0, 0, 0] for f in encoder.frames] == [0, 2, 4, 6, 8]
+    # downscaled to 4 x 5, cropped to even dimensions for yuv420p, RGB only
+    assert encoder.size == (4, 4) and encoder.codec == "libx264"
+    assert all(f.shape == (4, 4, 3) and f.flags.c_contiguous for f in encoder.frames)
+
+
+def test_gif_keeps_odd_dimensions(tmp_path, encoder):
+    with FrameRecorder(tmp_path / "episode.gif") as recorder:
+        recorder.add(frames(1)[0])
+    assert encoder.size == (9, 7) and encoder.codec == "gif"
+
+
+def test_drop_when_full():
+    recorder = FrameRecorder("episode.gif", max_queue_size=3, drop_when_full=True)  # no encoder started
+    for frame in frames(5):
+        recorder.add(frame)
+    assert recorder.frames.qsize() == 3 and recorder.n_dropped == 2
+
+
+def test_encoder_failure_does_not_block_the_rollout(tmp_path, monkeypatch):
+    def write_frames(*args, **kwargs):
+        raise OSError("no ffmpeg")
+        yield
+
+    monkeypatch.setitem(sys.modules, "imageio_ffmpeg", SimpleNamespace(write_frames=write_frames))
+    recorder = FrameRecorder(tmp_path / "episode.mp4", max_queue_size=2).start()
+    for frame in frames(10):  # more than the queue holds, the failed encoder keeps consuming
+        recorder.add(frame)
+    with pytest.raises(RuntimeError, match="episode.mp4"):
+        recorder.close()
+
+
+def test_unsupported_extension():
+    with pytest.raises(ValueError):
+        FrameRecorder("episode.png")
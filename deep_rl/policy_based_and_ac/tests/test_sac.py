@@ -0,0 +1,56 @@
+import numpy as np
+import torch
+from torch import nn
+
+import utils
+from fc import FCGP
+
+BOUNDS = np.array([-2., 0.]), np.array([2., 3.])  # scale [2, 1.5], bias [0, 1.5]
+
+
+def naive_logpa(mean, log_std, u, scale):
+    """log π(a|s) = ∑ log N(u; mean, std) - log(scale (1 - tanh²(u))) for a = tanh(u) scale + bias"""
+    log_normal = -0.5 * ((u - mean) / log_std.exp()) ** 2 - log_std - 0.5 * np.log(2 * np.pi)
+    return (log_normal - torch.log(scale * (1 - torch.tanh(u) ** 2))).sum(dim=1, keepdim=True)
+
+
+def test_fcgp_log_prob_is_the_change_of_variable():
+    torch.manual_seed(0)
+    policy = FCGP("cpu", 3, BOUNDS, hidden_dims=(16, 16))
+    states = torch.randn(64, 3)
+
+    with torch.no_grad():
+        torch.manual_seed(1)
+        action, logpa, greedy_action = policy.full_pass(states)
+        torch.manual_seed(1)  # the same noise again, to get the u behind the actions
+        mean, log_std = policy(states)
+        u = mean + log_std.exp() * torch.randn_like(mean)
+
+    np.testing.assert_allclose(action, torch.tanh(u) * policy.action_scale + policy.action_bias, atol=1e-6)
+    np.testing.assert_allclose(logpa, naive_logpa(mean, log_std, u, policy.action_scale), rtol=1e-5, atol=1e-4)
+    assert torch.all((action > policy.lower) & (action < policy.upper))
+    np.testing.assert_allclose(greedy_action, torch.tanh(mean) * policy.action_scale + policy.action_bias)
+
+
+def test_fcgp_log_prob_stays_finite_when_tanh_saturates():
+    """1 - tanh²(u) is 0 in float32 for |u| > 9, the softplus form is not"""
+    policy = FCGP("cpu", 3, BOUNDS, hidden_dims=(16,))
+    with torch.no_grad():
+        policy.output_layer_mean.bias.fill_(20.)
+        policy.output_layer_log_std.bias.fill_(-5.)
+    _, logpa, _ = policy.full_pass(torch.randn(8, 3))
+    assert torch.all(torch.isfinite(logpa))
+
+
+def test_polyak_update():
+    torch.manual_seed(0)
+    target, behavior = nn.Linear(4, 2), nn.Linear(4, 2)
+    expected = [0.9 * t.detach() + 0.1 * b.detach() for t, b in zip(target.parameters(), behavior.parameters())]
+    utils.polyak_update(target, behavior, 0.1)
+    for t, e in zip(target.parameters(), expected):
+        np.testing.assert_allclose(t.detach(), e, rtol=1e-6, atol=1e-7)
+        assert t.requires_grad and t.grad is None
+
+    utils.polyak_update(target, behavior, 1.)
+    for t, b in zip(target.parameters(), behavior.parameters()):
+        assert torch.equal(t, b)
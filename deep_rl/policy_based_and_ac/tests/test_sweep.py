@@ -0,0 +1,40 @@
+import configparser
+
+import sweep
+
+
+def test_expand_grid():
+    grid = sweep.expand_grid(["lr=0.1, 0.2", " tau =0.005", "hidden_dims=(64,64),(256, 256)"])
+    assert grid == [{"lr": "0.1", "tau": "0.005", "hidden_dims": "(64,64)"},
+                    {"lr": "0.1", "tau": "0.005", "hidden_dims": "(256, 256)"},
+                    {"lr": "0.2", "tau": "0.005", "hidden_dims": "(64,64)"},
+                    {"lr": "0.2", "tau": "0.005", "hidden_dims": "(256, 256)"}]
+    assert sweep.expand_grid([]) == [{}]  # no override: the default configuration only
+
+
+def test_config_id():
+    assert sweep.config_id({}) == "default"
+    assert sweep.config_id({"tau": "0.01", "lr": "0.001"}) == "lr=0.001_tau=0.01"
+
+
+def test_write_run_config(tmp_path):
+    run_config = sweep.write_run_config("TD3", 7, {"lr": "0.5"}, tmp_path)
+    config = configparser.ConfigParser()
+    config.read(run_config)
+    assert config["TD3"].getint("seed") == 7 and config["TD3"]["lr"] == "0.5"
+    assert config["TD3"]["model_name"] == str(tmp_path / "model.pt")
+    assert config["DEFAULT"]["results_file"] == str(tmp_path / "curve.json")
+
+
+def test_summarize():
+    run = lambda cid, final, curve, returncode=0: {
+        "config_id": cid, "overrides": {}, "final_score": final, "curve": curve, "returncode": returncode}
+    summary = sweep.summarize([
+        run("a", 1., [0., 1.]), run("b", 5., [4., 5., 6.]), run("a", 3., [2., 3., 4.]),
+        run("c", None, [], returncode=1)])
+
+    assert [s["config_id"] for s in summary] == ["b", "a", "c"]  # best first, failed last
+    a = summary[1]
+    assert a["n_seeds"] == 2 and a["final_score_mean"] == 2. and a["final_score_std"] == 1.
+    assert a["mean_curve"] == [1., 2.]  # aligned on the shortest curve
+    assert summary[2]["n_failed"] == 1 and summary[2]["final_score_mean"] is None
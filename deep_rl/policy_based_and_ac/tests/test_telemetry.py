@@ -0,0 +1,71 @@
+import csv
+import json
+import time
+
+import pytest
+
+from deep_rl.telemetry import Telemetry
+
+
+@pytest.fixture
+def tm(tmp_path):
+    tm = Telemetry().start(tmp_path / "telemetry.jsonl", flush_every=3600.)  # flushed by the tests only
+    yield tm
+    tm.close()
+
+
+def test_timer_max_is_per_interval(tm):
+    with tm.timer("learn"):
+        time.sleep(0.05)
+    first = tm.snapshot()["timers"]["learn"]
+    assert first["calls"] == 1 and first["max_ms"] >= 50.
+
+    for _ in range(3):
+        with tm.timer("learn"):
+            time.sleep(0.001)
+    second = tm.snapshot()["timers"]["learn"]
+    assert second["calls"] == 3 and second["max_ms"] < 50.  # not the 50 ms of the previous interval
+    assert second["mean_ms"] <= second["max_ms"] and second["total_s"] < first["total_s"]
+
+    assert tm.snapshot()["timers"]["learn"] == {"calls": 0, "total_s": 0., "mean_ms": 0., "max_ms": 0.,
+                                                "fraction": 0.}
+
+
+def test_counters_total_and_rate(tm):
+    tm.count("env_steps", 10)
+    first = tm.snapshot()["counters"]["env_steps"]
+    tm.count("env_steps", 5)
+    record = tm.snapshot()
+    second = record["counters"]["env_steps"]
+    assert first["total"] == 10 and second["total"] == 15
+    assert second["per_s"] == pytest.approx(5 / record["interval_s"])
+
+
+def test_disabled_by_default():
+    tm = Telemetry()
+    with tm.timer("learn"):
+        tm.count("updates")
+    assert tm.counters == {} and tm.timers == {}
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".csv"])
+def test_close_writes_a_last_record(tmp_path, suffix):
+    tm = Telemetry().start(tmp_path / f"telemetry{suffix}", flush_every=3600.)
+    tm.count("episodes")
+    with tm.timer("evaluation"):
+        pass
+    tm.close()
+    assert not tm.enabled
+
+    with open(tmp_path / f"telemetry{suffix}") as f:
+        if suffix == ".jsonl":
+            [record] = [json.loads(line) for line in f]
+            assert record["counters"]["episodes"]["total"] == 1 and record["timers"]["evaluation"]["calls"] == 1
+        else:
+            rows = list(csv.DictReader(f))
+            assert [(r["kind"], r["name"]) for r in rows] == [("counter", "episodes"), ("timer", "evaluation")]
+
+
+def test_unsupported_output(tmp_path):
+    with pytest.raises(ValueError):
+        Telemetry().start(tmp_path / "telemetry.txt")
@@ -1,3 +1,7 @@
+import os
+import sys
+import json
+import time
 import random
 import configparser
 from pathlib import Path
@@ -7,16 +11,14 @@ from collections import deque, namedtuple
 import gym
 import torch
 import numpy as np
-import pybullet_envs
-import matplotlib.pyplot as plt
-from matplotlib import animation
-
-
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
 
+from deep_rl.telemetry import TELEMETRY
 
 
 def make_pybullet_env(env_name, render):
+    import pybullet_envs  # registers the bullet envs in gym, only needed for these envs
     spec = gym.envs.registry.spec(env_name)
     spec._kwargs["render"] = render
     env = gym.make(env_name)
@@ -24,8 +26,12 @@ def make_pybullet_env(env_name, render):
 
 
 def get_project_configuration(project_id="TD3"):
-    folder = Path("/home/medhyvinceslas/Documents/courses/gdrl_rl_spe/deep_rl/policy_based_and_ac")
-    config_file = folder / "config.ini"
+    """
+    Read the [DEFAULT] and [project_id] sections of config.ini. The RL_CONFIG environment variable
+    can point to another config file (sweep.py writes one per run).
+    """
+    folder = Path(__file__).parent
+    config_file = os.environ.get("RL_CONFIG", folder / "config.ini")
     config = configparser.ConfigParser()
     config.read(config_file)
 
@@ -35,23 +41,37 @@ def get_project_configuration(project_id="TD3"):
     return folder, conf_default, conf_project, device
 
 
-def save_frames_as_gif(frames, filepath):
+def save_learning_curve(conf_default, scores):
+    """Write the evaluation scores of the run to `results_file` if one is configured"""
+    results_file = conf_default.get("results_file", fallback=None)
+    if not results_file: return
 
-    plt.figure(figsize=(frames[0].shape[1] / 72.0, frames[0].shape[0] / 72.0), dpi=72)
+    with open(results_file, "w") as f:
+        json.dump({"scores": [float(score) for score in scores]}, f)
 
-    patch = plt.imshow(frames[0])
-    plt.axis('off')
 
-    def animate(i):
-        patch.set_data(frames[i])
+def get_run_dir(folder, conf_default):
+    """`run_dir` of [DEFAULT], relative paths are relative to this folder"""
+    run_dir = Path(conf_default.get("run_dir", fallback="runs"))
+    return run_dir if run_dir.is_absolute() else folder / run_dir
 
-    anim = animation.FuncAnimation(plt.gcf(), animate, frames = len(frames), interval=50)
-    anim.save(filepath, writer='imagemagick', fps=60)
 
-    
-def inference(model, env, seed, eval_strategy):
+def start_telemetry(folder, conf_default, project_id):
+    """Enable the telemetry if `telemetry = true` in [DEFAULT], the records go in the run dir"""
+    if conf_default.getboolean("telemetry", fallback=False):
+        fmt = conf_default.get("telemetry_format", fallback="jsonl")
+        name = f"{project_id.lower()}_{time.strftime('%Y%m%d-%H%M%S')}_telemetry.{fmt}"
+        flush_every = conf_default.getfloat("telemetry_flush_every", fallback=10.)
+        TELEMETRY.start(get_run_dir(folder, conf_default) / name, flush_every)
+    return TELEMETRY
+
+
+def inference(model, env, seed, eval_strategy, recorder=None):
+    """
+    Run one greedy episode. If a recorder (see recorder.FrameRecorder) is given, every rendered
+    frame is streamed to it instead of being kept in memory.
+    """
     total_rewards = 0
-    frames = []
 
     s, d = env.reset(seed=seed)[0], False
     
@@ -59,15 +79,28 @@ def inference(model, env, seed, eval_strategy):
         with torch.no_grad():
             a = eval_strategy.select_action(model, s)
         
-        print(a)
-        frames.append(env.render())
+        if recorder is not None:
+            recorder.add(env.render())
         s, r, d, trunc, _ = env.step(a)
         total_rewards += r
         if d or trunc: break
     
     env.close()
 
-    return total_rewards, frames
+    return total_rewards
+
+
+def polyak_update(target, behavior, tau):
+    """
+    Polyak averaging of the target network: θ_target ← (1 - tau) θ_target + tau θ_behavior, in
+    place, parameter by parameter. tau = 1 copies the behavior network into the target one.
+    """
+    with torch.no_grad():
+        for t, b in zip(target.parameters(), behavior.parameters()):
+            if tau == 1.:
+                t.copy_(b)
+            else:
+                t.mul_(1. - tau).add_(b, alpha=tau)
 
 
 
@@ -142,6 +175,90 @@ class NormalNoiseDecayStrategyContinuous():
         return action
 
 
+class BatchNormalNoiseStrategyContinuous():
+    """
+    NormalNoiseStrategyContinuous for a batch of states [B, nS] (one per env).
+    One forward pass for all the envs, noise, clipping and statistics are computed in torch on the
+    device of the policy, so nothing goes back to the host until the actions are sent to the envs.
+    """
+    def __init__(self, bounds, device, exploration_noise_ratio=0.1):
+        low, high = bounds
+        self.device = device
+        self.low = torch.tensor(low, device=device, dtype=torch.float32)
+        self.high = torch.tensor(high, device=device, dtype=torch.float32)
+        self.exploration_noise_ratio = exploration_noise_ratio
+        self.ratio_noise_injected = torch.zeros(1, device=device)  # [B] after the first call
+
+    def select_action(self, model, states, max_exploration=False):
+        if max_exploration:
+            noise_scale = self.high
+        else:
+            noise_scale = self.exploration_noise_ratio * self.high
+
+        states = torch.as_tensor(states, device=self.device, dtype=torch.float32)
+        with torch.no_grad():
+            greedy_actions = model(states)  # [B, nA]
+
+        noise = torch.randn_like(greedy_actions) * noise_scale
+        actions = torch.max(torch.min(greedy_actions + noise, self.high), self.low)
+
+        self.ratio_noise_injected = ((greedy_actions - actions) / (self.high - self.low)).abs().mean(dim=1)
+        return actions
+
+
+class BatchNormalNoiseDecayStrategyContinuous():
+    """
+    NormalNoiseDecayStrategyContinuous for a batch of states [B, nS]. The decay schedule is
+    vectorized: each env has its own step counter t and noise ratio. t only advances for the envs
+    that are active in select_action, and reset(mask) restarts the schedule of the envs that were
+    reset, so envs that run out of lockstep (autoreset, different episode lengths) decay on their
+    own clock.
+    """
+    def __init__(self, bounds, device, n_envs, init_noise_ratio=0.5, min_noise_ratio=0.1,
+                 decay_steps=10000):
+        low, high = bounds
+        self.device = device
+        self.low = torch.tensor(low, device=device, dtype=torch.float32)
+        self.high = torch.tensor(high, device=device, dtype=torch.float32)
+        self.t = torch.zeros(n_envs, device=device)
+        self.init_noise_ratio = init_noise_ratio
+        self.min_noise_ratio = min_noise_ratio
+        self.decay_steps = decay_steps
+        self.noise_ratio = torch.full((n_envs,), init_noise_ratio, device=device)
+        self.ratio_noise_injected = torch.zeros(n_envs, device=device)
+
+    def _noise_ratio_update(self, active):
+        self.t[active] += 1
+        noise_ratio = 1 - self.t / self.decay_steps
+        noise_ratio = (self.init_noise_ratio - self.min_noise_ratio) * noise_ratio + self.min_noise_ratio
+        return noise_ratio.clamp(self.min_noise_ratio, self.init_noise_ratio)
+
+    def reset(self, mask=None):
+        """Restart the decay of the envs in mask (bool [B]), of all the envs if mask is None"""
+        mask = slice(None) if mask is None else torch.as_tensor(mask, device=self.device, dtype=torch.bool)
+        self.t[mask] = 0
+        self.noise_ratio[mask] = self.init_noise_ratio
+
+    def select_action(self, model, states, max_exploration=False, active=None):
+        """active: bool [B] of the envs that step with these actions (None: all of them)"""
+        if max_exploration:
+            noise_scale = self.high.expand(len(self.t), -1)
+        else:
+            noise_scale = self.noise_ratio.unsqueeze(1) * self.high  # [B, nA]
+
+        states = torch.as_tensor(states, device=self.device, dtype=torch.float32)
+        with torch.no_grad():
+            greedy_actions = model(states)  # [B, nA]
+
+        noise = torch.randn_like(greedy_actions) * noise_scale
+        actions = torch.max(torch.min(greedy_actions + noise, self.high), self.low)
+
+        active = slice(None) if active is None else torch.as_tensor(active, device=self.device, dtype=torch.bool)
+        self.noise_ratio = self._noise_ratio_update(active)
+        self.ratio_noise_injected = ((greedy_actions - actions) / (self.high - self.low)).abs().mean(dim=1)
+        return actions
+
+
 class ReplayBuffer:
     """Fixed-size buffer to store experience tuples."""
 
@@ -1,5 +1,5 @@
 import sys
-import configparser
+import random
 from pathlib import Path
 from itertools import count
 from collections import deque
@@ -9,12 +9,15 @@ import gym
 import numpy as np
 import torch
 import torch.optim as optim
-import matplotlib.pyplot as plt
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
+import utils
+import profiling
 from fc import FCDAP, FCV
-import deep_rl.helper_plots as hp
+from evaluation import VectorizedEvaluator, greedy_discrete
+
+tm = utils.TELEMETRY
 
 
 """Vanilla Policy Gradient (VPG) or REINFORCE with baseline
@@ -76,8 +79,11 @@ class VPG():
 
     
     def interact_with_environment(self, state, env):
-        action, logpa, entropy = self.policy.full_pass(state)
-        next_state, reward, is_terminal, _, _ = env.step(action)
+        with tm.timer("action_selection"):
+            action, logpa, entropy = self.policy.full_pass(state)
+        with tm.timer("env_step"):
+            next_state, reward, is_terminal, _, _ = env.step(action)
+        tm.count("env_steps")
 
         self.logpas.append(logpa)
         self.rewards.append(reward)
@@ -111,10 +117,12 @@ class VPG():
         loss = policy_loss + self.entropy_loss_weight * entropy_loss_H
 
         self.p_optimizer.zero_grad()
-        loss.backward()
+        with tm.timer("backward"):
+            loss.backward()
         # clip the gradient
         torch.nn.utils.clip_grad_norm_(self.policy.parameters(), self.p_max_grad)
-        self.p_optimizer.step()
+        with tm.timer("optimizer_step"):
+            self.p_optimizer.step()
 
         # --------------------------------------------------------------------
         # A(St, At) = Gt - V(St)
@@ -122,9 +130,11 @@ class VPG():
 
         value_loss = advantage.pow(2).mul(0.5).mean()
         self.v_optimizer.zero_grad()
-        value_loss.backward()
+        with tm.timer("backward"):
+            value_loss.backward()
         torch.nn.utils.clip_grad_norm_(self.value_model.parameters(), self.v_max_grad)
-        self.v_optimizer.step()
+        with tm.timer("optimizer_step"):
+            self.v_optimizer.step()
 
 
     def evaluate_one_episode(self, env, seed):
@@ -154,13 +164,7 @@ class VPG():
 
 
 if __name__ == "__main__":
-    folder = Path("/home/medhyvinceslas/Documents/courses/gdrl_rl_spe/deep_rl/policy_based_and_ac")
-    config_file = folder / "config.ini"
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    
-    conf = config["DEFAULT"]
-    conf_vpg = config["VPG"]
+    folder, conf, conf_vpg, device = utils.get_project_configuration(project_id="VPG")
 
     model_path = Path(folder / conf_vpg.get("model_name"))
     is_evaluation = conf.getboolean("evaluate_only")
@@ -172,20 +176,28 @@ if __name__ == "__main__":
     conf_vpg["nA"] = f"{nA}"
 
     # Vanilla Policy Gradient
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    agent = VPG(conf_vpg, device)
     seed = conf.getint("seed")
+    torch.manual_seed(seed); np.random.seed(seed); random.seed(seed)
+    agent = VPG(conf_vpg, device)
+    utils.start_telemetry(folder, conf, "VPG")
     moving_avg_100 = deque(maxlen=100)
 
     if is_evaluation:
         agent.policy.load_state_dict(torch.load(model_path))
         mean_eval_score, _ = agent.evaluate_one_episode(env, seed=seed)
     else:
-        evaluation_scores = deque(maxlen=100)
+        evaluation_scores = deque(maxlen=100)  # returns of the last 100 evaluation episodes
+        learning_curve = []
         n_episodes = conf_vpg.getint("n_episodes")
         goal_mean_100_reward = conf_vpg.getint("goal_mean_100_reward")
 
+        eval_every = conf_vpg.getint("eval_every", fallback=1)
+        evaluator = VectorizedEvaluator(lambda: gym.make(env_name),
+                                        conf_vpg.getint("n_eval_episodes", fallback=1), seed)
+        profiler = profiling.from_config(folder, conf, "VPG")
+
         for i_episode in range(1, n_episodes + 1):
+            profiler.step()
             state, is_terminal = env.reset(seed=seed)[0], False
 
             agent.reset_metrics()
@@ -197,22 +209,40 @@ if __name__ == "__main__":
             next_value = 0 if is_terminal else agent.value_model(state).detach().item()
             agent.rewards.append(next_value)
             
-            agent.learn()
-            mean_eval_score, _ = agent.evaluate_one_episode(env, seed=seed)
-            evaluation_scores.append(mean_eval_score)
+            with tm.timer("learn"):
+                agent.learn()
+            tm.count("updates")
+            tm.count("episodes")
+            training_done = i_episode >= n_episodes
+            if i_episode % eval_every != 0 and not training_done: continue  # always evaluate the last episode
+
+            with tm.timer("evaluation"):
+                scores = evaluator.evaluate(greedy_discrete(agent.policy))
+            evaluation_scores.extend(scores["returns"])
+            learning_curve.append(scores["mean"])
 
             if len(evaluation_scores) >= 100:
                 mean_100_eval_score = np.mean(evaluation_scores)
-                print(f"Episode {i_episode}\tAverage mean 100 eval score: {mean_100_eval_score}")
+                print(f"Episode {i_episode}\tAverage mean 100 eval score: {mean_100_eval_score}\t"
+                      f"(last eval: {scores['mean']:.1f} ± {scores['std']:.1f})")
                 moving_avg_100.append(mean_100_eval_score)
 
-            if(mean_100_eval_score >= goal_mean_100_reward):
-                torch.save(agent.policy.state_dict(), model_path)
-                break
+                if(mean_100_eval_score >= goal_mean_100_reward):
+                    torch.save(agent.policy.state_dict(), model_path)
+                    break
+
+        profiler.close()
+        evaluator.close()
+        utils.save_learning_curve(conf, learning_curve)
 
+    tm.close()
     env.close()
 
     if not is_evaluation:
+        # plotting libraries are only imported when we actually plot
+        import matplotlib.pyplot as plt
+        import deep_rl.helper_plots as hp
+
         hp.basis_plotting_style(
             "Moving Avg. reward per episode (Evaluation)", "Episodes", "Avg. rewards")
         plt.plot(moving_avg_100)
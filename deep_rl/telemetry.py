@@ -0,0 +1,168 @@
+import csv
+import json
+import time
+import threading
+from pathlib import Path
+
+
+"""
+Training telemetry: counters and stage timers aggregated in the training process, and flushed
+periodically to a JSONL or CSV file by a background thread.
+
+    from deep_rl.telemetry import TELEMETRY as tm
+
+    with tm.timer("env_step"):
+        s, r, d, trunc, _ = env.step(a)
+    tm.count("env_steps")
+
+TELEMETRY is disabled by default: timer() returns a shared no-op context manager and count()
+returns immediately, so the instrumented code costs a method call when telemetry is off.
+It is enabled with TELEMETRY.start(filepath).
+
+Timers can be nested (e.g. "sample" inside "sample_and_learn"), so the fractions of the stages do
+not necessarily sum to 1.
+
+Each flush writes, for the time elapsed since the previous flush:
+- counters: total and rate per second (env steps/s, updates/s, ...)
+- timers: number of calls, total time, mean/max duration over the interval, and the fraction of the wall time spent
+  in the stage (env step, action selection, sampling, learning, target sync, evaluation)
+"""
+
+
+class _NullTimer():
+    def __enter__(self): return self
+    def __exit__(self, *args): return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer():
+    __slots__ = ("stats", "start")
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.start = time.perf_counter()  # monotonic clock
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        stats = self.stats
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]: stats[2] = elapsed
+        return False
+
+
+class Telemetry():
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.timers = {}  # name -> [n calls, total seconds, max seconds]
+        self._timer_objects = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, filepath, flush_every=10.):
+        """Enable the telemetry and flush every `flush_every` seconds to filepath (.jsonl or .csv)"""
+        self.filepath = Path(filepath)
+        if self.filepath.suffix not in (".jsonl", ".csv"):
+            raise ValueError(f"Unsupported telemetry output {self.filepath.suffix}, use .jsonl or .csv")
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        self.flush_every = flush_every
+        self.t_start = self._t_last = time.perf_counter()
+        self._last_counters, self._last_timers = {}, {}
+        self.enabled = True
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def count(self, name, n=1):
+        if not self.enabled: return
+        # only the training loop writes, the flush thread reads a copy: no lock needed
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timer(self, name):
+        if not self.enabled: return _NULL_TIMER
+        timer = self._timer_objects.get(name)
+        if timer is None:
+            self.timers[name] = [0, 0., 0.]
+            timer = self._timer_objects[name] = _Timer(self.timers[name])
+        return timer
+
+    def close(self):
+        """Stop the flush thread and write a last record"""
+        if self._thread is None: return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+        self.enabled = False
+
+    def snapshot(self):
+        """Aggregate the counters and timers since the previous snapshot"""
+        now = time.perf_counter()
+        dt = max(now - self._t_last, 1e-9)
+        counters = dict(self.counters)
+        timers = {}
+        for name, stats in list(self.timers.items()):
+            timers[name] = list(stats)
+            # the max is per interval, like the other stats (a timer that exits between the copy
+            # and the reset is missed by the max of this interval, not by its calls or total)
+            stats[2] = 0.
+
+        record = {"time": time.time(), "elapsed_s": now - self.t_start, "interval_s": dt,
+                  "counters": {}, "timers": {}}
+
+        for name, total in counters.items():
+            delta = total - self._last_counters.get(name, 0)
+            record["counters"][name] = {"total": total, "per_s": delta / dt}
+
+        for name, (n, total_s, max_s) in timers.items():
+            last_n, last_total_s, _ = self._last_timers.get(name, (0, 0., 0.))
+            n_calls, stage_s = n - last_n, total_s - last_total_s
+            record["timers"][name] = {
+                "calls": n_calls,
+                "total_s": stage_s,
+                "mean_ms": 1000 * stage_s / n_calls if n_calls else 0.,
+                "max_ms": 1000 * max_s,
+                "fraction": stage_s / dt,
+            }
+
+        self._t_last, self._last_counters, self._last_timers = now, counters, timers
+        return record
+
+    def flush(self):
+        record = self.snapshot()
+
+        if self.filepath.suffix == ".jsonl":
+            with open(self.filepath, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        else:
+            # long format, so new counters or timers do not change the header
+            new_file = not self.filepath.exists()
+            with open(self.filepath, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["elapsed_s", "kind", "name", "value", "per_s", "calls",
+                                     "mean_ms", "max_ms", "fraction"])
+                e = round(record["elapsed_s"], 3)
+                for name, c in record["counters"].items():
+                    writer.writerow([e, "counter", name, c["total"], c["per_s"], "", "", "", ""])
+                for name, t in record["timers"].items():
+                    writer.writerow([e, "timer", name, t["total_s"], "", t["calls"],
+                                     t["mean_ms"], t["max_ms"], t["fraction"]])
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_every):
+            self.flush()
+
+
+# process-wide instance, used by every agent
+TELEMETRY = Telemetry()
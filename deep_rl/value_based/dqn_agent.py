@@ -1,3 +1,5 @@
+import sys
+from pathlib import Path
 from collections import deque
 from itertools import count
 import warnings ; warnings.filterwarnings('ignore')
@@ -13,6 +15,10 @@ from dqns import DQN, DuelingDQN
 from replay_buffer import ReplayBuffer
 from action_selection import EGreedyExpStrategy
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from deep_rl.telemetry import TELEMETRY as tm
+
 
 class Agent():
     """
@@ -58,13 +64,17 @@ class Agent():
 
     def interact_with_environment(self, env, state, nA):
         state = torch.from_numpy(state).float().unsqueeze(0).to(self.device)
-        action = self.strategy.select_action(self.behavior_policy, state, nA)
-        next_state, reward, done, _, _ = env.step(action)
+        with tm.timer("action_selection"):
+            action = self.strategy.select_action(self.behavior_policy, state, nA)
+        with tm.timer("env_step"):
+            next_state, reward, done, _, _ = env.step(action)
+        tm.count("env_steps")
         return action, reward, next_state, done
 
     def sample_and_learn(self):
 
-        states, actions, rewards, next_states, dones = self.memory.sample(self.device)
+        with tm.timer("sample"):
+            states, actions, rewards, next_states, dones = self.memory.sample(self.device)
         
         if self.use_ddqn:
             """
@@ -92,8 +102,10 @@ class Agent():
 
         loss = F.huber_loss(Q_expected, Q_targets, delta=np.inf)
         self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+        with tm.timer("backward"):
+            loss.backward()
+        with tm.timer("optimizer_step"):
+            self.optimizer.step()
 
     
     def sync_weights(self, use_polyak_averaging=True):
@@ -143,10 +155,13 @@ if __name__ == "__main__":
         "update_every": 20,
         "warmup_batch_size": 5,
         "strategy": EGreedyExpStrategy(),
-        "device": torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        "device": torch.device("cuda:0" if torch.cuda.is_available() else "cpu"),
+        "telemetry_file": None  # e.g. "runs/dqn_telemetry.jsonl" to record steps/s and stage timers
     }
 
     agent = Agent(ENV_CONF, AGENT_CONF, TRAIN_CONF)
+    if TRAIN_CONF["telemetry_file"] is not None:
+        tm.start(Path(__file__).parent / TRAIN_CONF["telemetry_file"])
     
     bs = TRAIN_CONF["batch_size"]
     warmup_bs = TRAIN_CONF["warmup_batch_size"]
@@ -168,16 +183,21 @@ if __name__ == "__main__":
             state = next_state
 
             if len(agent.memory) > bs * warmup_bs:
-                agent.sample_and_learn()  # one step optimization on the behavior policy
-                agent.sync_weights(use_polyak_averaging=True)
+                with tm.timer("sample_and_learn"):
+                    agent.sample_and_learn()  # one step optimization on the behavior policy
+                tm.count("updates")
+                with tm.timer("target_sync"):
+                    agent.sync_weights(use_polyak_averaging=True)
 
             if done: break
             score += reward
 
         scores_window.append(score)
+        tm.count("episodes")
 
         if i_episode % 10 == 0:
             print(f"Episode {i_episode}\tAverage {last_n_score} scores: {np.mean(scores_window)}")
                 
     
+    tm.close()
     env.close()
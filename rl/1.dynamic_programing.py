@@ -1,17 +1,36 @@
-from collections import namedtuple
+import time
+import inspect
+import tempfile
+from collections import namedtuple, deque
 
 import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from utils import TabularPolicy
+from mdp import CompiledMDP, DiskMDP, gather_rows, matvec_into, policy_to_array, make_gridworld, make_random_mdp
 
 """
 Here are algorithms to balance short term and long term rewards.
 Algorithms for learning from Sequential feedbacks.
 """
 
+# value iteration methods that can stream the transitions of a DiskMDP with a memory bounded by a
+# chunk of states plus V (the other methods need T_π, the predecessors, the sub matrices of T or
+# the full Q and a history of iterates in RAM)
+DISK_METHODS = ("jacobi", "gauss_seidel")
+
 
 class DynamicProgramming:
     """
     Algorithms for finding optimal policy when we have access to the MDP
     (the dynamic of the environment P)
+
+    P is compiled once into sparse arrays (see mdp.CompiledMDP), so a sweep over all the states
+    is a sparse matrix-vector product and the greedy improvement a vectorized argmax.
+    A CompiledMDP can also be given directly instead of P, or a DiskMDP for MDPs that do not fit
+    in RAM: value iteration (the methods of DISK_METHODS) then streams the transitions from disk,
+    chunk of states by chunk of states, the other algorithms raise a ValueError.
     """
     def __init__(self, π, P, gamma=0.99, theta=1e-10):
         self.π = π
@@ -19,13 +38,21 @@ class DynamicProgramming:
         self.gamma = gamma
         self.theta = theta
 
-        self.states_size = len(P)
-        self.actions_size = len(P[0])
+        self.mdp = P if isinstance(P, (CompiledMDP, DiskMDP)) else CompiledMDP.from_P(P)
+        self.states_size = self.mdp.nS
+        self.actions_size = self.mdp.nA
+        self.stats = {}  # sweeps / backups done by the last call
+
+
+    def _check_in_ram(self, name):
+        if isinstance(self.mdp, DiskMDP):
+            raise ValueError(f"{name} is not available on a DiskMDP, use value_iteration with a method "
+                             f"in {DISK_METHODS}")
 
 
     #### Estimating State-Value functions ####
 
-    def _policy_evaluation(self):
+    def _policy_evaluation(self, method="sweeps", V0=None, m=5):
         """
         Evaluating an arbitrary policy π by computing its V-function (state-value function)
 
@@ -34,23 +61,118 @@ class DynamicProgramming:
             - Dynamic of the environment P
             - Discount factor gamma
             - Treshold theta to stop iterating if not enough changes
+            - method:
+                "sweeps": iterate the Bellman expectation equation until changes < theta
+                "spsolve": exact solution of the linear system (I − γP_π) V = R_π (direct solver)
+                "gmres", "bicgstab": same system with an iterative Krylov solver
+                "anderson": sweeps with Anderson acceleration over the last m iterates
+            - V0: initial guess for "sweeps", "anderson" and the iterative solvers
         Output:
             - Value function
         """
-        old_V = np.zeros(self.states_size)
-        while True:
-            V = np.zeros(self.states_size)
-            for s in range(self.states_size):  # one sweep is completed when this loop is completed
-                action = self.π[s]
+        self._check_in_ram("Policy evaluation")
+        π = policy_to_array(self.π, self.states_size)
+        T_π, R_π = self.mdp.policy_model(π)  # rows of the actions selected by π
 
-                # iterate over possible transitions of "action"
-                for t in self.P[s][action]:
-                    episode_continue = not t.episode_is_done
-                    V[s] += t.prob * (t.r + self.gamma * old_V[t.next_state] * episode_continue)
+        old_V = np.zeros(self.states_size) if V0 is None else np.array(V0, dtype=np.float64)
+
+        if method == "anderson":
+            γT_π = (T_π * self.gamma).tocsr()
+            return self._anderson(lambda V: matvec_into(γT_π, V, R_π.copy()), old_V, m)
+
+        if method != "sweeps":
+            return self._solve_policy_system(T_π, R_π, method, V0)
+
+        # V(s) = R(s, π(s)) + γ ∑ p(s'|s, π(s)) V(s')
+        # 2 buffers swapped at each sweep, the new V is written in the old one
+        V, γV = np.empty(self.states_size), np.empty(self.states_size)
+        self.stats = {"sweeps": 0}
+        while True:
+            np.multiply(old_V, self.gamma, out=γV)
+            V[:] = R_π
+            matvec_into(T_π, γV, V)  # one sweep
+            self.stats["sweeps"] += 1
 
             if np.max(np.abs(old_V - V)) < self.theta: break
-            old_V = V.copy()
+            old_V, V = V, old_V
         return V  #[v0, v1, v2] value of 3 states
+
+
+    def _anderson(self, backup, V, m):
+        """
+        Anderson acceleration of the fixed point iteration V = G(V) (G: one sweep). With the
+        residuals f_k = G(V_k) - V_k, the next iterate combines the last m + 1 sweeps:
+            V_k+1 = G(V_k) - ΔG c,  c = argmin ||f_k - ΔF c||
+        ΔF and ΔG being the differences of the successive residuals and sweeps (a least squares
+        of m columns per sweep). Safeguard: if the residual of an accelerated iterate is larger
+        than the one of the previous iterate, the accelerated step is rejected and replaced by
+        the plain step G(V_k).
+        On the demos (γ = 0.99), policy evaluation needs about 10 times fewer sweeps. Value
+        iteration on the random MDP too, but not on the gridworld, where the max of the backup
+        keeps switching actions and the plain sweeps already converge in about 200 sweeps.
+        """
+        ΔF, ΔG = deque(maxlen=m), deque(maxlen=m)
+        previous_f = previous_G = None
+        previous_residual, accelerated = np.inf, False
+        self.stats = {"sweeps": 0, "fallbacks": 0}
+
+        while True:
+            G_V = backup(V)
+            f = G_V - V
+            residual = np.max(np.abs(f))
+            self.stats["sweeps"] += 1
+            if residual < self.theta: return G_V
+
+            if accelerated and residual > previous_residual:
+                V, accelerated = previous_G, False  # plain step from the previous iterate
+                self.stats["fallbacks"] += 1
+                continue
+            previous_residual = residual
+
+            if previous_f is not None:
+                ΔF.append(f - previous_f)
+                ΔG.append(G_V - previous_G)
+            previous_f, previous_G = f, G_V
+
+            if ΔF:
+                c = np.linalg.lstsq(np.stack(ΔF, axis=1), f, rcond=None)[0]
+                V, accelerated = G_V - np.stack(ΔG, axis=1) @ c, True
+            else:
+                V = G_V
+
+
+    def _solve_policy_system(self, T_π, R_π, method, V0=None):
+        """
+        V_π is the fixed point of V = R_π + γ T_π V, so the solution of the sparse linear system
+        (I − γ T_π) V = R_π. It is non singular for γ < 1 (or if every episode terminates).
+
+        When to use it: sweeps need about log(theta) / log(γ) iterations, so they get slow when
+        γ is close to 1, while the cost of the factorization of spsolve does not depend on γ but
+        grows with its fill-in. On local MDPs (gridworlds) spsolve wins from γ ≈ 0.99 and by far
+        for γ >= 0.999 (50x50 gridworld, γ = 0.999: 0.01s vs 0.35s for sweeps). With long range
+        transitions (random MDPs) the fill-in makes it slow above a few thousand states. At
+        γ = 0.9 or in policy iteration, where sweeps are warm started, sweeps (the default) win.
+        gmres and bicgstab (without preconditioner) stall for γ >= 0.9999.
+        """
+        self.stats = {"sweeps": 0, "solver": method}
+        A = sp.identity(self.states_size, format="csr") - self.gamma * T_π
+
+        if method == "spsolve":
+            return spla.spsolve(A.tocsc(), R_π)
+
+        solvers = {"gmres": spla.gmres, "bicgstab": spla.bicgstab}
+        if method not in solvers:
+            raise ValueError(f"Unknown evaluation method {method}, use sweeps, spsolve, {', '.join(solvers)}")
+        solver = solvers[method]
+
+        # ||V - V_π||∞ <= ||residual||∞ / (1 - γ), we ask for a residual of the order of theta
+        # (the relative tolerance is called tol in old scipy versions, rtol in recent ones)
+        rtol_name = "rtol" if "rtol" in inspect.signature(solver).parameters else "tol"
+        tol = self.theta * (1 - self.gamma) / max(np.linalg.norm(R_π), 1e-12) if self.gamma < 1 else self.theta
+        V, info = solver(A, R_π, x0=V0, atol=0., **{rtol_name: tol})
+        if info > 0:
+            raise RuntimeError(f"{method} did not converge in {info} iterations")
+        return V
     
 
     #### -------------------------------------------------------------------------------------- ####
@@ -71,72 +193,471 @@ class DynamicProgramming:
         Output:
             - New policy π
         """
-        Q = np.zeros((self.states_size, self.actions_size), dtype=np.float64)
+        Q = self.mdp.q_values(V, self.gamma)
+        π = policy_to_array(self.π, self.states_size)
+        greedy_action_per_state = self._greedy(Q, π)  # a*
+        return TabularPolicy(greedy_action_per_state)
 
-        for s in range(self.states_size):
-            for action, transitions_list in self.P[s].items():  # iterate over actions available in a state
-                for t in transitions_list:  # iterate over possible transitions of "action"
-                    episode_continue = not t.episode_is_done
-                    Q[s][action] += t.prob * (t.r + self.gamma * V[t.next_state] * episode_continue)
-        
-        new_π = {}
-        greedy_action_per_state = np.argmax(Q, axis=1)  # a*
-        for s in range(self.states_size):
-            new_π[s] = greedy_action_per_state[s]
-        
-        return new_π
+
+    def _greedy(self, Q, π):
+        """
+        argmax of Q, but keep the current action of π when it is as good as a* (up to theta):
+        with ties, the argmax could switch between equivalent actions forever because of
+        rounding errors in V
+        """
+        states = np.arange(self.states_size)
+        greedy_action_per_state = np.argmax(Q, axis=1)
+        keep = Q[states, π] >= Q[states, greedy_action_per_state] - self.theta
+        return np.where(keep, π, greedy_action_per_state)
 
     #### -------------------------------------------------------------------------------------- ####
 
     #### Find Optimal Policies ####
 
-    def policy_iteration(self):
+    def policy_iteration(self, evaluation="sweeps"):
         """
         - Repeat Evaluation and Improvement over and over
+        - evaluation: method of _policy_evaluation, "sweeps" by default (warm started from the V
+          of the previous policy). "spsolve" makes each evaluation exact, it pays for γ close to 1
+          (see _solve_policy_system)
         """
+        self._check_in_ram("Policy iteration")
+        V = None
         while True:
-            V = self._policy_evaluation()
+            V = self._policy_evaluation(method=evaluation, V0=V)
             new_π = self._policy_improvement(V)
             
-            if self.π == new_π: break  # no further improvements (no changes in π)
+            if new_π == self.π: break  # no further improvements (TabularPolicy.__eq__ also takes a dict or an array)
             self.π = new_π
         
         return V, self.π
 
 
-    def value_iteration(self):
+    def value_iteration(self, method="jacobi", block_size=1024, batch_size=1024, m=5):
         """
         Policy iteration but without waiting for multiple sweeps of V before improving Policy.
         Part of GPI (Generalized Policy Iteration)
+
+        - method:
+            "jacobi": synchronous sweeps, every state is backed up from the V of the previous sweep
+            "gauss_seidel": in-place sweeps over blocks of `block_size` states, a block is backed
+                up with the values already updated by the previous blocks of the same sweep. The
+                direction alternates at each sweep (symmetric Gauss-Seidel).
+            "prioritized": prioritized sweeping, only the states with the highest Bellman error
+                are backed up (`batch_size` at a time), then the errors of their predecessors are
+                updated. Fewer backups than jacobi, but a partial backup costs more per state
+                than a full sweep, so it only pays when few states keep changing
+            "elimination": jacobi sweeps with action elimination, the (s, a) pairs that are
+                provably suboptimal are dropped for good from the next sweeps
+            "anderson": jacobi sweeps with Anderson acceleration over the last m iterates
+        self.stats holds the number of sweeps and state backups needed to reach theta.
+        With a DiskMDP, the sweeps are streamed over chunks of mdp.chunk_states states.
         """
+        if isinstance(self.mdp, DiskMDP):
+            if method not in DISK_METHODS:
+                self._check_in_ram(f"{method} value iteration")
+            block_size = self.mdp.chunk_states
+
+        if method == "gauss_seidel":
+            V = self._gauss_seidel_value_iteration(block_size)
+        elif method == "prioritized":
+            V = self._prioritized_sweeping(batch_size)
+        elif method == "elimination":
+            V = self._action_elimination_value_iteration()
+        elif method == "anderson":
+            backup = lambda V: self.mdp.q_values(V, self.gamma).max(axis=1)
+            V = self._anderson(backup, np.zeros(self.states_size), m)
+        elif method == "jacobi":
+            V = self._jacobi_value_iteration()
+        else:
+            raise ValueError(f"Unknown value iteration method {method}")
+
+        if isinstance(self.mdp, DiskMDP):
+            greedy_action_per_state = np.concatenate([
+                self.mdp.q_values_block(V, self.gamma, start, stop).argmax(axis=1)
+                for start, stop in self.mdp.chunks()])
+        else:
+            greedy_action_per_state = np.argmax(self.mdp.q_values(V, self.gamma), axis=1)
+        return V, TabularPolicy(greedy_action_per_state)
+
+
+    def _jacobi_value_iteration(self):
+        nS, nA = self.states_size, self.actions_size
+        if isinstance(self.mdp, DiskMDP):
+            return self._streamed_value_iteration()
+
+        # buffers allocated once, V and new_V are swapped at each sweep
+        V, new_V = np.zeros(nS), np.empty(nS)
+        Q, γV = np.empty(nS * nA), np.empty(nS)
+        self.stats = {"sweeps": 0, "backups": 0, "pair_backups": 0}
+        n_pairs = int(self.mdp.valid.sum())
+
+        while True:
+            Q_sa = self.mdp.q_values(V, self.gamma, out=Q, buffer=γV)  # one sweep
+            np.max(Q_sa, axis=1, out=new_V)  # highest value per state
+            self.stats["sweeps"] += 1
+            self.stats["backups"] += nS
+            self.stats["pair_backups"] += n_pairs
+
+            converged = np.max(np.abs(V - new_V)) < self.theta
+            V, new_V = new_V, V
+            if converged: break
+        return V
 
-        V = np.zeros(self.states_size)
+
+    def _streamed_value_iteration(self):
+        """Jacobi sweeps on a DiskMDP, each sweep reads the transitions one chunk at a time"""
+        nS, nA = self.states_size, self.actions_size
+        V, new_V = np.zeros(nS), np.empty(nS)
+        Q = np.empty(self.mdp.chunk_states * nA)
+        self.stats = {"sweeps": 0, "backups": 0}
 
         while True:
-            Q = np.zeros((self.states_size, self.actions_size), dtype=np.float64)
+            for start, stop in self.mdp.chunks():
+                Q_chunk = self.mdp.q_values_block(V, self.gamma, start, stop, out=Q[:(stop - start) * nA])
+                np.max(Q_chunk, axis=1, out=new_V[start:stop])
+            self.stats["sweeps"] += 1
+            self.stats["backups"] += nS
 
-            for s in range(self.states_size):  # one sweep is completed when this loop is completed
-                for action, transitions_list in self.P[s].items():  # iterate over actions available in a state
-                    for t in transitions_list:  # iterate over possible transitions of "action"
-                        episode_continue = not t.episode_is_done
-                        Q[s][action] += t.prob * (t.r + self.gamma * V[t.next_state] * episode_continue)
+            converged = np.max(np.abs(V - new_V)) < self.theta
+            V, new_V = new_V, V
+            if converged: break
+        return V
 
-            highest_value_per_state = np.max(Q, axis=1)
-            if np.max(np.abs(V - highest_value_per_state)) < self.theta: break
 
-            V = highest_value_per_state
-            
-            new_π = {}
-            greedy_action_per_state = np.argmax(Q, axis=1)
-            for s in range(self.states_size):
-                new_π[s] = greedy_action_per_state[s]
-        
-        return V, new_π
+    def _gauss_seidel_value_iteration(self, block_size):
+        nS, nA = self.states_size, self.actions_size
+        blocks = [(start, min(start + block_size, nS)) for start in range(0, nS, block_size)]
+
+        V = np.zeros(nS)
+        Q = np.empty(block_size * nA)
+        self.stats = {"sweeps": 0, "backups": 0}
+
+        while True:
+            max_change = 0.
+            order = blocks if self.stats["sweeps"] % 2 == 0 else blocks[::-1]
+            for start, stop in order:
+                Q_block = self.mdp.q_values_block(V, self.gamma, start, stop, out=Q[:(stop - start) * nA])
+                new_V = Q_block.max(axis=1)
+                max_change = max(max_change, np.max(np.abs(new_V - V[start:stop])))
+                V[start:stop] = new_V  # in place: the next blocks see these values
+
+            self.stats["sweeps"] += 1
+            self.stats["backups"] += nS
+            if max_change < self.theta: break
+        return V
+
+
+    def _action_elimination_value_iteration(self, check_every=5, rebuild_ratio=0.9):
+        """
+        Bounds on V* from the change of a sweep δ = TV - V (T monotone, γ-contraction, and its
+        rows sum to c_sa <= 1 with terminal transitions):
+            V + min(δ, 0) / (1 - γ) <= V* <= V + max(δ, 0) / (1 - γ)
+        so, with Q = R + γ T V:
+            Q_lo(s, a) = Q(s, a) + γ c_sa min(δ, 0) / (1 - γ) <= Q*(s, a) <= Q(s, a) + γ c_sa max(δ, 0) / (1 - γ) = Q_hi(s, a)
+        If Q_hi(s, a) < max_a' Q_lo(s, a'), a is not optimal in s and is eliminated for good: the
+        optimal actions are never eliminated, so the sweeps on the remaining actions still
+        converge to V*.
+
+        The bounds are checked every `check_every` sweeps (the check costs about as much as a
+        sweep). The sweep works on the rows of T of the remaining pairs only. That sub matrix is
+        rebuilt when the number of remaining pairs drops below rebuild_ratio * its number of rows.
+        self.stats["eliminated_fraction"] is the fraction of pairs eliminated after each sweep.
+        """
+        if self.gamma >= 1:
+            raise ValueError("The bounds of action elimination need gamma < 1")
+        nS, nA = self.states_size, self.actions_size
+        c_sa = np.asarray(self.mdp.T.sum(axis=1)).ravel()
+        remaining = self.mdp.valid.copy()
+        n_valid = remaining.sum()
+        has_actions = remaining.reshape(nS, nA).any(axis=1)
+
+        V = np.zeros(nS)
+        self.stats = {"sweeps": 0, "backups": 0, "pair_backups": 0, "eliminated_fraction": []}
+        rows = None
+
+        while True:
+            if rows is None or remaining.sum() < rebuild_ratio * len(rows):
+                rows = np.flatnonzero(remaining)  # sorted: the pairs of a state are contiguous
+                T_rows, R_rows, c_rows = self.mdp.T[rows], self.mdp.R[rows], c_sa[rows]
+                states_of_rows = rows // nA
+                state_starts = np.flatnonzero(np.diff(states_of_rows, prepend=-1))  # first row of each state
+
+            Q = R_rows + self.gamma * (T_rows @ V)
+            new_V = V.copy()  # states without actions keep their value
+            new_V[has_actions] = np.maximum.reduceat(Q, state_starts)
+            self.stats["sweeps"] += 1
+            self.stats["backups"] += nS
+            self.stats["pair_backups"] += len(rows)
+
+            δ = new_V - V
+            V = new_V
+            if np.max(np.abs(δ)) < self.theta: break
+            if self.stats["sweeps"] % check_every == 0:
+                # bounds of Q* and elimination of the pairs that cannot be optimal
+                Q_lo = Q + self.gamma * c_rows * min(δ.min(), 0.) / (1 - self.gamma)
+                Q_hi = Q + self.gamma * c_rows * max(δ.max(), 0.) / (1 - self.gamma)
+                best_lo = np.maximum.reduceat(Q_lo, state_starts)
+                best_lo_of_rows = np.repeat(best_lo, np.diff(np.append(state_starts, len(rows))))
+                remaining[rows[Q_hi < best_lo_of_rows]] = False
+            self.stats["eliminated_fraction"].append(1 - remaining.sum() / n_valid)
+
+        return V
+
+
+    def _prioritized_sweeping(self, batch_size, dense_ratio=0.25):
+        """
+        The priority of a state is its Bellman error |max_a Q(s, a) - V(s)|. Each step backs up
+        the `batch_size` states of highest priority (argpartition of the priorities, a python
+        heap spends more time in heappop than in the backups). Backing up s only changes the
+        errors of its predecessors (the states that can reach s), gathered from the transposed
+        transition structure, so only their backups TV are recomputed. TV is then up to date for
+        every state, and backing up a state is just V[s] = TV[s]. When the predecessors are more
+        than dense_ratio * nS states, a full sweep (one sparse product) is cheaper than gathering
+        their transitions.
+        self.stats: "backups" counts the updates of V (as for jacobi), "error_evaluations" the
+        states whose backup TV was computed (the real cost).
+        """
+        nS = self.states_size
+        predecessors = self.mdp.predecessors()
+
+        V = np.zeros(nS)
+        TV = self.mdp.q_values(V, self.gamma).max(axis=1)
+        priority = np.abs(TV - V)
+        self.stats = {"backups": 0, "error_evaluations": nS}
+
+        while True:
+            batch = np.flatnonzero(priority >= self.theta)
+            if not len(batch): break
+            if len(batch) > batch_size:
+                batch = batch[np.argpartition(priority[batch], -batch_size)[-batch_size:]]
+
+            V[batch] = TV[batch]
+            priority[batch] = 0.
+            self.stats["backups"] += len(batch)
+
+            # new backups and Bellman errors of the predecessors
+            positions, _ = gather_rows(predecessors.indptr, batch)
+            preds = np.unique(predecessors.indices[positions])
+            if len(preds) > dense_ratio * nS:
+                TV = self.mdp.q_values(V, self.gamma).max(axis=1)
+                self.stats["error_evaluations"] += nS
+            else:
+                TV[preds] = self.mdp.q_values_states(V, self.gamma, preds).max(axis=1)
+                self.stats["error_evaluations"] += len(preds)
+            priority[preds] = np.abs(TV[preds] - V[preds])
+        return V
+
+
+    def modified_policy_iteration(self, k_max=100, eta=0.1):
+        """
+        Between policy iteration (evaluate π until convergence, then improve it) and value
+        iteration (a single evaluation sweep between improvements):
+        - V is never reset, each evaluation starts from the previous V (warm start)
+        - only k evaluation sweeps are done between 2 improvements. k is adaptive: we sweep until
+          the changes of V are below eta * the current Bellman residual (or k_max sweeps). Far
+          from the solution, evaluating π precisely is a waste since π will change, close to it
+          more sweeps are done.
+        - stop on the span seminorm of the Bellman residual, sp(x) = max(x) - min(x):
+          if sp(TV - V) < theta (1 - γ) / γ, the greedy policy is theta-optimal. The span
+          ignores a constant offset of V, so it stops earlier than the max norm.
+        """
+        self._check_in_ram("Modified policy iteration")
+        nS, nA = self.states_size, self.actions_size
+        states = np.arange(nS)
+        stop = self.theta * (1 - self.gamma) / self.gamma if self.gamma < 1 else self.theta
+
+        π = policy_to_array(self.π, nS)
+        V, new_V = np.zeros(nS), np.empty(nS)
+        Q, γV = np.empty(nS * nA), np.empty(nS)
+        self.stats = {"improvements": 0, "evaluation_sweeps": 0, "backups": 0}
+
+        while True:
+            # improvement: one full backup gives TV and the greedy policy
+            # (plain argmax: we stop on the values, not on a stable policy, so ties do not matter)
+            Q_sa = self.mdp.q_values(V, self.gamma, out=Q, buffer=γV)
+            π = np.argmax(Q_sa, axis=1)
+            self.stats["improvements"] += 1
+            self.stats["backups"] += nS
+
+            residual = Q_sa.max(axis=1) - V
+            span = residual.max() - residual.min()
+
+            # T_π V, the first evaluation sweep is already in Q
+            new_V[:] = Q_sa[states, π]
+            V, new_V = new_V, V
+            if span < stop: break
+
+            # partial evaluation of π, warm started from T_π V
+            T_π, R_π = self.mdp.policy_model(π)
+            for _ in range(k_max - 1):
+                np.multiply(V, self.gamma, out=γV)
+                new_V[:] = R_π
+                matvec_into(T_π, γV, new_V)
+                self.stats["evaluation_sweeps"] += 1
+                self.stats["backups"] += nS
+
+                change = np.max(np.abs(new_V - V))
+                V, new_V = new_V, V
+                if change < eta * span: break
+
+        return V, TabularPolicy(π)
 
     #### -------------------------------------------------------------------------------------- ####
 
 
 
+class BatchedDynamicProgramming:
+    """
+    Solve a batch of B problems at once: B policies and/or B discount factors, on one MDP or on
+    B MDPs sharing the same states and actions. Each argument is either a single value, broadcast
+    to the batch, or a sequence of B values:
+        - P: a dynamic P or a CompiledMDP, or a list of them
+        - gammas: a float or a list of floats
+        - policies: a policy (dict or array [nS]), a list of policies or an array [B, nS]
+
+    Results are given as V [B, nS] and policies [B, nS]. Internally the values of the elements
+    still sweeping are the columns of a [nS, k] array, so a sweep is one sparse matrix - dense
+    matrix product T [nS*nA, nS] @ V [nS, k] per distinct MDP: the compiled structure is read once
+    for the whole batch. An element stops being updated as soon as it has converged
+    (changes < theta), the others keep sweeping. self.stats holds the sweeps done per element.
+    """
+    def __init__(self, P, gammas=0.99, policies=None, theta=1e-10):
+        Ps = list(P) if isinstance(P, (list, tuple)) else [P]
+        self.mdps = [p if isinstance(p, CompiledMDP) else CompiledMDP.from_P(p) for p in Ps]
+        self.states_size, self.actions_size = self.mdps[0].nS, self.mdps[0].nA
+        if any((m.nS, m.nA) != (self.states_size, self.actions_size) for m in self.mdps):
+            raise ValueError("The MDPs of a batch must have the same states and actions")
+
+        gammas = np.atleast_1d(np.asarray(gammas, dtype=np.float64))
+        if policies is not None:
+            if isinstance(policies, dict) or np.ndim(policies) == 1:
+                policies = [policies]
+            policies = np.stack([policy_to_array(π, self.states_size) for π in policies])
+
+        sizes = {len(self.mdps), len(gammas)} | ({len(policies)} if policies is not None else set())
+        B = self.batch_size = max(sizes)
+        if not sizes <= {1, B}:
+            raise ValueError(f"Cannot broadcast batches of sizes {sorted(sizes)}")
+
+        self.mdp_index = np.arange(B) if len(self.mdps) == B else np.zeros(B, dtype=np.int64)
+        self.gammas = np.broadcast_to(gammas, (B,)).copy()
+        self.π = None if policies is None else np.broadcast_to(policies, (B, self.states_size)).copy()
+        self.theta = theta
+        self.stats = {}
+
+
+    def _q_values(self, W, elements):
+        """Q [nS, nA, k] of k elements of the batch, from their values W [nS, k]"""
+        nS, nA = self.states_size, self.actions_size
+        mdp_index = self.mdp_index[elements]
+        γW = W * self.gammas[elements]
+
+        if len(self.mdps) == 1:
+            Q = self.mdps[0].T @ γW
+            Q += self.mdps[0].R[:, None]
+        else:
+            Q = np.empty((nS * nA, len(elements)))
+            for m in np.unique(mdp_index):
+                columns = np.flatnonzero(mdp_index == m)
+                Q[:, columns] = self.mdps[m].T @ γW[:, columns] + self.mdps[m].R[:, None]
+
+        for m in np.unique(mdp_index):
+            if self.mdps[m].has_invalid:
+                Q[np.ix_(~self.mdps[m].valid, mdp_index == m)] = -np.inf
+        return Q.reshape(nS, nA, len(elements))
+
+
+    def _max_backup(self, W, elements):
+        Q = self._q_values(W, elements)
+        new_W = Q[:, 0].copy()
+        for a in range(1, self.actions_size):  # faster than a max reduction over the small axis
+            np.maximum(new_W, Q[:, a], out=new_W)
+        return new_W
+
+
+    def _policy_backup(self, W, elements):
+        """Q(s, π(s)) of the elements, each with its own policy"""
+        Q = self._q_values(W, elements)
+        return np.take_along_axis(Q, self.π[elements].T[:, None, :], axis=1)[:, 0]
+
+
+    def _sweep(self, V, elements, backup):
+        """
+        Sweep the elements with W = backup(W, elements) until they have all converged, V [B, nS]
+        is updated in place. Return the number of sweeps of each element.
+        """
+        sweeps = np.zeros(len(elements), dtype=np.int64)
+        active = np.arange(len(elements))
+        W = np.ascontiguousarray(V[elements].T)  # [nS, k], the elements still sweeping
+
+        while len(active):
+            new_W = backup(W, elements[active])
+            change = np.max(np.abs(new_W - W), axis=0)
+            W = new_W
+            sweeps[active] += 1
+
+            converged = change < self.theta
+            if converged.any():  # the converged elements are written back and leave W
+                V[elements[active[converged]]] = W[:, converged].T
+                W = np.ascontiguousarray(W[:, ~converged])
+                active = active[~converged]
+        return sweeps
+
+
+    def policy_evaluation(self, V0=None):
+        """V [B, nS] of the batch of policies"""
+        if self.π is None:
+            raise ValueError("policy_evaluation needs policies")
+        B = self.batch_size
+        V = np.zeros((B, self.states_size)) if V0 is None else np.array(V0, dtype=np.float64)
+
+        self.stats = {"sweeps": self._sweep(V, np.arange(B), self._policy_backup)}
+        return V
+
+
+    def value_iteration(self):
+        """Optimal values V [B, nS] and greedy policies [B, nS] of the batch"""
+        B = self.batch_size
+        V = np.zeros((B, self.states_size))
+        self.stats = {"sweeps": self._sweep(V, np.arange(B), self._max_backup)}
+
+        π = self._q_values(np.ascontiguousarray(V.T), np.arange(B)).argmax(axis=1).T
+        return V, π
+
+
+    def policy_iteration(self):
+        """
+        All the policies are evaluated together (warm started from their previous values), then
+        improved together. An element leaves the batch once its policy is stable.
+        """
+        if self.π is None:
+            raise ValueError("policy_iteration needs initial policies")
+        B = self.batch_size
+        V = np.zeros((B, self.states_size))
+        self.stats = {"sweeps": np.zeros(B, dtype=np.int64), "improvements": np.zeros(B, dtype=np.int64)}
+
+        active = np.arange(B)
+        while len(active):
+            self.stats["sweeps"][active] += self._sweep(V, active, self._policy_backup)
+
+            # improvement, keeping the current action when it is as good as the greedy one
+            Q = self._q_values(np.ascontiguousarray(V[active].T), active)  # [nS, nA, k]
+            π = self.π[active].T
+            current = np.take_along_axis(Q, π[:, None, :], axis=1)[:, 0]
+            keep = current >= Q.max(axis=1) - self.theta
+            new_π = np.where(keep, π, Q.argmax(axis=1)).T
+            self.stats["improvements"][active] += 1
+
+            stable = np.all(new_π == self.π[active], axis=1)
+            self.π[active] = new_π
+            active = active[~stable]
+
+        return V, self.π
+
+    #### -------------------------------------------------------------------------------------- ####
+
+
 
 
 if __name__ == "__main__":
@@ -178,10 +699,102 @@ if __name__ == "__main__":
     V, new_π = agent.policy_iteration()
     print(V, new_π)
 
+    V, new_π = DynamicProgramming(π, dynamic_P).policy_iteration(evaluation="spsolve")
+    print(V, new_π)
+
     agent2 = DynamicProgramming(π, dynamic_P)
 
     V, new_π = agent2.value_iteration()
     print(V, new_π)
 
+    # Bigger MDP: 300x300 slippery gridworld, 9.10^4 states, compiled directly into arrays
+    grid = make_gridworld(300, 300)
+    π = {s: 0 for s in range(grid.nS)}
+    agent3 = DynamicProgramming(π, grid, gamma=0.99, theta=1e-6)
+
+    start = time.perf_counter()
+    V, new_π = agent3.value_iteration()
+    print(f"Value iteration on {grid.nS} states: {time.perf_counter() - start:.1f}s, V(0)={V[0]:.4f}")
+
+    # exact evaluation vs. sweeps: the sweeps grow with 1 / (1 - γ), the factorization does not
+    grid = make_gridworld(50, 50)
+    π = np.random.default_rng(0).integers(0, grid.nA, grid.nS)
+    for gamma in (0.9, 0.99, 0.999):
+        for evaluation in ("sweeps", "spsolve", "gmres"):
+            agent4 = DynamicProgramming(π, grid, gamma=gamma, theta=1e-8)
+            start = time.perf_counter()
+            V = agent4._policy_evaluation(method=evaluation)
+            print(f"Policy evaluation ({evaluation}) on {grid.nS} states, gamma={gamma}: "
+                  f"{time.perf_counter() - start:.3f}s, V(0)={V[0]:.4f}")
+
+    grid = make_gridworld(300, 300)
+    π = {s: 0 for s in range(grid.nS)}
+    agent5 = DynamicProgramming(π, grid, gamma=0.99, theta=1e-6)
+    start = time.perf_counter()
+    V, new_π = agent5.modified_policy_iteration()
+    print(f"Modified policy iteration on {grid.nS} states: {time.perf_counter() - start:.1f}s, "
+          f"V(0)={V[0]:.4f}, {agent5.stats}")
+
+    # asynchronous value iteration: sweeps and backups needed to reach theta
+    grid = make_gridworld(60, 60)
+    for method in ("jacobi", "gauss_seidel", "prioritized"):
+        agent6 = DynamicProgramming({}, grid, gamma=0.99, theta=1e-6)
+        start = time.perf_counter()
+        V, new_π = agent6.value_iteration(method=method)
+        print(f"Value iteration ({method}) on {grid.nS} states: {time.perf_counter() - start:.1f}s, "
+              f"V(0)={V[0]:.4f}, {agent6.stats}")
+
     
 
+    # batched sensitivity study: one MDP, 32 discount factors solved together
+    grid = make_gridworld(50, 50)
+    gammas = np.linspace(0.5, 0.999, 32)
+    start = time.perf_counter()
+    V, policies = BatchedDynamicProgramming(grid, gammas=gammas, theta=1e-6).value_iteration()
+    batched = time.perf_counter() - start
+    start = time.perf_counter()
+    for gamma in gammas:
+        DynamicProgramming({}, grid, gamma=gamma, theta=1e-6).value_iteration()
+    print(f"Value iteration of {len(gammas)} discount factors on {grid.nS} states: "
+          f"batched {batched:.2f}s, loop {time.perf_counter() - start:.2f}s")
+
+    # out-of-core: the gridworld written to disk and value iteration streamed over chunks
+    grid = make_gridworld(200, 200)
+    with tempfile.TemporaryDirectory() as directory:
+        grid.save(directory)
+        disk_mdp = DiskMDP(directory, chunk_states=4096)
+        start = time.perf_counter()
+        V, new_π = DynamicProgramming({}, disk_mdp, gamma=0.99, theta=1e-6).value_iteration()
+        print(f"Streamed value iteration on {disk_mdp.nS} states (chunks of {disk_mdp.chunk_states}): "
+              f"{time.perf_counter() - start:.1f}s, V(0)={V[0]:.4f}")
+
+    # action elimination on a random MDP with a large action set
+    random_mdp = make_random_mdp(2000, 50)
+    for method in ("jacobi", "elimination"):
+        agent7 = DynamicProgramming({}, random_mdp, gamma=0.95, theta=1e-8)
+        start = time.perf_counter()
+        V, new_π = agent7.value_iteration(method=method)
+        print(f"Value iteration ({method}) on {random_mdp.nS} states x {random_mdp.nA} actions: "
+              f"{time.perf_counter() - start:.2f}s, {agent7.stats['sweeps']} sweeps, "
+              f"{agent7.stats['pair_backups']} (s, a) backups")
+    eliminated = agent7.stats["eliminated_fraction"]
+    print("Eliminated fraction of the (s, a) pairs:",
+          {sweep: round(eliminated[sweep], 3) for sweep in range(0, len(eliminated), 50)})
+
+    # accelerated policy evaluation and value iteration, gamma = 0.99 and theta = 1e-10: sweeps
+    # needed vs. the plain sweeps. Anderson cuts the sweeps of policy evaluation by about 10
+    for name, mdp in (("gridworld", make_gridworld(60, 60)), ("random MDP", make_random_mdp(3000, 4))):
+        π = np.random.default_rng(0).integers(0, mdp.nA, mdp.nS)
+        for kind, methods in (("Policy evaluation", ("sweeps", "anderson")),
+                              ("Value iteration", ("jacobi", "anderson"))):
+            plain_sweeps = None
+            for method in methods:
+                agent8 = DynamicProgramming(π, mdp, gamma=0.99, theta=1e-10)
+                start = time.perf_counter()
+                if kind == "Policy evaluation":
+                    agent8._policy_evaluation(method=method)
+                else:
+                    agent8.value_iteration(method=method)
+                plain_sweeps = plain_sweeps or agent8.stats["sweeps"]
+                print(f"{kind} ({method}) on the {name}: {time.perf_counter() - start:.2f}s, "
+                      f"{agent8.stats['sweeps']} sweeps (reduction {plain_sweeps / agent8.stats['sweeps']:.1f}x)")
@@ -1,26 +1,30 @@
-from collections import defaultdict
-
 import numpy as np
+from scipy.signal import lfilter
 
 import utils
+from recorders import make_recorder
 
 
 def mc_control(
     π, env, gamma=1.,
     init_lr=.5, min_lr=.01, lr_decay_ratio=.3,
     init_eps=1., min_eps=.1, eps_decay_ratio=.9,
-    n_episodes=500, max_steps=100, mode="FV"):
+    n_episodes=500, max_steps=100, mode="FV", history="full"):
     """
+    mode: "FV" first visit or "EV" every visit Monte Carlo
+    max_steps: the episodes are truncated after max_steps steps
+    history: how Q_track and π_track are recorded, see recorders.py
     """
     nS = env.observation_space.n
     nA = env.action_space.n
-    π_track = []                           # Hold the improved (greedy) policy per episode
 
-    Q = defaultdict(lambda: np.zeros(nA))  # initialize empty dictionary of arrays
-    Q_track = np.zeros((n_episodes, nS, nA), dtype=np.float64)  # hold the estimated Q per episode
+    # hold the estimated Q and the improved (greedy) policy per episode
+    Q_track = make_recorder(history, n_episodes, (nS, nA), name="mc_control_Q_track")
+    π_track = make_recorder(history, n_episodes, (nS,), np.min_scalar_type(nA - 1), name="mc_control_pi_track")
+
+    Q = np.zeros((nS, nA))
 
-    # Pre-compute the discount factors / learning rates / epsilons
-    discounts = np.logspace( 0, max_steps, num=max_steps, base=gamma, endpoint=False)
+    # Pre-compute the learning rates / epsilons
     lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
     epsilons = utils.decay_schedule(init_eps, min_eps, eps_decay_ratio, n_episodes)
 
@@ -30,30 +34,30 @@ def mc_control(
         lr = lrs[e]
 
         trajectory = utils.generate_trajectory(Q, eps, env, max_steps)
-        visited = np.zeros((nS, nA), dtype=np.bool)
-
-        for t, (state, action, reward, _, _) in enumerate(trajectory):
-            state_has_been_visited = visited[state][action]  # true or false
+        states, actions = trajectory["state"], trajectory["action"]
+
+        # G_t = r_t + γ G_t+1, computed backward in one pass (lfilter runs the recursion in C)
+        # a truncated episode has no bootstrap: the returns are the rewards up to max_steps
+        returns = lfilter([1.], [1., -gamma], trajectory["reward"][::-1])[::-1]
+
+        if mode == "FV":
+            # index of the first visit of each (state, action) pair of the episode
+            _, first_visits = np.unique(states * nA + actions, return_index=True)
+            s, a = states[first_visits], actions[first_visits]
+            Q[s, a] += lr * (returns[first_visits] - Q[s, a])  # the pairs are unique, no conflict
+        else:
+            # every visit: a pair visited k times is updated k times in a row
+            for state, action, G in zip(states, actions, returns):
+                Q[state, action] += lr * (G - Q[state, action])
 
-            if state_has_been_visited and mode == "FV":
-                # do not compute anything else if visited and FVMC is applied
-                continue
-            visited[state][action] = True
-
-            n_steps = len(trajectory[:t])
-
-            future_rewards = trajectory[t:, 2]  # rewards from this point until the end
-            G = np.sum(discounts[:n_steps] * future_rewards)
-            error = G - Q[state][action]
-            Q[state][action] = Q[state][action] + lr * error
-        
         # episode completed
-        Q_track[e] = Q
-        π_track.append(np.argmax(Q, axis=1))
-    
+        Q_track.record(e, Q)
+        π_track.record(e, np.argmax(Q, axis=1))
+
+    Q_track.close(); π_track.close()
     final_Q = Q
     estimated_optimal_V = np.max(final_Q, axis=1)
-    greedy_policy_π = lambda s: { s: a for s, a in enumerate(np.argmax(final_Q, axis=1)) }[s]
+    greedy_policy_π = utils.TabularPolicy.from_Q(final_Q)  # argmax computed once
 
     return final_Q, estimated_optimal_V, greedy_policy_π, Q_track, π_track
 
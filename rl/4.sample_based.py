@@ -1,14 +1,13 @@
 from pathlib import Path
-from collections import namedtuple
 from collections import defaultdict
 
 from tqdm import tqdm
 import numpy as np
 import matplotlib.pyplot as plt
-import gym, gym_walk
 
 
 import utils
+from recorders import make_recorder
 
 
 SEEDS = (12, 34, 56, 78, 90)
@@ -19,14 +18,16 @@ Sample Based Methods
 """
 
 # Solving Prediction problems
-def temporal_difference(π, env, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_ratio=0.3, n_episodes=500):
+def temporal_difference(π, env, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_ratio=0.3, n_episodes=500,
+                        history="full"):
     """
     Here we can update V as we go, no need to first generate a trajectory.
     Solving the prediction problem
+    history: how V_track is recorded, see recorders.py
     """
     nS = env.observation_space.n
     V = np.zeros(nS)
-    V_track = np.zeros((n_episodes, nS))
+    V_track = make_recorder(history, n_episodes, (nS,), name="temporal_difference_V_track")
     lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
 
     for e in range(n_episodes):
@@ -43,56 +44,72 @@ def temporal_difference(π, env, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_r
 
             state = next_state
             
-        V_track[e] = V
+        V_track.record(e, V)
+    V_track.close()
     return V, V_track
 
-def n_step_td_learning(π, env, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_ratio=0.5, n_step=3, n_episodes=500):
+def n_step_td_learning(π, env, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_ratio=0.5, n_step=3, n_episodes=500,
+                       history="full"):
     """
     Bootstrap after n steps to estimate the value function instead of after one step as 
     temporal_difference() do. This will allow reducing the bias. But the higher the n, the higher
     the variance, the lower the bias.
+    history: how V_track is recorded, see recorders.py
+
+    The n most recent (state, reward) live in circular buffers of size n, slot τ % n for the time τ.
+    The steps are grouped in blocks of n: `forward` is the running discounted sum of the rewards of
+    the current block, and when a block is complete its rewards are replaced in place by their
+    returns to the end of the block (one backward pass every n steps). The n-step return of τ is
+    then the return of τ to the end of its block + the discounted `forward`: O(1) per step on
+    average, no allocation, and no division by γ (which would amplify the rounding errors).
     """
     
     nS = env.observation_space.n
     V = np.zeros(nS)
-    V_track = np.zeros((n_episodes, nS))
+    V_track = make_recorder(history, n_episodes, (nS,), name="n_step_td_learning_V_track")
     lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
-    discounts = np.logspace(0, n_step+1, num=n_step+1, base=gamma, endpoint=False)
-    Experience = namedtuple('Experience', ['state', 'reward', 'next_state', 'done'])
+    discounts = gamma ** np.arange(n_step + 1)
+    states = np.zeros(n_step, dtype=np.int64)
+    returns = np.zeros(n_step)  # rewards of the current block, returns of the previous one
 
     for e in range(n_episodes):
-        state, done, path = env.reset(), False, []  # path holds the n most recent experience : a partial trajectory
+        state, done, t, forward = env.reset(), False, 0, 0.
 
-        while not done or path is not None:
-            path = path[1:]
-
-            while not done and len(path) < n_step:
-                # MC like: Interact and collect experiences (not until the end but either until done or until n interaction)
-                action = π(state)
-                next_state, reward, done, _ = env.step(action)
-                experience = Experience(state, reward, next_state, done)
-                path.append(experience)
-                state = next_state
-
-                if done: break
-
-
-
-            n = len(path)
-            est_state = path[0].state  # state to estimate
-            rewards = np.array(path)[:,1] # get all the rewards
-            partial_return = discounts[:n] * rewards  # discounted reward from est_state to n
-
-            bs_val = discounts[-1] * V[next_state] * (not done)  # bootstraping value
-            target = np.sum(np.append(partial_return, bs_val))
-            error = target - V[est_state]
-
-            V[est_state] +=  lrs[e] * error
+        while not done:
+            action = π(state)
+            next_state, reward, done, _ = env.step(action)
+            i = t % n_step  # position in the block
+            states[i], returns[i] = state, reward
+            forward += discounts[i] * reward
+
+            if done:
+                # returns of the rewards of the current block, then the pending states get their
+                # return up to the end of the episode (no bootstrap)
+                for j in range(i - 1, -1, -1):
+                    returns[j] += gamma * returns[j + 1]
+                for τ in range(max(t - n_step + 1, 0), t + 1):
+                    k = τ % n_step
+                    G = returns[k] if τ >= t - i else returns[k] + discounts[n_step - k] * forward
+                    V[states[k]] += lrs[e] * (G - V[states[k]])
+                break
+
+            if t >= n_step - 1:
+                # the n steps of τ = t - n + 1 are known: it is the slot after i
+                k = (i + 1) % n_step
+                G = forward if k == 0 else returns[k] + discounts[n_step - k] * forward
+                target = G + discounts[n_step] * V[next_state]  # bootstraping value
+                V[states[k]] += lrs[e] * (target - V[states[k]])
+
+            if i == n_step - 1:  # end of the block
+                for j in range(n_step - 2, -1, -1):
+                    returns[j] += gamma * returns[j + 1]
+                forward = 0.
 
-            if len(path) == 1 and path[0].done:
-                path = None
+            state = next_state
+            t += 1
 
-        V_track[e] = V
+        V_track.record(e, V)
+    V_track.close()
     return V, V_track
 
 
@@ -100,17 +117,18 @@ def n_step_td_learning(π, env, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_ra
 def sarsa(
     env, gamma=1., n_episodes=500,
     init_lr=.5, min_lr=.01, lr_decay_ratio=.3,
-    init_eps=1., min_eps=.1, eps_decay_ratio=.9):
+    init_eps=1., min_eps=.1, eps_decay_ratio=.9, history="full"):
     """
     Solving the control problem.
     Learning on the job or Learning from own current mistakes
     """
     nA = env.action_space.n                # number of actions
     nS = env.observation_space.n                # number of states
-    π_track = []                           # Hold the improved (greedy) policy per episode
+    # hold the estimated Q and the improved (greedy) policy per episode, see recorders.py
+    Q_track = make_recorder(history, n_episodes, (nS, nA), name="sarsa_Q_track")
+    π_track = make_recorder(history, n_episodes, (nS,), np.min_scalar_type(nA - 1), name="sarsa_pi_track")
 
     Q = np.zeros((nS, nA), dtype=np.float64)  # initialize empty dictionary of arrays
-    Q_track = np.zeros((n_episodes, nS, nA), dtype=np.float64)  # hold the estimated Q per episode
 
     lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
     epsilons = utils.decay_schedule(init_eps, min_eps, eps_decay_ratio, n_episodes)
@@ -135,12 +153,13 @@ def sarsa(
             action = next_action
         
         # episode completed
-        Q_track[i_episode] = Q
-        π_track.append(np.argmax(Q, axis=1))
+        Q_track.record(i_episode, Q)
+        π_track.record(i_episode, np.argmax(Q, axis=1))
 
+    Q_track.close(); π_track.close()
     final_Q = Q
     estimated_optimal_V = np.max(final_Q, axis=1)
-    greedy_policy_π = lambda s: { s: a for s, a in enumerate(np.argmax(final_Q, axis=1)) }[s]
+    greedy_policy_π = utils.TabularPolicy.from_Q(final_Q)  # argmax computed once
 
     return final_Q, estimated_optimal_V, greedy_policy_π, Q_track, π_track
 
@@ -148,7 +167,7 @@ def sarsa(
 def q_learning(
     env, gamma=1., n_episodes=500,
     init_lr=.5, min_lr=.01, lr_decay_ratio=.3,
-    init_eps=1., min_eps=.1, eps_decay_ratio=.9):
+    init_eps=1., min_eps=.1, eps_decay_ratio=.9, history="full"):
     """
     Value iteration alike. It directly learn the optimal value function, no need for policy
     improvement step as opposed to sarsa, because it is directly taking the max action of the
@@ -162,15 +181,16 @@ def q_learning(
     """
     nA = env.action_space.n                # number of actions
     nS = env.observation_space.n                # number of states
-    π_track = []                           # Hold the improved (greedy) policy per episode
+    # hold the estimated Q and the improved (greedy) policy per episode, see recorders.py
+    Q_track = make_recorder(history, n_episodes, (nS, nA), name="q_learning_Q_track")
+    π_track = make_recorder(history, n_episodes, (nS,), np.min_scalar_type(nA - 1), name="q_learning_pi_track")
 
     Q = np.zeros((nS, nA), dtype=np.float64)   # initialize empty dictionary of arrays
-    Q_track = np.zeros((n_episodes, nS, nA), dtype=np.float64)  # hold the estimated Q per episode
 
     lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
     epsilons = utils.decay_schedule(init_eps, min_eps, eps_decay_ratio, n_episodes)
     
-    for i_episode in range(1, n_episodes+1): 
+    for i_episode in range(n_episodes):
         state, done = env.reset(), False
         
         eps = epsilons[i_episode]
@@ -194,19 +214,20 @@ def q_learning(
             state = next_state
         
         # episode completed
-        Q_track[i_episode] = Q
-        π_track.append(np.argmax(Q, axis=1))
+        Q_track.record(i_episode, Q)
+        π_track.record(i_episode, np.argmax(Q, axis=1))
 
+    Q_track.close(); π_track.close()
     final_Q = Q
     estimated_optimal_V = np.max(final_Q, axis=1)
-    greedy_policy_π = lambda s: { s: a for s, a in enumerate(np.argmax(final_Q, axis=1)) }[s]
+    greedy_policy_π = utils.TabularPolicy.from_Q(final_Q)  # argmax computed once
 
     return final_Q, estimated_optimal_V, greedy_policy_π, Q_track, π_track
 
 
 def double_q_learning(env, gamma=1., n_episodes=500,
     init_lr=.5, min_lr=.01, lr_decay_ratio=.3,
-    init_eps=1., min_eps=.1, eps_decay_ratio=.9):
+    init_eps=1., min_eps=.1, eps_decay_ratio=.9, history="full"):
     """
     In Sarsa we take at each step:
     - the value of an estimate of the next state-action pair ==> Bias
@@ -219,19 +240,19 @@ def double_q_learning(env, gamma=1., n_episodes=500,
     """
     nA = env.action_space.n                # number of actions
     nS = env.observation_space.n                # number of states
-    π_track = []                           # Hold the improved (greedy) policy per episode
+    # hold the mean of the 2 estimated Q and the improved (greedy) policy per episode, see recorders.py
+    Q_track_mean = make_recorder(history, n_episodes, (nS, nA), name="double_q_learning_Q_track")
+    π_track = make_recorder(history, n_episodes, (nS,), np.min_scalar_type(nA - 1), name="double_q_learning_pi_track")
 
     # initialize 2 value functions for a cross-validation strategy
     # the estimate of one Q-function will helps validate the estimate of the other Q-function
     Q1 = np.zeros((nS, nA), dtype=np.float64)
     Q2 = np.zeros((nS, nA), dtype=np.float64)
-    Q1_track = np.zeros((n_episodes, nS, nA), dtype=np.float64)
-    Q2_track = np.zeros((n_episodes, nS, nA), dtype=np.float64)
 
     lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
     epsilons = utils.decay_schedule(init_eps, min_eps, eps_decay_ratio, n_episodes)
     
-    for i_episode in range(1, n_episodes+1):
+    for i_episode in range(n_episodes):
         state, done = env.reset(), False
         
         eps = epsilons[i_episode]
@@ -247,28 +268,221 @@ def double_q_learning(env, gamma=1., n_episodes=500,
             # randomly choose to update Q1 or Q2
             if np.random.randint(2): # 0 or 1
                 # update Q1
-                Q1 = utils.update_double_q(Q1, Q2, sarsa_experience, gamma, lr)
+                Q1[state][action] = utils.update_double_q(Q1, Q2, sarsa_experience, gamma, lr)
             else:
                 # update Q2
-                Q1 = utils.update_double_q(Q2, Q1, sarsa_experience, gamma, lr)
+                Q2[state][action] = utils.update_double_q(Q2, Q1, sarsa_experience, gamma, lr)
 
             state = next_state
         
         # episode completed
-        Q1_track[i_episode] = Q1
-        Q2_track[i_episode] = Q2
-        π_track.append(np.argmax(Q_mean, axis=1))
+        Q_mean = (Q1 + Q2) / 2.
+        Q_track_mean.record(i_episode, Q_mean)
+        π_track.record(i_episode, np.argmax(Q_mean, axis=1))
 
-    Q_track_mean = (Q1_track + Q2_track) / 2.
+    Q_track_mean.close(); π_track.close()
     final_Q = Q_mean
     estimated_optimal_V = np.max(final_Q, axis=1)
-    greedy_policy_π = lambda s: { s: a for s, a in enumerate(np.argmax(final_Q, axis=1)) }[s]
+    greedy_policy_π = utils.TabularPolicy.from_Q(final_Q)  # argmax computed once
 
     return final_Q, estimated_optimal_V, greedy_policy_π, Q_track_mean, π_track
 
 
+# Multi-seed versions: n_seeds copies of the env (utils.GymEnvBatch) are stepped in lockstep, and
+# the tables get a leading seed dimension (V [n_seeds, nS], Q [n_seeds, nS, nA]). One step of the
+# python loop steps every seed, and the updates of all the seeds are a single fancy-indexed
+# operation, so 100 seeds cost about the python overhead of one (plus the env steps).
+# The episodes are synchronized: a seed whose episode is over waits for the others, so every seed
+# uses the same learning rate and epsilon schedule per episode as the single seed versions.
+
+def _select_actions(π, states):
+    """Actions of a policy for an array of states (TabularPolicy is vectorized)"""
+    if isinstance(π, utils.TabularPolicy):
+        return π(states)
+    return np.array([π(s) for s in states])
+
+
+def batched_temporal_difference(π, envs, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_ratio=0.3,
+                                n_episodes=500, history="full"):
+    """temporal_difference() on every env of envs, return V and V_track [n_seeds, nS]"""
+    n, nS = envs.n_envs, envs.observation_space.n
+    V = np.zeros((n, nS))
+    V_track = make_recorder(history, n_episodes, (n, nS), name="batched_temporal_difference_V_track")
+    lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
+
+    for e in range(n_episodes):
+        states, running = envs.reset(), np.ones(n, dtype=bool)
+        while running.any():
+            idx = np.flatnonzero(running)
+            next_states, rewards, terminals, truncated = envs.step(_select_actions(π, states), running)
+
+            s, next_s = states[idx], next_states[idx]
+            td_target = rewards[idx] + gamma * V[idx, next_s] * ~terminals[idx]
+            V[idx, s] += lrs[e] * (td_target - V[idx, s])
+
+            running[idx] = ~(terminals[idx] | truncated[idx])
+            states = next_states
+
+        V_track.record(e, V)
+    V_track.close()
+    return V, V_track
+
+
+def batched_n_step_td_learning(π, envs, gamma=1.0, init_lr=0.5, min_lr=0.01, lr_decay_ratio=0.5, n_step=3,
+                               n_episodes=500, history="full"):
+    """
+    n_step_td_learning() on every env of envs, return V and V_track [n_seeds, nS]. The episodes are
+    synchronized, so every seed is at the same position of the circular buffers [n_seeds, n]. An
+    episode truncated by a time limit bootstraps on V of its last next_state.
+    """
+    n, nS = envs.n_envs, envs.observation_space.n
+    V = np.zeros((n, nS))
+    V_track = make_recorder(history, n_episodes, (n, nS), name="batched_n_step_td_learning_V_track")
+    lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
+    discounts = gamma ** np.arange(n_step + 1)
+    states = np.zeros((n, n_step), dtype=np.int64)
+    returns = np.zeros((n, n_step))  # rewards of the current block, returns of the previous one
+    forward = np.zeros(n)
+
+    for e in range(n_episodes):
+        current_states, running, t = envs.reset(), np.ones(n, dtype=bool), 0
+        forward[:] = 0.
+
+        while running.any():
+            idx = np.flatnonzero(running)
+            next_states, rewards, terminals, truncated = envs.step(_select_actions(π, current_states), running)
+            i = t % n_step
+            states[idx, i], returns[idx, i] = current_states[idx], rewards[idx]
+            forward[idx] += discounts[i] * rewards[idx]
+
+            ended = idx[terminals[idx] | truncated[idx]]
+            if len(ended):
+                for j in range(i - 1, -1, -1):
+                    returns[ended, j] += gamma * returns[ended, j + 1]
+                bootstrap = V[ended, next_states[ended]] * truncated[ended]
+                for τ in range(max(t - n_step + 1, 0), t + 1):
+                    k = τ % n_step
+                    G = returns[ended, k] if τ >= t - i else returns[ended, k] + discounts[n_step - k] * forward[ended]
+                    G += discounts[t + 1 - τ] * bootstrap
+                    s = states[ended, k]
+                    V[ended, s] += lrs[e] * (G - V[ended, s])
+                running[ended] = False
+
+            on = np.flatnonzero(running)
+            if t >= n_step - 1 and len(on):
+                k = (i + 1) % n_step
+                G = forward[on] if k == 0 else returns[on, k] + discounts[n_step - k] * forward[on]
+                s = states[on, k]
+                V[on, s] += lrs[e] * (G + discounts[n_step] * V[on, next_states[on]] - V[on, s])
+
+            if i == n_step - 1:
+                for j in range(n_step - 2, -1, -1):
+                    returns[on, j] += gamma * returns[on, j + 1]
+                forward[on] = 0.
+
+            current_states = next_states
+            t += 1
+
+        V_track.record(e, V)
+    V_track.close()
+    return V, V_track
+
+
+def _batched_control(name, update, envs, n_tables, gamma, n_episodes, init_lr, min_lr,
+                     lr_decay_ratio, init_eps, min_eps, eps_decay_ratio, history, seed):
+    """
+    Shared loop of the batched control algorithms. Q holds n_tables tables per seed (2 for double
+    Q-learning) [n_tables, n_seeds, nS, nA], the behavior policy is epsilon greedy on their mean,
+    computed at each step only for the current states of the seeds still running.
+    update(Q, idx, s, a, r, next_s, next_a, bootstrap, lr, rng) updates Q in place, `name` is the
+    name of the algorithm in the file names of its histories.
+    """
+    n, nS, nA = envs.n_envs, envs.observation_space.n, envs.action_space.n
+    rng = np.random.default_rng(seed)
+
+    # hold the estimated Q and the improved (greedy) policy per episode, see recorders.py
+    Q_track = make_recorder(history, n_episodes, (n, nS, nA), name=f"{name}_Q_track")
+    π_track = make_recorder(history, n_episodes, (n, nS), np.min_scalar_type(nA - 1), name=f"{name}_pi_track")
+
+    Q = np.zeros((n_tables, n, nS, nA), dtype=np.float64)
+    lrs = utils.decay_schedule(init_lr, min_lr, lr_decay_ratio, n_episodes)
+    epsilons = utils.decay_schedule(init_eps, min_eps, eps_decay_ratio, n_episodes)
+
+    for e in range(n_episodes):
+        eps, lr = epsilons[e], lrs[e]
+        states, running = envs.reset(), np.ones(n, dtype=bool)
+        actions = utils.epsilon_greedy_rows(Q[:, np.arange(n), states].mean(axis=0), eps, rng)
+
+        while running.any():
+            idx = np.flatnonzero(running)
+            next_states, rewards, terminals, truncated = envs.step(actions, running)
+            next_actions = actions.copy()  # the finished seeds keep their last action, unused
+            next_actions[idx] = utils.epsilon_greedy_rows(Q[:, idx, next_states[idx]].mean(axis=0), eps, rng)
+
+            update(Q, idx, states[idx], actions[idx], rewards[idx], next_states[idx],
+                   next_actions[idx], ~terminals[idx], lr, rng)
+
+            running[idx] = ~(terminals[idx] | truncated[idx])
+            states, actions = next_states, next_actions
+
+        # episode completed
+        Q_mean = Q.mean(axis=0)
+        Q_track.record(e, Q_mean)
+        π_track.record(e, np.argmax(Q_mean, axis=2))
+
+    Q_track.close(); π_track.close()
+    final_Q = Q.mean(axis=0)
+    estimated_optimal_V = np.max(final_Q, axis=2)
+    greedy_policies_π = [utils.TabularPolicy.from_Q(q) for q in final_Q]
+    return final_Q, estimated_optimal_V, greedy_policies_π, Q_track, π_track
+
+
+def batched_sarsa(
+    envs, gamma=1., n_episodes=500,
+    init_lr=.5, min_lr=.01, lr_decay_ratio=.3,
+    init_eps=1., min_eps=.1, eps_decay_ratio=.9, history="full", seed=0):
+    """sarsa() on every env of envs: Q [n_seeds, nS, nA], V [n_seeds, nS], a policy per seed"""
+    def update(Q, idx, s, a, r, next_s, next_a, bootstrap, lr, rng):
+        target = r + gamma * Q[0, idx, next_s, next_a] * bootstrap
+        Q[0, idx, s, a] += lr * (target - Q[0, idx, s, a])
+
+    return _batched_control("batched_sarsa", update, envs, 1, gamma, n_episodes, init_lr, min_lr,
+                            lr_decay_ratio, init_eps, min_eps, eps_decay_ratio, history, seed)
+
+
+def batched_q_learning(
+    envs, gamma=1., n_episodes=500,
+    init_lr=.5, min_lr=.01, lr_decay_ratio=.3,
+    init_eps=1., min_eps=.1, eps_decay_ratio=.9, history="full", seed=0):
+    """q_learning() on every env of envs: Q [n_seeds, nS, nA], V [n_seeds, nS], a policy per seed"""
+    def update(Q, idx, s, a, r, next_s, next_a, bootstrap, lr, rng):
+        target = r + gamma * np.max(Q[0, idx, next_s], axis=1) * bootstrap  # target policy: greedy
+        Q[0, idx, s, a] += lr * (target - Q[0, idx, s, a])
+
+    return _batched_control("batched_q_learning", update, envs, 1, gamma, n_episodes, init_lr, min_lr,
+                            lr_decay_ratio, init_eps, min_eps, eps_decay_ratio, history, seed)
+
+
+def batched_double_q_learning(
+    envs, gamma=1., n_episodes=500,
+    init_lr=.5, min_lr=.01, lr_decay_ratio=.3,
+    init_eps=1., min_eps=.1, eps_decay_ratio=.9, history="full", seed=0):
+    """double_q_learning() on every env of envs: returns the mean of Q1 and Q2 per seed"""
+    def update(Q, idx, s, a, r, next_s, next_a, bootstrap, lr, rng):
+        # each seed randomly updates Q1 or Q2, with the argmax of the updated one evaluated by the other
+        which = rng.integers(2, size=len(idx))
+        argmax_Q_to_update = np.argmax(Q[which, idx, next_s], axis=1)
+        target = r + gamma * Q[1 - which, idx, next_s, argmax_Q_to_update] * bootstrap
+        Q[which, idx, s, a] += lr * (target - Q[which, idx, s, a])
+
+    return _batched_control("batched_double_q_learning", update, envs, 2, gamma, n_episodes, init_lr, min_lr,
+                            lr_decay_ratio, init_eps, min_eps, eps_decay_ratio, history, seed)
+
+
 
 if __name__ == "__main__":
+    import gym, gym_walk  # only the demos need the env, not the algorithms
+
     # Slippery Walk Seven env
     env = gym.make('SlipperyWalkSeven-v0')
     init_state = env.reset()
@@ -306,3 +520,10 @@ if __name__ == "__main__":
     print(V_sarsa)
     print("****************************************")
     print(pi_sarsa)
+
+    # the same algorithm on every seed at once
+    envs = utils.GymEnvBatch(lambda: gym.make('SlipperyWalkSeven-v0'), len(SEEDS), seeds=SEEDS)
+    Q_seeds, V_seeds, pi_seeds, _, _ = batched_q_learning(envs, gamma=gamma, n_episodes=n_episodes)
+    print("****************************************")
+    print("Q-learning, V per seed:")
+    print(V_seeds)
@@ -0,0 +1,358 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+try:  # private scipy kernel, accumulates in place without allocating the result
+    from scipy.sparse._sparsetools import csr_matvec
+except ImportError:
+    csr_matvec = None
+
+"""
+Compiled transition model for Dynamic Programming.
+
+The dynamic P is a dict of dicts of lists of transitions:
+    P[s][a] = [(prob, next_state, reward, done), ...]
+(the Transition namedtuple of 1.dynamic_programing.py, or the tuples of gym `env.unwrapped.P`).
+
+Iterating over it in python on every sweep is what makes DP slow on big MDPs. CompiledMDP
+flattens it once into arrays, the transitions of the pair (s, a) being at positions
+indptr[s*nA + a] : indptr[s*nA + a + 1]:
+    - next_states, probs, rewards, dones
+
+From them we build:
+    - T: sparse CSR matrix [nS*nA, nS], T[(s, a), s'] = sum of p(s'|s, a) over non terminal
+      transitions. Terminal transitions do not bootstrap, so they do not appear in T.
+    - R: expected reward vector [nS*nA], R[(s, a)] = sum of p(s', r|s, a) * r
+
+So one Bellman backup of all the (s, a) pairs is a sparse matrix-vector product:
+>>>> Q = R + γ T V
+
+For MDPs too big for RAM, DiskMDP keeps the same flat arrays in .npy files opened as memory
+maps, and computes the backups chunk of states by chunk of states: only the transitions of one
+chunk are read in memory at a time.
+"""
+
+ARRAYS = ("indptr", "next_states", "probs", "rewards", "dones")
+
+
+def rows_matvec_into(indptr, indices, data, n_cols, x, out):
+    """
+    out += A @ x for the CSR rows described by indptr, which can be a slice of the indptr of a
+    bigger matrix (absolute offsets in indices and data). Without allocation when scipy's
+    csr_matvec is available, through the public csr_matrix product otherwise.
+    """
+    if csr_matvec is not None:
+        csr_matvec(len(indptr) - 1, n_cols, indptr, indices, data, x, out)
+    else:
+        first, last = indptr[0], indptr[-1]
+        rows = csr_matrix((data[first:last], indices[first:last], indptr - first),
+                          shape=(len(indptr) - 1, n_cols))
+        out += rows @ x
+    return out
+
+
+def matvec_into(A, x, out):
+    """out += A @ x for a CSR matrix A, without allocating the result"""
+    return rows_matvec_into(A.indptr, A.indices, A.data, A.shape[1], x, out)
+
+
+def gather_rows(indptr, rows):
+    """
+    Positions (in the data / indices arrays of a CSR structure) of the entries of the rows, row
+    after row, and the number of entries of each row. No python loop over the rows.
+    """
+    starts, counts = indptr[rows], indptr[rows + 1] - indptr[rows]
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(counts.sum()), counts
+
+
+class CompiledMDP():
+
+    def __init__(self, nS, nA, indptr, next_states, probs, rewards, dones):
+        self.nS, self.nA = nS, nA
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.next_states = np.asarray(next_states, dtype=np.int64)
+        self.probs = np.asarray(probs, dtype=np.float64)
+        self.rewards = np.asarray(rewards, dtype=np.float64)
+        self.dones = np.asarray(dones, dtype=bool)
+
+        n_pairs = nS * nA
+        counts = np.diff(self.indptr)
+        pairs = np.repeat(np.arange(n_pairs), counts)  # (s, a) pair of each transition
+
+        # pairs without transitions are actions not available in the state
+        self.valid = counts > 0
+        self.has_invalid = not self.valid.all()
+
+        self.R = np.bincount(pairs, weights=self.probs * self.rewards, minlength=n_pairs)
+        continuation = self.probs * np.logical_not(self.dones)
+        self.T = csr_matrix((continuation, self.next_states, self.indptr), shape=(n_pairs, nS))
+        self._predecessors = None
+
+
+    @classmethod
+    def from_P(cls, P):
+        nS = len(P)
+        nA = max(len(P[s]) for s in range(nS))
+
+        indptr = np.zeros(nS * nA + 1, dtype=np.int64)
+        transitions = []
+        for s in range(nS):
+            for a in range(nA):
+                ts = P[s].get(a, []) if isinstance(P[s], dict) else P[s][a]
+                transitions.extend(ts)
+                indptr[s * nA + a + 1] = len(ts)
+        indptr = np.cumsum(indptr)
+
+        # a transition is (prob, next_state, reward, done)
+        t = np.array(transitions, dtype=np.float64).reshape(-1, 4)
+        return cls(nS, nA, indptr, t[:, 1].astype(np.int64), t[:, 0], t[:, 2], t[:, 3] != 0)
+
+
+    def q_values(self, V, gamma, out=None, buffer=None):
+        """
+        Q = R + γ T V, as a [nS, nA] array. `out` ([nS*nA]) and `buffer` ([nS]) can be given to
+        avoid any allocation in the sweeps.
+        """
+        out = np.empty(self.nS * self.nA) if out is None else out
+        buffer = np.empty(self.nS) if buffer is None else buffer
+
+        np.multiply(V, gamma, out=buffer)
+        out[:] = self.R
+        matvec_into(self.T, buffer, out)
+
+        if self.has_invalid:
+            out[~self.valid] = -np.inf
+        return out.reshape(self.nS, self.nA)
+
+
+    def q_values_block(self, V, gamma, start, stop, out=None):
+        """
+        Q of the contiguous states [start, stop), as a [stop - start, nA] array. The rows of the
+        block are a slice of the CSR arrays, so nothing is copied.
+        """
+        n_rows = (stop - start) * self.nA
+        out = np.zeros(n_rows) if out is None else out
+        out[:] = 0.
+        indptr = self.T.indptr[start * self.nA: stop * self.nA + 1]  # absolute offsets
+        rows_matvec_into(indptr, self.T.indices, self.T.data, self.nS, V, out)
+        out *= gamma
+        out += self.R[start * self.nA: stop * self.nA]
+
+        if self.has_invalid:
+            out[~self.valid[start * self.nA: stop * self.nA]] = -np.inf
+        return out.reshape(-1, self.nA)
+
+
+    def q_values_states(self, V, gamma, states):
+        """Q of an arbitrary set of states, as a [len(states), nA] array"""
+        rows = (np.asarray(states)[:, None] * self.nA + np.arange(self.nA)).ravel()
+        positions, counts = gather_rows(self.T.indptr, rows)
+        contributions = self.T.data[positions] * V[self.T.indices[positions]]
+        TV = np.bincount(np.repeat(np.arange(len(rows)), counts), weights=contributions,
+                         minlength=len(rows))
+
+        Q = self.R[rows] + gamma * TV
+        if self.has_invalid:
+            Q[~self.valid[rows]] = -np.inf
+        return Q.reshape(-1, self.nA)
+
+
+    def predecessors(self):
+        """
+        CSR [nS, nS]: the row s' holds the states s from which an action can lead to s' (and
+        bootstrap on V(s')). It is the transposed structure of T, computed once.
+        """
+        if self._predecessors is None:
+            pairs = np.repeat(np.arange(self.nS * self.nA), np.diff(self.indptr))
+            bootstrap = self.T.data > 0
+            P_pred = csr_matrix(
+                (np.ones(bootstrap.sum()), (self.next_states[bootstrap], pairs[bootstrap] // self.nA)),
+                shape=(self.nS, self.nS))
+            P_pred.sum_duplicates()
+            self._predecessors = P_pred
+        return self._predecessors
+
+
+    def policy_model(self, π):
+        """T_π [nS, nS] and R_π [nS]: the rows of the actions selected by the policy π [nS]"""
+        rows = np.arange(self.nS) * self.nA + np.asarray(π, dtype=np.int64)
+        return self.T[rows], self.R[rows]
+
+
+    def save(self, directory):
+        """Write the flat arrays as .npy files, to be opened later with DiskMDP(directory)"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        (directory / "meta.json").write_text(json.dumps({"nS": self.nS, "nA": self.nA}))
+
+
+class DiskMDP():
+    """
+    Transition model stored in a directory of .npy files (indptr, next_states, probs, rewards,
+    dones, same layout as CompiledMDP) opened as read-only memory maps. Nothing is loaded at
+    creation: q_values_block reads the transitions of the states [start, stop) only, so a sweep
+    streamed over chunks of `chunk_states` states has a memory bounded by the chunk size (plus V).
+    """
+
+    def __init__(self, directory, chunk_states=65536):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / "meta.json").read_text())
+        self.nS, self.nA = meta["nS"], meta["nA"]
+        self.chunk_states = chunk_states
+        for name in ARRAYS:
+            setattr(self, name, np.load(self.directory / f"{name}.npy", mmap_mode="r"))
+
+
+    def chunks(self, chunk_states=None):
+        chunk_states = chunk_states or self.chunk_states
+        for start in range(0, self.nS, chunk_states):
+            yield start, min(start + chunk_states, self.nS)
+
+
+    def q_values_block(self, V, gamma, start, stop, out=None):
+        """Q of the contiguous states [start, stop), as a [stop - start, nA] array"""
+        n_rows = (stop - start) * self.nA
+        indptr = np.asarray(self.indptr[start * self.nA: stop * self.nA + 1])
+        first, last = indptr[0], indptr[-1]
+
+        # the transitions of the chunk, read from disk
+        next_states = np.asarray(self.next_states[first:last])
+        probs = np.asarray(self.probs[first:last])
+        dones = np.asarray(self.dones[first:last])
+        targets = np.asarray(self.rewards[first:last]) + gamma * V[next_states] * np.logical_not(dones)
+
+        counts = np.diff(indptr)
+        pairs = np.repeat(np.arange(n_rows), counts)
+        out = np.empty(n_rows) if out is None else out
+        out[:] = np.bincount(pairs, weights=probs * targets, minlength=n_rows)
+        out[counts == 0] = -np.inf  # actions not available
+        return out.reshape(-1, self.nA)
+
+
+    def q_values(self, V, gamma, out=None, buffer=None):
+        """Q [nS, nA] computed chunk by chunk (`buffer` is unused, kept for the CompiledMDP API)"""
+        out = np.empty(self.nS * self.nA) if out is None else out
+        for start, stop in self.chunks():
+            self.q_values_block(V, gamma, start, stop, out=out[start * self.nA: stop * self.nA])
+        return out.reshape(self.nS, self.nA)
+
+
+    @classmethod
+    def from_P(cls, P, directory, chunk_states=65536):
+        """
+        Convert a dynamic P (dict of dicts of lists of (prob, next_state, reward, done), as in
+        1.dynamic_programing.py or gym `env.env.P`) to .npy files, without building the flat
+        arrays in RAM: a first pass counts the transitions, a second one writes them in memory
+        maps, chunk of states by chunk of states. P only needs P[s][a] and len(P), it can be a
+        lazy mapping.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        nS = len(P)
+        nA = max(len(P[s]) for s in range(nS))
+        transitions_of = lambda s, a: P[s].get(a, []) if isinstance(P[s], dict) else P[s][a]
+
+        indptr = np.lib.format.open_memmap(directory / "indptr.npy", mode="w+", dtype=np.int64,
+                                           shape=(nS * nA + 1,))
+        indptr[0] = 0
+        for s in range(nS):
+            indptr[s * nA + 1: (s + 1) * nA + 1] = [len(transitions_of(s, a)) for a in range(nA)]
+        np.cumsum(indptr, out=indptr)
+        n_transitions = int(indptr[-1])
+
+        arrays = {
+            name: np.lib.format.open_memmap(directory / f"{name}.npy", mode="w+", dtype=dtype,
+                                            shape=(n_transitions,))
+            for name, dtype in (("next_states", np.int64), ("probs", np.float64),
+                                ("rewards", np.float64), ("dones", bool))}
+
+        for start in range(0, nS, chunk_states):
+            stop = min(start + chunk_states, nS)
+            transitions = [t for s in range(start, stop) for a in range(nA) for t in transitions_of(s, a)]
+            t = np.array(transitions, dtype=np.float64).reshape(-1, 4)
+            first, last = indptr[start * nA], indptr[stop * nA]
+            arrays["probs"][first:last] = t[:, 0]
+            arrays["next_states"][first:last] = t[:, 1]
+            arrays["rewards"][first:last] = t[:, 2]
+            arrays["dones"][first:last] = t[:, 3] != 0
+
+        for array in (indptr, *arrays.values()):
+            array.flush()
+        del indptr, arrays
+        (directory / "meta.json").write_text(json.dumps({"nS": nS, "nA": nA}))
+        return cls(directory, chunk_states)
+
+
+    @classmethod
+    def from_env(cls, env, directory, chunk_states=65536):
+        """Convert the dynamic of a gym toy text env (FrozenLake, gym_walk...)"""
+        P = env.unwrapped.P if hasattr(env.unwrapped, "P") else env.env.P
+        return cls.from_P(P, directory, chunk_states)
+
+
+def policy_to_array(π, nS):
+    """Policy given as a dict {s: a} or an array, to an int array [nS]"""
+    if isinstance(π, dict):
+        return np.fromiter((π[s] for s in range(nS)), dtype=np.int64, count=nS)
+    return np.asarray(π, dtype=np.int64)
+
+
+def make_gridworld(height, width, slip_prob=0.2, step_reward=-0.01, goal_reward=1.0):
+    """
+    Compiled gridworld of height*width states, built directly as arrays (no P dict) so we can
+    create MDPs of millions of states. Actions: 0 left, 1 down, 2 right, 3 up. The agent moves
+    in the chosen direction with probability 1 - slip_prob, otherwise in one of the 2 orthogonal
+    directions. Walls keep the agent in place. The bottom right cell is the terminal goal.
+    """
+    nS, nA = height * width, 4
+    rows, cols = np.divmod(np.arange(nS), width)
+    moves = np.array([(0, -1), (1, 0), (0, 1), (-1, 0)])
+
+    def move(direction):
+        r = np.clip(rows + moves[direction, 0], 0, height - 1)
+        c = np.clip(cols + moves[direction, 1], 0, width - 1)
+        return r * width + c
+
+    destinations = np.stack([move(d) for d in range(nA)])  # [nA, nS]
+    goal = nS - 1
+
+    # 3 transitions per (s, a): intended, slip to the left, slip to the right
+    next_states = np.empty((nS, nA, 3), dtype=np.int64)
+    for a in range(nA):
+        next_states[:, a, 0] = destinations[a]
+        next_states[:, a, 1] = destinations[(a - 1) % nA]
+        next_states[:, a, 2] = destinations[(a + 1) % nA]
+    probs = np.broadcast_to([1 - slip_prob, slip_prob / 2, slip_prob / 2], (nS, nA, 3))
+
+    rewards = np.where(next_states == goal, goal_reward, step_reward)
+    dones = next_states == goal
+
+    # the goal is absorbing with no reward
+    next_states[goal], rewards[goal], dones[goal] = goal, 0., True
+
+    indptr = np.arange(nS * nA + 1, dtype=np.int64) * 3
+    return CompiledMDP(nS, nA, indptr, next_states.ravel(), probs.ravel(), rewards.ravel(),
+                       dones.ravel())
+
+
+def make_random_mdp(nS, nA, branching=3, seed=0):
+    """
+    Random MDP: each (s, a) leads to `branching` random next states with Dirichlet probabilities
+    and a reward drawn from N(mean of the action, 1), the means of the actions being spread so some
+    actions are clearly worse than others. No terminal state.
+    """
+    rng = np.random.default_rng(seed)
+    n_pairs = nS * nA
+    next_states = rng.integers(0, nS, size=(n_pairs, branching))
+    probs = rng.dirichlet(np.ones(branching), size=n_pairs)
+    action_means = np.linspace(-1., 1., nA)
+    rewards = rng.normal(np.tile(action_means, nS)[:, None], 1., size=(n_pairs, branching))
+
+    indptr = np.arange(n_pairs + 1, dtype=np.int64) * branching
+    return CompiledMDP(nS, nA, indptr, next_states.ravel(), probs.ravel(), rewards.ravel(),
+                       np.zeros(n_pairs * branching, dtype=bool))
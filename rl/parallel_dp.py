@@ -0,0 +1,219 @@
+import os
+import time
+import argparse
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils import TabularPolicy
+from mdp import make_gridworld, rows_matvec_into
+
+"""
+Multi-core value iteration.
+
+The state space is split into contiguous blocks, one per worker process, balanced on the number
+of transitions (not of states). The compiled transition arrays (T as CSR, R, valid) and the value
+arrays live in shared memory: they are created once by the main process, and the workers attach
+to them by name, so nothing is copied or pickled per sweep.
+
+2 modes:
+    - "sync": Jacobi sweeps. 2 value buffers, every worker reads the V of the previous sweep and
+      writes its block in the other buffer. A barrier ends every sweep, then the main process
+      checks the global convergence max |V_k+1 - V_k| < theta.
+    - "stale": bounded staleness. A single V, each worker does `staleness` in-place sweeps of its
+      block between 2 barriers, reading the values of the other blocks as they are at that time,
+      so they are at most `staleness` sweeps old. The global check is done on the changes of the
+      last local sweep of every worker. Fewer barriers, and more Gauss-Seidel like propagation
+      inside the blocks.
+
+python parallel_dp.py --size 1000 --workers 1 2 4 8
+reports the sweeps, time and speedup vs. the first core count of each mode.
+"""
+
+
+def available_cores():
+    """Cores this process may run on (the affinity mask only exists on Linux)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class SharedArray():
+    """numpy array in a SharedMemory block, rebuilt in the workers from its spec()"""
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape, self.dtype = tuple(shape), np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        shared = cls(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    def spec(self):
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self, unlink=False):
+        del self.array  # the buffer cannot be closed while a view exists
+        self.shm.close()
+        if unlink: self.shm.unlink()
+
+
+def partition(indptr, nA, n_parts):
+    """Contiguous state blocks [start, stop) with about the same number of transitions"""
+    nS = (len(indptr) - 1) // nA
+    transitions_at_state = indptr[::nA]  # first transition of each state, and the total
+    targets = np.linspace(0, indptr[-1], n_parts + 1)
+    bounds = np.searchsorted(transitions_at_state, targets)
+    bounds[0], bounds[-1] = 0, nS
+    bounds = np.maximum.accumulate(bounds)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def backup_block(indptr, indices, data, R, valid, V_in, gamma, nA, start, stop, Q):
+    """max_a R(s, a) + γ ∑ T(s, a, s') V_in(s') of the states [start, stop), Q is a buffer"""
+    rows = slice(start * nA, stop * nA)
+    Q[:] = 0.
+    rows_matvec_into(indptr[start * nA: stop * nA + 1], indices, data, len(V_in), V_in, Q)
+    Q *= gamma
+    Q += R[rows]
+    Q[~valid[rows]] = -np.inf
+    return Q.reshape(-1, nA).max(axis=1)
+
+
+def _worker(rank, specs, block, nA, gamma, mode, staleness, barrier, stop_flag, changes, timeout):
+    arrays = {key: SharedArray(shape, dtype, name) for key, (name, shape, dtype) in specs.items()}
+    indptr, indices, data = arrays["indptr"].array, arrays["indices"].array, arrays["data"].array
+    R, valid = arrays["R"].array, arrays["valid"].array
+    buffers = (arrays["V0"].array, arrays["V1"].array)
+    start, stop = block
+    Q = np.empty((stop - start) * nA)
+
+    sweep = 0
+    try:
+        while True:
+            barrier.wait(timeout)  # wait for the go of the main process
+            if stop_flag.value: break
+
+            if mode == "sync":
+                V_in, V_out = buffers[sweep % 2], buffers[(sweep + 1) % 2]
+                new_V = backup_block(indptr, indices, data, R, valid, V_in, gamma, nA, start, stop, Q)
+                changes[rank] = np.max(np.abs(new_V - V_in[start:stop]), initial=0.)
+                V_out[start:stop] = new_V
+            else:
+                V = buffers[0]
+                for _ in range(staleness):
+                    new_V = backup_block(indptr, indices, data, R, valid, V, gamma, nA, start, stop, Q)
+                    changes[rank] = np.max(np.abs(new_V - V[start:stop]), initial=0.)
+                    V[start:stop] = new_V  # in place, seen by the other workers
+            sweep += 1
+            barrier.wait(timeout)  # end of the sweep(s)
+    except threading.BrokenBarrierError:
+        pass  # aborted by the main process (or by another worker)
+    except BaseException:
+        barrier.abort()  # the main process raises instead of waiting for this worker
+        raise
+    finally:
+        del buffers, indptr, indices, data, R, valid
+        for shared in arrays.values():
+            shared.close()
+
+
+def _wait(barrier, workers, timeout):
+    """barrier.wait() of the main process, raise if a worker failed instead of blocking forever"""
+    try:
+        barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        barrier.abort()
+        for w in workers: w.join(1.)
+        failed = [f"{w.name} (exit code {w.exitcode})" for w in workers if w.exitcode not in (None, 0)]
+        if failed:
+            raise RuntimeError(f"Parallel value iteration aborted, failed workers: {', '.join(failed)}") from None
+        raise RuntimeError(f"Parallel value iteration aborted, no sweep completed in {timeout}s") from None
+
+
+def parallel_value_iteration(mdp, gamma=0.99, theta=1e-10, n_workers=None, mode="sync", staleness=4,
+                             timeout=600.):
+    """
+    Value iteration of a CompiledMDP on n_workers processes (default: the available cores).
+    Return V, the greedy TabularPolicy and stats (sweeps, wall time).
+    A worker that raises aborts the barrier, and the barrier waits time out after `timeout`
+    seconds (a worker killed by the OOM killer cannot abort it): both raise a RuntimeError.
+    """
+    if mode not in ("sync", "stale"):
+        raise ValueError(f"Unknown mode {mode}, use sync or stale")
+    n_workers = n_workers or available_cores()
+    nS, nA = mdp.nS, mdp.nA
+
+    shared = {
+        "indptr": SharedArray.from_array(mdp.T.indptr.astype(np.int64)),
+        "indices": SharedArray.from_array(mdp.T.indices.astype(np.int64)),
+        "data": SharedArray.from_array(mdp.T.data),
+        "R": SharedArray.from_array(mdp.R),
+        "valid": SharedArray.from_array(mdp.valid),
+        "V0": SharedArray.from_array(np.zeros(nS)),
+        "V1": SharedArray.from_array(np.zeros(nS if mode == "sync" else 1)),
+    }
+    specs = {key: array.spec() for key, array in shared.items()}
+    blocks = partition(shared["indptr"].array, nA, n_workers)
+
+    barrier = mp.Barrier(n_workers + 1)  # the workers and the main process
+    stop_flag = mp.Value("b", 0, lock=False)
+    changes = mp.Array("d", n_workers, lock=False)
+
+    workers = [mp.Process(target=_worker, daemon=True,
+                          args=(rank, specs, block, nA, gamma, mode, staleness, barrier, stop_flag, changes, timeout))
+               for rank, block in enumerate(blocks)]
+    for w in workers: w.start()
+
+    start = time.perf_counter()
+    sweeps = 0
+    try:
+        while True:
+            _wait(barrier, workers, timeout)  # go
+            _wait(barrier, workers, timeout)  # every block is done
+            sweeps += 1 if mode == "sync" else staleness
+            if max(changes) < theta: break
+        stop_flag.value = 1
+        _wait(barrier, workers, timeout)
+        for w in workers: w.join()
+        wall_time = time.perf_counter() - start
+
+        V = shared["V0" if mode == "stale" or sweeps % 2 == 0 else "V1"].array.copy()
+    finally:
+        for w in workers:
+            if w.is_alive(): w.terminate()
+        for array in shared.values():
+            array.close(unlink=True)
+
+    π = TabularPolicy.from_Q(mdp.q_values(V, gamma))
+    return V, π, {"sweeps": sweeps, "wall_time_s": wall_time, "n_workers": n_workers, "mode": mode}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=500, help="gridworld of size x size states")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="core counts to benchmark, default: 1, 2, 4... up to the available cores")
+    parser.add_argument("--gamma", type=float, default=0.99)
+    parser.add_argument("--theta", type=float, default=1e-6)
+    args = parser.parse_args()
+
+    n_cores = available_cores()
+    workers = args.workers or [2 ** i for i in range(n_cores.bit_length()) if 2 ** i <= n_cores]
+
+    grid = make_gridworld(args.size, args.size)
+    print(f"Gridworld of {grid.nS} states, {n_cores} available cores")
+
+    for mode in ("sync", "stale"):
+        reference = None
+        for n_workers in workers:
+            V, π, stats = parallel_value_iteration(grid, args.gamma, args.theta, n_workers, mode)
+            reference = reference or stats["wall_time_s"]
+            print(f"{mode:>5} {n_workers} workers: {stats['sweeps']} sweeps, {stats['wall_time_s']:.2f}s, "
+                  f"speedup {reference / stats['wall_time_s']:.2f}, V(0)={V[0]:.4f}")
@@ -0,0 +1,203 @@
+"""
+Recorders of the learning histories (Q_track, V_track, π_track) of the tabular algorithms.
+
+Keeping a float64 copy of Q for every episode costs n_episodes * nS * nA * 8 bytes: 80 GB for
+10^5 episodes on 10^4 states and 10 actions. The algorithms take a `history` argument choosing
+how the history is recorded:
+
+    "full"                                  every episode, in RAM (the original behavior)
+    {"kind": "strided", "every": 100}       one episode out of 100 (and the last one)
+    {"kind": "delta", "chunk_size": 256}    only the entries that changed since the previous
+                                            record, in zlib compressed chunks
+    {"kind": "memmap", "directory": "runs"} streamed to a .npy file on disk, named after the
+                                            algorithm and the history (e.g. sarsa_Q_track.npy)
+
+Every kind also accepts "every" (strided records) and "dtype" (e.g. "float32", only applied to the
+float histories, π_track stays an integer array). The float histories are stored in DEFAULT_DTYPE
+otherwise. A memmap history also accepts "prefix", prepended to the file names so that several
+runs of the same algorithm can record to the same directory.
+
+A recorder is used as an array of the recorded episodes: len(track), track[i], np.asarray(track),
+and track.episodes gives the episode of each record.
+"""
+
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_DTYPE = np.float64  # of the float histories, whatever the kind of recorder
+
+
+class HistoryRecorder():
+    """Records of the episodes 0, every, 2*every, ... (and the last one), in a preallocated array"""
+
+    def __init__(self, n_episodes, shape, dtype=DEFAULT_DTYPE, every=1):
+        self.n_episodes, self.shape, self.dtype, self.every = n_episodes, tuple(shape), np.dtype(dtype), every
+        self.episodes = np.unique(np.append(np.arange(0, n_episodes, every), max(n_episodes - 1, 0)))
+        self.data = self._allocate((len(self.episodes), *self.shape))
+
+    def _allocate(self, shape):
+        return np.zeros(shape, dtype=self.dtype)
+
+    def _position(self, episode):
+        """Index of the record of the episode, None if the episode is not recorded"""
+        if episode % self.every == 0: return episode // self.every
+        if episode == self.n_episodes - 1: return len(self.episodes) - 1
+        return None
+
+    def record(self, episode, values):
+        position = self._position(episode)
+        if position is not None:
+            self.data[position] = values
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def __getitem__(self, i):
+        return self.data[i]
+
+    def __array__(self, dtype=None):
+        return self.data if dtype is None else self.data.astype(dtype)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def close(self):
+        pass
+
+
+class MemmapRecorder(HistoryRecorder):
+    """Records written to a .npy file opened as a memory map: only the pages in use stay in RAM"""
+
+    def __init__(self, n_episodes, shape, filepath, dtype=DEFAULT_DTYPE, every=1):
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(n_episodes, shape, dtype, every)
+
+    def _allocate(self, shape):
+        return np.lib.format.open_memmap(self.filepath, mode="w+", dtype=self.dtype, shape=shape)
+
+    @property
+    def nbytes(self):
+        return 0  # on disk
+
+    def close(self):
+        self.data.flush()
+
+
+class DeltaRecorder(HistoryRecorder):
+    """
+    Between 2 episodes, only a few entries of Q (or V, π) change. Each chunk of `chunk_size` records
+    stores its first record in full (keyframe), then for every record the positions and values of
+    the entries that changed. A complete chunk is compressed with zlib. The records are exact (in
+    `dtype`), and reading record i only decompresses its chunk.
+    """
+
+    def __init__(self, n_episodes, shape, dtype=DEFAULT_DTYPE, every=1, chunk_size=256, level=1):
+        self.chunk_size, self.level = chunk_size, level
+        super().__init__(n_episodes, shape, dtype, every)
+        self.chunks = []            # compressed (keyframe, counts, positions, values) of each full chunk
+        self._pending = []          # records of the chunk being filled: keyframe then (positions, values)
+        self._last = None
+        self._n_recorded = 0
+        self._cache = (None, None)  # last decompressed chunk
+
+    def _allocate(self, shape):
+        return None
+
+    def record(self, episode, values):
+        if self._position(episode) is None: return
+        values = np.asarray(values, dtype=self.dtype).ravel()
+
+        if not self._pending:
+            self._pending.append(values.copy())
+        else:
+            changed = np.flatnonzero(values != self._last).astype(np.int32)
+            self._pending.append((changed, values[changed]))
+        self._last = values.copy()
+        self._n_recorded += 1
+
+        if len(self._pending) == self.chunk_size:
+            self._compress_pending()
+
+    def _compress_pending(self):
+        keyframe, deltas = self._pending[0], self._pending[1:]
+        counts = np.array([len(positions) for positions, _ in deltas], dtype=np.int32)
+        positions = np.concatenate([p for p, _ in deltas]) if deltas else np.empty(0, np.int32)
+        values = np.concatenate([v for _, v in deltas]) if deltas else np.empty(0, self.dtype)
+        self.chunks.append(tuple(zlib.compress(a.tobytes(), self.level)
+                                 for a in (keyframe, counts, positions, values)))
+        self._pending = []
+
+    def _decode_chunk(self, c):
+        """All the records of the chunk c, as an array [n records of the chunk, *shape]"""
+        if self._cache[0] == c: return self._cache[1]
+
+        if c < len(self.chunks):
+            keyframe, counts, positions, values = (
+                np.frombuffer(zlib.decompress(b), dtype=dtype) for b, dtype in
+                zip(self.chunks[c], (self.dtype, np.int32, np.int32, self.dtype)))
+            deltas = np.split(positions, np.cumsum(counts)[:-1]), np.split(values, np.cumsum(counts)[:-1])
+            deltas = list(zip(*deltas)) if len(counts) else []
+        else:
+            keyframe, deltas = self._pending[0], self._pending[1:]
+
+        records = np.empty((1 + len(deltas), keyframe.size), dtype=self.dtype)
+        records[0] = keyframe
+        for i, (p, v) in enumerate(deltas, start=1):
+            records[i] = records[i - 1]
+            records[i, p] = v
+
+        records = records.reshape(-1, *self.shape)
+        self._cache = (c, records)
+        return records
+
+    def __len__(self):
+        return self._n_recorded
+
+    def __getitem__(self, i):
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError(i)
+        return self._decode_chunk(i // self.chunk_size)[i % self.chunk_size]
+
+    def __array__(self, dtype=None):
+        """Decompress every record (the whole history in RAM)"""
+        n_chunks = -(-len(self) // self.chunk_size)
+        records = np.concatenate([self._decode_chunk(c) for c in range(n_chunks)]) if len(self) \
+            else np.empty((0, *self.shape), dtype=self.dtype)
+        return records if dtype is None else records.astype(dtype)
+
+    @property
+    def nbytes(self):
+        pending = sum(r.nbytes if isinstance(r, np.ndarray) else r[0].nbytes + r[1].nbytes
+                      for r in self._pending)
+        return sum(len(b) for chunk in self.chunks for b in chunk) + pending
+
+
+def make_recorder(history, n_episodes, shape, dtype=DEFAULT_DTYPE, name="track"):
+    """
+    Recorder of a history described by `history` (see the module docstring). `name` is the file
+    name of a memmap recorder, the algorithms include their own name in it (e.g. "sarsa_Q_track")
+    so that their histories do not overwrite each other.
+    """
+    spec = {"kind": history} if isinstance(history, str) else dict(history or {"kind": "full"})
+    kind = spec.pop("kind", "full")
+
+    # float32 storage only applies to the values, not to the actions of π_track
+    float_dtype = spec.pop("dtype", None)
+    if float_dtype is not None and np.issubdtype(dtype, np.floating):
+        dtype = float_dtype
+
+    if kind in ("full", "strided"):
+        return HistoryRecorder(n_episodes, shape, dtype, **spec)
+    if kind == "delta":
+        return DeltaRecorder(n_episodes, shape, dtype, **spec)
+    if kind == "memmap":
+        directory = Path(spec.pop("directory", "."))
+        prefix = spec.pop("prefix", None)
+        filename = f"{prefix}_{name}.npy" if prefix else f"{name}.npy"
+        return MemmapRecorder(n_episodes, shape, directory / filename, dtype, **spec)
+    raise ValueError(f"Unknown history {kind}, use full, strided, delta or memmap")
+
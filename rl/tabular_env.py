@@ -0,0 +1,191 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from mdp import CompiledMDP, make_gridworld
+
+"""
+Vectorized tabular environment, in pure numpy, built from the dynamic P of a tabular env (or a
+CompiledMDP). Thousands of independent episodes are stepped in one call to step(actions), instead
+of one transition at a time through a python gym env.
+
+Sampling a transition of (s, a) uses alias tables (Walker / Vose): each (s, a) row of K possible
+transitions is turned into K columns, each holding a probability and an alias. A sample is one
+uniform column and one uniform threshold, so it is O(1) whatever the number of transitions.
+
+It has the interface of utils.GymEnvBatch (n_envs, observation_space.n, action_space.n, reset(),
+step(actions, active)), so the batched learners of 4.sample_based.py run on it directly. With
+autoreset, an env whose episode ended starts a new one: step() still returns the true last
+next_state of the ended episode, and `states` holds the new initial states.
+
+estimate_returns(π, gamma) runs one episode per env with a fixed policy, to validate the values
+computed by DynamicProgramming.
+"""
+
+
+def build_alias_tables(indptr, probs):
+    """
+    Alias tables of the rows of a CSR-like layout (the transitions of row i are at
+    indptr[i]:indptr[i+1]), padded to K = the max number of transitions of a row.
+    Vectorized over the rows: each of the K - 1 iterations pairs, in every row, the column with the
+    smallest scaled probability (< 1) with the one with the largest, and finalizes the small one.
+    Return threshold [n_rows, K] and alias [n_rows, K].
+    """
+    counts = np.diff(indptr)
+    n_rows, K = len(counts), max(int(counts.max(initial=1)), 1)
+    rows = np.arange(n_rows)
+
+    scaled = np.zeros((n_rows, K))
+    scaled[np.arange(K) < counts[:, None]] = probs  # row major: the order of the transitions
+    scaled *= K
+
+    threshold = np.ones((n_rows, K))
+    alias = np.tile(np.arange(K), (n_rows, 1))
+    finalized = np.zeros((n_rows, K), dtype=bool)
+
+    for _ in range(K - 1):
+        small = np.argmin(np.where(finalized, np.inf, scaled), axis=1)
+        candidates = np.where(finalized, -np.inf, scaled)
+        candidates[rows, small] = -np.inf
+        large = np.argmax(candidates, axis=1)
+
+        r = rows[scaled[rows, small] < 1]  # rows with a column still under 1
+        s, l = small[r], large[r]
+        threshold[r, s] = scaled[r, s]
+        alias[r, s] = l
+        scaled[r, l] -= 1 - scaled[r, s]  # the large column gives the missing mass
+        finalized[r, s] = True
+
+    return threshold, alias
+
+
+class VectorizedTabularEnv():
+    """
+    - P: dynamic P (dict of dicts of lists of (prob, next_state, reward, done)) or CompiledMDP
+    - n_envs: number of independent episodes stepped together
+    - initial_states: initial state, or initial state distribution [nS]
+    - max_steps: episodes are truncated after max_steps steps (None: no limit)
+    """
+
+    def __init__(self, P, n_envs, initial_states=0, max_steps=None, autoreset=True, seed=None):
+        self.mdp = P if isinstance(P, CompiledMDP) else CompiledMDP.from_P(P)
+        self.nS, self.nA = self.mdp.nS, self.mdp.nA
+        self.observation_space, self.action_space = SimpleNamespace(n=self.nS), SimpleNamespace(n=self.nA)
+        self.n_envs, self.max_steps, self.autoreset = n_envs, max_steps, autoreset
+        self.rng = np.random.default_rng(seed)
+
+        if np.ndim(initial_states) == 0:
+            self.initial_distribution = np.zeros(self.nS)
+            self.initial_distribution[initial_states] = 1.
+        else:
+            self.initial_distribution = np.asarray(initial_states, dtype=np.float64)
+        self.threshold, self.alias = build_alias_tables(self.mdp.indptr, self.mdp.probs)
+        self.K = self.threshold.shape[1]
+
+        self.states = np.zeros(n_envs, dtype=np.int64)
+        self.t = np.zeros(n_envs, dtype=np.int64)
+
+
+    @classmethod
+    def from_env(cls, env, n_envs, max_steps=None, autoreset=True, seed=None):
+        """
+        From a gym toy text env: its P and initial state distribution, `initial_state_distrib` in
+        gym >= 0.21 (FrozenLake, CliffWalking...), `isd` in the older envs (gym_walk...).
+        """
+        unwrapped = env.unwrapped if hasattr(env, "unwrapped") else env.env
+        for attribute in ("initial_state_distrib", "isd"):
+            if hasattr(unwrapped, attribute):
+                initial_states = getattr(unwrapped, attribute)
+                return cls(unwrapped.P, n_envs, initial_states, max_steps, autoreset, seed)
+        raise ValueError(f"{type(unwrapped).__name__} has no initial_state_distrib nor isd attribute, "
+                         "build the VectorizedTabularEnv from its P with initial_states")
+
+
+    def _initial_states(self, n):
+        return self.rng.choice(self.nS, size=n, p=self.initial_distribution)
+
+
+    def sample_transitions(self, rows):
+        """Index (in the compiled arrays) of a sampled transition for each (s, a) row"""
+        u = self.rng.random(len(rows)) * self.K
+        columns = np.minimum(u.astype(np.int64), self.K - 1)
+        below = (u - columns) < self.threshold[rows, columns]
+        return self.mdp.indptr[rows] + np.where(below, columns, self.alias[rows, columns])
+
+
+    def reset(self):
+        self.states = self._initial_states(self.n_envs)
+        self.t[:] = 0
+        return self.states.copy()
+
+
+    def step(self, actions, active=None):
+        """Return next_states, rewards, terminals (no bootstrap) and truncated, arrays of [n_envs]"""
+        idx = np.arange(self.n_envs) if active is None else np.flatnonzero(active)
+        rows = self.states[idx] * self.nA + np.asarray(actions)[idx]
+        if self.mdp.has_invalid and not self.mdp.valid[rows].all():
+            raise ValueError("Action not available in the state")
+
+        transitions = self.sample_transitions(rows)
+        next_states = self.states.copy()
+        rewards = np.zeros(self.n_envs)
+        terminals = np.zeros(self.n_envs, dtype=bool)
+        truncated = np.zeros(self.n_envs, dtype=bool)
+
+        next_states[idx] = self.mdp.next_states[transitions]
+        rewards[idx] = self.mdp.rewards[transitions]
+        terminals[idx] = self.mdp.dones[transitions]
+        self.t[idx] += 1
+        if self.max_steps is not None:
+            truncated[idx] = ~terminals[idx] & (self.t[idx] >= self.max_steps)
+
+        self.states[idx] = next_states[idx]
+        if self.autoreset:
+            ended = idx[terminals[idx] | truncated[idx]]
+            self.states[ended] = self._initial_states(len(ended))
+            self.t[ended] = 0
+        return next_states, rewards, terminals, truncated
+
+
+    def estimate_returns(self, π, gamma=1.0, max_steps=10000):
+        """
+        Run one episode per env with the policy π (TabularPolicy, array [nS] or dict), return the
+        initial states and the discounted returns. The mean return estimates
+        initial_distribution @ V_π, and the mean return of the episodes starting in s estimates
+        V_π(s).
+        """
+        π = np.asarray([π[s] for s in range(self.nS)] if isinstance(π, dict) else π, dtype=np.int64)
+        autoreset, self.autoreset = self.autoreset, False
+
+        start_states = self.reset()
+        returns, discount = np.zeros(self.n_envs), np.ones(self.n_envs)
+        running = np.ones(self.n_envs, dtype=bool)
+        for _ in range(max_steps):
+            if not running.any(): break
+            _, rewards, terminals, truncated = self.step(π[self.states], running)
+            returns += discount * rewards * running
+            discount *= gamma
+            running &= ~(terminals | truncated)
+
+        self.autoreset = autoreset
+        return start_states, returns
+
+
+if __name__ == "__main__":
+    import time
+    import importlib.util
+
+    # validation of DynamicProgramming: the values of the optimal policy of a gridworld vs. the
+    # mean discounted returns of 10^5 sampled episodes from the top left corner
+    spec = importlib.util.spec_from_file_location("dynamic_programing", "1.dynamic_programing.py")
+    dynamic_programing = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(dynamic_programing)
+
+    grid = make_gridworld(10, 10)
+    V, π = dynamic_programing.DynamicProgramming({}, grid, gamma=0.99, theta=1e-10).value_iteration()
+
+    env = VectorizedTabularEnv(grid, n_envs=100_000, initial_states=0, seed=0)
+    start = time.perf_counter()
+    _, returns = env.estimate_returns(π, gamma=0.99)
+    print(f"V(0) = {V[0]:.4f}, sampled return = {returns.mean():.4f} ± {returns.std() / np.sqrt(len(returns)):.4f} "
+          f"({len(returns)} episodes in {time.perf_counter() - start:.2f}s)")
@@ -0,0 +1,55 @@
+import sys
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+RL_DIR = Path(__file__).resolve().parent.parent
+_utils = None  # the utils module of this directory
+
+
+def use_rl_modules():
+    """
+    The rl modules import their siblings directly (import utils, from mdp import ...), and
+    deep_rl/policy_based_and_ac has its own utils module: put rl/ first on the path and make
+    "utils" this directory's module again, before importing and before running the tests of this
+    directory, in whatever order pytest collects the two.
+    """
+    global _utils
+    if str(RL_DIR) in sys.path: sys.path.remove(str(RL_DIR))
+    sys.path.insert(0, str(RL_DIR))
+    if _utils is None:
+        utils = sys.modules.get("utils")
+        if utils is not None and Path(utils.__file__).parent != RL_DIR:
+            del sys.modules["utils"]  # kept by the other conftest
+        _utils = importlib.import_module("utils")
+    sys.modules["utils"] = _utils  # the same module object, its classes stay the same
+
+
+def pytest_pycollect_makemodule(module_path, parent):
+    use_rl_modules()
+
+
+def pytest_runtest_setup(item):
+    use_rl_modules()
+
+
+def load_module(filename):
+    """Import a numbered file of rl/ (1.dynamic_programing.py...), not importable by name"""
+    name = filename.split(".", 1)[1].removesuffix(".py")
+    if name in sys.modules: return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, RL_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def dp():
+    return load_module("1.dynamic_programing.py")
+
+
+@pytest.fixture(scope="session")
+def sample_based():
+    return load_module("4.sample_based.py")
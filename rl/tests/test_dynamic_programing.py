@@ -0,0 +1,230 @@
+import numpy as np
+import pytest
+
+from mdp import DiskMDP, make_gridworld, make_random_mdp
+
+THETA = 1e-10
+ATOL = 1e-6  # |V - V*| <= theta γ / (1 - γ) for the sweeps, looser for the other stopping rules
+
+MDPS = {
+    "gridworld": (lambda: make_gridworld(6, 6), 0.95),
+    "random": (lambda: make_random_mdp(50, 3, seed=1), 0.9),
+}
+
+
+@pytest.fixture(params=list(MDPS), scope="module")
+def problem(request, dp):
+    """(mdp, gamma, V*, Q*) with V* from the baseline jacobi value iteration"""
+    make, gamma = MDPS[request.param]
+    mdp = make()
+    V, _ = dp.DynamicProgramming({}, mdp, gamma, THETA).value_iteration()
+    return mdp, gamma, V, mdp.q_values(V, gamma)
+
+
+def assert_optimal(V, π, problem):
+    """V close to V*, and π greedy w.r.t. Q* (ties can be broken either way)"""
+    _, _, V_star, Q_star = problem
+    np.testing.assert_allclose(V, V_star, atol=ATOL)
+    π = np.asarray(π)
+    states = np.arange(len(V_star))
+    assert np.all(Q_star[states, π] >= Q_star.max(axis=1) - ATOL)
+
+
+@pytest.mark.parametrize("evaluation", ["sweeps", "spsolve", "gmres", "bicgstab"])
+def test_policy_iteration(dp, problem, evaluation):
+    mdp, gamma, _, _ = problem
+    π0 = np.zeros(mdp.nS, dtype=np.int64)
+    V, π = dp.DynamicProgramming(π0, mdp, gamma, THETA).policy_iteration(evaluation)
+    assert_optimal(V, π, problem)
+
+
+@pytest.mark.parametrize("method", ["spsolve", "gmres", "bicgstab"])
+def test_policy_evaluation_methods_agree(dp, problem, method):
+    mdp, gamma, _, _ = problem
+    π = np.random.default_rng(0).integers(0, mdp.nA, mdp.nS)
+    V_sweeps = dp.DynamicProgramming(π, mdp, gamma, THETA)._policy_evaluation("sweeps")
+    V = dp.DynamicProgramming(π, mdp, gamma, THETA)._policy_evaluation(method)
+    np.testing.assert_allclose(V, V_sweeps, atol=ATOL)
+
+
+def test_exact_solver_resets_stats(dp, problem):
+    mdp, gamma, _, _ = problem
+    solver = dp.DynamicProgramming(np.zeros(mdp.nS, dtype=np.int64), mdp, gamma, THETA)
+    solver._policy_evaluation("sweeps")
+    solver._policy_evaluation("spsolve")
+    assert solver.stats == {"sweeps": 0, "solver": "spsolve"}
+
+
+def test_unknown_evaluation_method(dp, problem):
+    mdp, gamma, _, _ = problem
+    with pytest.raises(ValueError):
+        dp.DynamicProgramming(np.zeros(mdp.nS, dtype=np.int64), mdp, gamma, THETA)._policy_evaluation("lu")
+
+
+def test_modified_policy_iteration(dp, problem):
+    mdp, gamma, _, _ = problem
+    π0 = np.zeros(mdp.nS, dtype=np.int64)
+    _, π = dp.DynamicProgramming(π0, mdp, gamma, THETA).modified_policy_iteration()
+    # the span stopping rule guarantees a theta-optimal policy, not V: check the values of π
+    V_π = dp.DynamicProgramming(π, mdp, gamma, THETA)._policy_evaluation("spsolve")
+    assert_optimal(V_π, π, problem)
+
+
+def test_modified_policy_iteration_truncates_the_evaluations(dp, problem):
+    mdp, gamma, _, _ = problem
+    solver = dp.DynamicProgramming(np.zeros(mdp.nS, dtype=np.int64), mdp, gamma, THETA)
+    solver.modified_policy_iteration(k_max=3)
+    assert solver.stats["evaluation_sweeps"] <= 2 * solver.stats["improvements"]
+
+
+@pytest.mark.parametrize("method, kwargs", [
+    ("gauss_seidel", {"block_size": 8}),  # several blocks, the last one partial
+    ("gauss_seidel", {"block_size": 1024}),
+    ("prioritized", {"batch_size": 4}),
+    ("prioritized", {"batch_size": 1024}),  # every state at once: the dense path
+])
+def test_asynchronous_value_iteration(dp, problem, method, kwargs):
+    mdp, gamma, _, _ = problem
+    V, π = dp.DynamicProgramming({}, mdp, gamma, THETA).value_iteration(method, **kwargs)
+    assert_optimal(V, π, problem)
+
+
+def test_prioritized_sweeping_counts_backups_like_jacobi(dp, problem):
+    mdp, gamma, _, _ = problem
+    solver = dp.DynamicProgramming({}, mdp, gamma, THETA)
+    solver.value_iteration("prioritized", batch_size=mdp.nS)
+    # backing up every state with an error at each step is jacobi restricted to the changing states
+    jacobi = dp.DynamicProgramming({}, mdp, gamma, THETA)
+    jacobi.value_iteration()
+    assert 0 < solver.stats["backups"] <= jacobi.stats["backups"]
+    assert solver.stats["error_evaluations"] >= solver.stats["backups"]
+
+
+def test_batched_value_iteration(dp):
+    mdp, gammas = make_gridworld(5, 5), [0.9, 0.95, 0.99]
+    V, π = dp.BatchedDynamicProgramming(mdp, gammas, theta=THETA).value_iteration()
+    for b, gamma in enumerate(gammas):
+        V_b, _ = dp.DynamicProgramming({}, mdp, gamma, THETA).value_iteration()
+        np.testing.assert_allclose(V[b], V_b, atol=ATOL)
+        Q = mdp.q_values(V_b, gamma)
+        assert np.all(Q[np.arange(mdp.nS), π[b]] >= Q.max(axis=1) - ATOL)
+
+
+def test_batched_policy_iteration_and_evaluation(dp):
+    mdps = [make_random_mdp(30, 3, seed=s) for s in range(3)]
+    policies = np.zeros((3, 30), dtype=np.int64)
+    V, π = dp.BatchedDynamicProgramming(mdps, 0.9, policies, THETA).policy_iteration()
+    for b, mdp in enumerate(mdps):
+        V_b, _ = dp.DynamicProgramming({}, mdp, 0.9, THETA).value_iteration()
+        np.testing.assert_allclose(V[b], V_b, atol=ATOL)
+
+    V_π = dp.BatchedDynamicProgramming(mdps, 0.9, π, THETA).policy_evaluation()
+    np.testing.assert_allclose(V_π, V, atol=ATOL)
+
+
+def test_batched_shapes_must_broadcast(dp):
+    mdp = make_gridworld(3, 3)
+    with pytest.raises(ValueError):
+        dp.BatchedDynamicProgramming([mdp, mdp], [0.9, 0.95, 0.99])
+    with pytest.raises(ValueError):
+        dp.BatchedDynamicProgramming([mdp, make_gridworld(2, 2)])
+
+
+@pytest.mark.parametrize("method", ["jacobi", "gauss_seidel"])
+def test_disk_mdp(dp, problem, tmp_path, method):
+    mdp, gamma, _, _ = problem
+    mdp.save(tmp_path)
+    disk = DiskMDP(tmp_path, chunk_states=7)  # several chunks, the last one partial
+    V, π = dp.DynamicProgramming({}, disk, gamma, THETA).value_iteration(method)
+    assert_optimal(V, π, problem)
+
+
+def to_dynamic_P(mdp):
+    """The dynamic P dict of a CompiledMDP, P[s][a] = [(prob, next_state, reward, done), ...]"""
+    P = {s: {} for s in range(mdp.nS)}
+    for s in range(mdp.nS):
+        for a in range(mdp.nA):
+            t = slice(mdp.indptr[s * mdp.nA + a], mdp.indptr[s * mdp.nA + a + 1])
+            P[s][a] = list(zip(mdp.probs[t], mdp.next_states[t], mdp.rewards[t], mdp.dones[t]))
+    return P
+
+
+def test_disk_mdp_from_P(dp, tmp_path):
+    grid = make_gridworld(4, 4)
+    disk = DiskMDP.from_P(to_dynamic_P(grid), tmp_path, chunk_states=5)
+    V, _ = dp.DynamicProgramming({}, disk, 0.9, THETA).value_iteration()
+    V_ram, _ = dp.DynamicProgramming({}, grid, 0.9, THETA).value_iteration()
+    np.testing.assert_allclose(V, V_ram, atol=1e-9)
+
+
+def test_disk_mdp_rejects_in_ram_methods(dp, tmp_path):
+    make_gridworld(3, 3).save(tmp_path)
+    solver = dp.DynamicProgramming(np.zeros(9, dtype=np.int64), DiskMDP(tmp_path), 0.9, THETA)
+    for run in (lambda: solver.value_iteration("prioritized"),
+                lambda: solver.value_iteration("elimination"),
+                lambda: solver.value_iteration("anderson"),
+                lambda: solver._policy_evaluation("spsolve"),
+                solver.policy_iteration,
+                solver.modified_policy_iteration):
+        with pytest.raises(ValueError, match="DiskMDP"):
+            run()
+
+
+def test_action_elimination(dp, problem):
+    mdp, gamma, _, _ = problem
+    solver = dp.DynamicProgramming({}, mdp, gamma, THETA)
+    V, π = solver.value_iteration("elimination")
+    assert_optimal(V, π, problem)
+    eliminated = solver.stats["eliminated_fraction"]
+    assert all(a <= b for a, b in zip(eliminated, eliminated[1:]))  # eliminated for good
+
+
+def test_action_elimination_keeps_the_optimal_actions(dp):
+    """Many clearly suboptimal actions: most pairs are dropped, never an optimal one"""
+    mdp = make_random_mdp(200, 10, seed=2)
+    solver = dp.DynamicProgramming({}, mdp, 0.9, THETA)
+    V, π = solver.value_iteration("elimination")
+    jacobi = dp.DynamicProgramming({}, mdp, 0.9, THETA)
+    V_star, π_star = jacobi.value_iteration()
+    np.testing.assert_allclose(V, V_star, atol=ATOL)
+    assert π == π_star
+    assert solver.stats["eliminated_fraction"][-1] > 0.5
+    assert solver.stats["pair_backups"] < jacobi.stats["pair_backups"]
+
+
+def test_action_elimination_needs_gamma_below_1(dp):
+    with pytest.raises(ValueError):
+        dp.DynamicProgramming({}, make_gridworld(3, 3), 1., THETA).value_iteration("elimination")
+
+
+def test_anderson_value_iteration(dp, problem):
+    mdp, gamma, _, _ = problem
+    V, π = dp.DynamicProgramming({}, mdp, gamma, THETA).value_iteration("anderson", m=5)
+    assert_optimal(V, π, problem)
+
+
+def test_anderson_policy_evaluation(dp, problem):
+    mdp, gamma, _, _ = problem
+    π = np.random.default_rng(0).integers(0, mdp.nA, mdp.nS)
+    plain = dp.DynamicProgramming(π, mdp, gamma, THETA)
+    V_sweeps = plain._policy_evaluation("sweeps")
+    anderson = dp.DynamicProgramming(π, mdp, gamma, THETA)
+    V = anderson._policy_evaluation("anderson")
+    np.testing.assert_allclose(V, V_sweeps, atol=ATOL)
+    assert anderson.stats["sweeps"] * 3 < plain.stats["sweeps"]
+
+
+def test_anderson_sweep_reduction_at_gamma_099(dp):
+    """The order of magnitude of the demo: policy evaluation of a random policy at γ = 0.99"""
+    mdp = make_random_mdp(300, 4)
+    π = np.random.default_rng(0).integers(0, mdp.nA, mdp.nS)
+    plain, anderson = (dp.DynamicProgramming(π, mdp, 0.99, THETA) for _ in range(2))
+    plain._policy_evaluation("sweeps")
+    anderson._policy_evaluation("anderson")
+    assert anderson.stats["sweeps"] * 10 <= plain.stats["sweeps"]
+
+
+def test_unknown_value_iteration_method(dp, problem):
+    mdp, gamma, _, _ = problem
+    with pytest.raises(ValueError):
+        dp.DynamicProgramming({}, mdp, gamma, THETA).value_iteration("sor")
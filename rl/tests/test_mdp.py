@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import mdp
+from mdp import CompiledMDP, gather_rows, make_gridworld, make_random_mdp, matvec_into, rows_matvec_into
+
+# the 3 states example of 1.dynamic_programing.py, P[s][a] = [(prob, next_state, reward, done), ...]
+P = {
+    0: {0: [(1., 0, 0., True)], 1: [(1., 0, 0., True)]},
+    1: {0: [(.7, 0, 0., True), (.15, 1, 0., False), (.15, 2, 1., True)],
+        1: [(.7, 2, 1., True), (.15, 1, 0., False), (.15, 0, 0., True)]},
+    2: {0: [(1., 2, 0., True)], 1: [(1., 2, 0., True)]},
+}
+
+
+def naive_q_values(P, V, gamma):
+    """Q(s, a) = ∑ p (r + γ V(s') (1 - done)) by looping over the dict, -inf for a missing action"""
+    nA = max(len(P[s]) for s in P)
+    Q = np.full((len(P), nA), -np.inf)
+    for s in P:
+        for a, transitions in P[s].items():
+            Q[s, a] = sum(p * (r + gamma * V[next_s] * (not done)) for p, next_s, r, done in transitions)
+    return Q
+
+
+@pytest.mark.parametrize("P", [P, {**P, 2: {0: [(1., 2, 0., True)]}}])  # and an action not available
+def test_compiled_q_values_match_the_dict(P):
+    compiled = CompiledMDP.from_P(P)
+    V = np.array([0.3, -1., 2.])
+    Q = naive_q_values(P, V, 0.9)
+    np.testing.assert_allclose(compiled.q_values(V, 0.9), Q)
+    np.testing.assert_allclose(compiled.q_values_block(V, 0.9, 1, 3), Q[1:3])
+    np.testing.assert_allclose(compiled.q_values_states(V, 0.9, np.array([2, 0])), Q[[2, 0]])
+
+
+def test_matvec_fallback_without_csr_matvec(monkeypatch):
+    """The public csr_matrix product gives the same result as scipy's private kernel"""
+    T = make_random_mdp(20, 3, seed=0).T
+    x = np.random.default_rng(0).normal(size=20)
+    expected = T @ x + 1.
+    for kernel in (mdp.csr_matvec, None):
+        monkeypatch.setattr(mdp, "csr_matvec", kernel)
+        np.testing.assert_allclose(matvec_into(T, x, np.ones(T.shape[0])), expected)
+        # a slice of the rows, with the absolute offsets of the whole matrix
+        out = rows_matvec_into(T.indptr[10:31], T.indices, T.data, 20, x, np.ones(20))
+        np.testing.assert_allclose(out, expected[10:30])
+
+
+def test_gather_rows():
+    indptr = np.array([0, 2, 2, 5, 6])
+    positions, counts = gather_rows(indptr, np.array([2, 0, 1, 3]))
+    np.testing.assert_array_equal(positions, [2, 3, 4, 0, 1, 5])
+    np.testing.assert_array_equal(counts, [3, 2, 0, 1])
+
+
+def test_predecessors():
+    grid = make_gridworld(3, 3)
+    predecessors = grid.predecessors()
+    T = grid.T.toarray().reshape(grid.nS, grid.nA, grid.nS)
+    for s_next in range(grid.nS):
+        expected = np.flatnonzero(T[:, :, s_next].sum(axis=1) > 0)
+        np.testing.assert_array_equal(np.sort(predecessors[s_next].indices), expected)
+
+
+def test_value_iteration_of_the_dict(dp):
+    """Compiled sweeps and textbook value iteration over the dict reach the same V and π"""
+    V = np.zeros(len(P))
+    while True:
+        new_V = naive_q_values(P, V, 0.99).max(axis=1)
+        if np.max(np.abs(new_V - V)) < 1e-12: break
+        V = new_V
+
+    V_dp, π = dp.DynamicProgramming({}, P, 0.99, 1e-12).value_iteration()
+    np.testing.assert_allclose(V_dp, V, atol=1e-9)
+    assert π == {0: 0, 1: 1, 2: 0}
+
+
+def test_policy_evaluation_sweeps_solve_the_bellman_equation(dp):
+    grid = make_gridworld(4, 4)
+    π = np.random.default_rng(0).integers(0, grid.nA, grid.nS)
+    T_π, R_π = grid.policy_model(π)
+    V_π = np.linalg.solve(np.eye(grid.nS) - 0.9 * T_π.toarray(), R_π)
+    np.testing.assert_allclose(dp.DynamicProgramming(π, grid, 0.9, 1e-12)._policy_evaluation(), V_π, atol=1e-9)
@@ -0,0 +1,53 @@
+import os
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+import parallel_dp
+from mdp import make_gridworld, make_random_mdp
+from parallel_dp import available_cores, parallel_value_iteration, partition
+
+THETA = 1e-10
+
+# the failure tests patch backup_block in this process, the workers only see it when forked
+forked = pytest.mark.skipif(mp.get_start_method() != "fork", reason="needs the fork start method")
+
+
+@pytest.mark.parametrize("mdp, gamma", [(make_gridworld(6, 6), 0.95), (make_random_mdp(50, 3, seed=1), 0.9)])
+@pytest.mark.parametrize("n_workers, mode", [(1, "sync"), (2, "sync"), (2, "stale")])
+def test_parallel_value_iteration(dp, mdp, gamma, n_workers, mode):
+    V_star, _ = dp.DynamicProgramming({}, mdp, gamma, THETA).value_iteration()
+    V, π, stats = parallel_value_iteration(mdp, gamma, THETA, n_workers, mode, timeout=60.)
+    assert stats["n_workers"] == n_workers
+    np.testing.assert_allclose(V, V_star, atol=1e-6)
+    Q = mdp.q_values(V_star, gamma)
+    assert np.all(Q[np.arange(mdp.nS), np.asarray(π)] >= Q.max(axis=1) - 1e-6)
+
+
+def test_partition_covers_the_states():
+    grid = make_gridworld(7, 5)
+    blocks = partition(grid.T.indptr, grid.nA, 4)
+    assert blocks[0][0] == 0 and blocks[-1][1] == grid.nS
+    assert all(stop == next_start for (_, stop), (next_start, _) in zip(blocks, blocks[1:]))
+
+
+def test_available_cores_without_affinity(monkeypatch):
+    monkeypatch.delattr(os, "sched_getaffinity", raising=False)
+    assert available_cores() == (os.cpu_count() or 1)
+
+
+def _raise(*args):
+    raise MemoryError("worker out of memory")
+
+
+def _die(*args):
+    os._exit(3)  # killed: the barrier is not aborted
+
+
+@forked
+@pytest.mark.parametrize("backup, timeout", [(_raise, 60.), (_die, 2.)])
+def test_failed_worker_raises(monkeypatch, backup, timeout):
+    monkeypatch.setattr(parallel_dp, "backup_block", backup)
+    with pytest.raises(RuntimeError, match="failed workers"):
+        parallel_value_iteration(make_gridworld(4, 4), 0.9, THETA, n_workers=2, timeout=timeout)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from mdp import make_gridworld
+from utils import TabularPolicy
+
+
+def test_lookups():
+    π = TabularPolicy([2, 0, 1])
+    assert π(0) == 2 and π[2] == 1 and isinstance(π(1), int)
+    np.testing.assert_array_equal(π(np.array([2, 2, 0])), [1, 1, 2])
+    assert len(π) == 3 and np.asarray(π).dtype == np.int64
+
+
+def test_equality_with_arrays_dicts_and_policies():
+    π = TabularPolicy([2, 0, 1])
+    assert π == TabularPolicy([2, 0, 1]) and π == np.array([2, 0, 1]) and π == {0: 2, 1: 0, 2: 1}
+    assert π != [2, 0, 0] and π != {0: 2, 1: 1, 2: 1}
+    assert TabularPolicy.from_dict(π.to_dict()) == π
+
+
+def test_from_Q_and_save(tmp_path):
+    Q = np.array([[0., 1.], [3., 2.], [-1., -1.]])
+    π = TabularPolicy.from_Q(Q)
+    assert π == [1, 0, 0]
+    π.save(tmp_path / "pi.npy")
+    assert TabularPolicy.load(tmp_path / "pi.npy") == π
+
+
+@pytest.mark.parametrize("make_π0", [
+    lambda nS: np.zeros(nS, dtype=np.int64),
+    lambda nS: {s: 0 for s in range(nS)},
+    lambda nS: TabularPolicy(np.zeros(nS)),
+])
+def test_policy_iteration_accepts_any_policy_type(dp, make_π0):
+    grid = make_gridworld(4, 4)
+    V, π = dp.DynamicProgramming(make_π0(grid.nS), grid, 0.9, 1e-10).policy_iteration()
+    V_star, _ = dp.DynamicProgramming({}, grid, 0.9, 1e-10).value_iteration()
+    assert isinstance(π, TabularPolicy)
+    np.testing.assert_allclose(V, V_star, atol=1e-8)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from recorders import DEFAULT_DTYPE, DeltaRecorder, HistoryRecorder, MemmapRecorder, make_recorder
+
+
+def q_history(n_episodes, shape=(6, 3), seed=0):
+    """Q tables where a few entries change per episode, as in the tabular learners"""
+    rng = np.random.default_rng(seed)
+    Q, history = np.zeros(shape), []
+    for _ in range(n_episodes):
+        Q = Q.copy()
+        Q.flat[rng.integers(0, Q.size, 2)] += rng.normal(size=2)
+        history.append(Q)
+    return np.stack(history)
+
+
+@pytest.mark.parametrize("n_episodes, chunk_size", [(1, 4), (10, 4), (12, 4), (50, 7)])
+def test_delta_recorder_round_trip(n_episodes, chunk_size):
+    history = q_history(n_episodes)
+    recorder = DeltaRecorder(n_episodes, history.shape[1:], chunk_size=chunk_size)
+    for e, Q in enumerate(history):
+        recorder.record(e, Q)
+
+    assert len(recorder) == n_episodes
+    np.testing.assert_array_equal(np.asarray(recorder), history)  # compressed chunks + pending ones
+    for i in (0, n_episodes - 1, -1, n_episodes // 2):
+        np.testing.assert_array_equal(recorder[i], history[i])
+    with pytest.raises(IndexError):
+        recorder[n_episodes]
+
+
+def test_delta_recorder_strided_and_float32():
+    history = q_history(25)
+    recorder = DeltaRecorder(25, history.shape[1:], np.float32, every=10, chunk_size=2)
+    for e, Q in enumerate(history):
+        recorder.record(e, Q)
+    np.testing.assert_array_equal(recorder.episodes, [0, 10, 20, 24])
+    np.testing.assert_array_equal(np.asarray(recorder), history[[0, 10, 20, 24]].astype(np.float32))
+
+
+def test_history_recorder_strided_keeps_last_episode():
+    history = q_history(7)
+    recorder = HistoryRecorder(7, history.shape[1:], every=3)
+    for e, Q in enumerate(history):
+        recorder.record(e, Q)
+    np.testing.assert_array_equal(np.asarray(recorder), history[[0, 3, 6]])
+
+
+@pytest.mark.parametrize("history", ["full", {"kind": "delta"}, {"kind": "memmap"}])
+def test_same_default_dtype_for_every_kind(history, tmp_path):
+    if history == {"kind": "memmap"}: history = {**history, "directory": tmp_path}
+    assert make_recorder(history, 5, (4, 2)).dtype == DEFAULT_DTYPE
+    assert make_recorder(history, 5, (4, 2), np.float32).dtype == np.float32
+
+
+def test_memmap_recorder(tmp_path):
+    history = q_history(5)
+    recorder = make_recorder({"kind": "memmap", "directory": tmp_path}, 5, history.shape[1:], name="sarsa_Q_track")
+    assert isinstance(recorder, MemmapRecorder)
+    for e, Q in enumerate(history):
+        recorder.record(e, Q)
+    recorder.close()
+    np.testing.assert_array_equal(np.load(tmp_path / "sarsa_Q_track.npy"), history)
+
+
+def test_memmap_files_do_not_collide(tmp_path):
+    """2 algorithms, and 2 runs of the same algorithm with a prefix, in the same directory"""
+    spec = {"kind": "memmap", "directory": tmp_path}
+    names = [(spec, "sarsa_Q_track"), (spec, "q_learning_Q_track"), ({**spec, "prefix": "run2"}, "sarsa_Q_track")]
+    for value, (history, name) in enumerate(names):
+        recorder = make_recorder(history, 1, (2,), name=name)
+        recorder.record(0, np.full(2, value))
+        recorder.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "q_learning_Q_track.npy", "run2_sarsa_Q_track.npy", "sarsa_Q_track.npy"]
+    np.testing.assert_array_equal(np.load(tmp_path / "sarsa_Q_track.npy"), [[0, 0]])
+
+
+def test_make_recorder_dtype_only_for_values():
+    π_track = make_recorder({"kind": "delta", "dtype": "float32"}, 5, (4,), np.uint8)
+    Q_track = make_recorder({"kind": "delta", "dtype": "float32"}, 5, (4, 2))
+    assert π_track.dtype == np.uint8 and Q_track.dtype == np.float32
+    with pytest.raises(ValueError):
+        make_recorder("unknown", 5, (4,))
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import utils
+
+
+class RandomWalk():
+    """
+    Random walk of Sutton & Barto (example 6.2): states 0..6, start in 3, 0 and 6 are terminal, +1
+    when reaching 6. The walk ignores the action. Old gym API, seeded by its own generator.
+    """
+    def __init__(self, seed=0, n_states=7):
+        self.rng = np.random.default_rng(seed)
+        self.n_states = n_states
+        self.observation_space = SimpleNamespace(n=n_states)
+        self.action_space = SimpleNamespace(n=2)
+
+    def reset(self):
+        self.state = self.n_states // 2
+        return self.state
+
+    def step(self, action):
+        self.state += 1 if self.rng.random() < 0.5 else -1
+        done = self.state in (0, self.n_states - 1)
+        return self.state, float(self.state == self.n_states - 1), done, {}
+
+    def close(self):
+        pass
+
+
+def reference_n_step_td(π, env, gamma, lrs, n_step, n_episodes):
+    """n-step TD prediction as written in Sutton & Barto (section 7.1), with the full lists of S and R"""
+    V = np.zeros(env.observation_space.n)
+    for e in range(n_episodes):
+        S, R, T, t = [env.reset()], [0.], np.inf, 0
+        while True:
+            if t < T:
+                next_state, reward, done, _ = env.step(π(S[t]))
+                S.append(next_state); R.append(reward)
+                if done: T = t + 1
+            τ = t - n_step + 1
+            if τ >= 0:
+                G = sum(gamma ** (i - τ - 1) * R[i] for i in range(τ + 1, min(τ + n_step, T) + 1))
+                if τ + n_step < T: G += gamma ** n_step * V[S[τ + n_step]]
+                V[S[τ]] += lrs[e] * (G - V[S[τ]])
+            if τ == T - 1: break
+            t += 1
+    return V
+
+
+π = lambda s: 0
+SCHEDULE = dict(init_lr=0.5, min_lr=0.01, lr_decay_ratio=0.5)
+
+
+@pytest.mark.parametrize("n_step", [1, 2, 3, 5])
+@pytest.mark.parametrize("gamma", [1., 0.9])
+def test_n_step_td_matches_reference(sample_based, n_step, gamma):
+    n_episodes = 100
+    lrs = utils.decay_schedule(SCHEDULE["init_lr"], SCHEDULE["min_lr"], SCHEDULE["lr_decay_ratio"], n_episodes)
+    V_ref = reference_n_step_td(π, RandomWalk(seed=1), gamma, lrs, n_step, n_episodes)
+
+    V, V_track = sample_based.n_step_td_learning(π, RandomWalk(seed=1), gamma, n_step=n_step,
+                                                 n_episodes=n_episodes, **SCHEDULE)
+    np.testing.assert_allclose(V, V_ref, atol=1e-12)
+    np.testing.assert_allclose(np.asarray(V_track)[-1], V)
+
+
+def test_one_step_td_is_temporal_difference(sample_based):
+    V_td, _ = sample_based.temporal_difference(π, RandomWalk(seed=2), 0.9, n_episodes=50, **SCHEDULE)
+    V_n, _ = sample_based.n_step_td_learning(π, RandomWalk(seed=2), 0.9, n_step=1, n_episodes=50, **SCHEDULE)
+    np.testing.assert_allclose(V_n, V_td, atol=1e-12)
+
+
+@pytest.mark.parametrize("n_step", [1, 3])
+def test_batched_n_step_td_matches_reference(sample_based, n_step):
+    """Every seed of the batch follows the single env algorithm on its own env"""
+    seeds, n_episodes = (3, 4, 5), 60
+    lrs = utils.decay_schedule(SCHEDULE["init_lr"], SCHEDULE["min_lr"], SCHEDULE["lr_decay_ratio"], n_episodes)
+    make_envs = iter([RandomWalk(seed) for seed in seeds])
+    envs = utils.GymEnvBatch(lambda: next(make_envs), len(seeds))
+
+    V, _ = sample_based.batched_n_step_td_learning(π, envs, 0.9, n_step=n_step, n_episodes=n_episodes, **SCHEDULE)
+    for b, seed in enumerate(seeds):
+        V_ref = reference_n_step_td(π, RandomWalk(seed), 0.9, lrs, n_step, n_episodes)
+        np.testing.assert_allclose(V[b], V_ref, atol=1e-12)
+
+
+class SlipperyChain(RandomWalk):
+    """The random walk with actions: 1 goes right and 0 left, except with probability `slip`"""
+    def __init__(self, seed=0, n_states=7, slip=0.2):
+        super().__init__(seed, n_states)
+        self.slip = slip
+
+    def step(self, action):
+        direction = 1 if action == 1 else -1
+        self.state += -direction if self.rng.random() < self.slip else direction
+        done = self.state in (0, self.n_states - 1)
+        return self.state, float(self.state == self.n_states - 1), done, {}
+
+
+def test_epsilon_greedy_rows_is_the_batch_selection():
+    Q, states = np.random.default_rng(0).normal(size=(4, 6, 3)), np.array([5, 0, 2, 2])
+    actions_batch = utils.epsilon_greedy_batch(Q, states, 0.3, np.random.default_rng(1))
+    actions_rows = utils.epsilon_greedy_rows(Q[np.arange(4), states], 0.3, np.random.default_rng(1))
+    np.testing.assert_array_equal(actions_rows, actions_batch)
+
+
+@pytest.mark.parametrize("learner", ["batched_sarsa", "batched_q_learning", "batched_double_q_learning"])
+def test_batched_control_learns_to_go_right(sample_based, learner):
+    """The seeds finish their episodes at different steps, each one learns the optimal policy"""
+    seeds = (0, 1, 2)
+    make_envs = iter([SlipperyChain(seed) for seed in seeds])
+    envs = utils.GymEnvBatch(lambda: next(make_envs), len(seeds))
+    Q, V, policies, Q_track, π_track = getattr(sample_based, learner)(envs, gamma=0.9, n_episodes=300, seed=0)
+
+    assert Q.shape == (3, 7, 2) and V.shape == (3, 7) and np.asarray(Q_track).shape == (300, 3, 7, 2)
+    for π in policies:
+        assert all(π(s) == 1 for s in range(1, 6))
+    np.testing.assert_array_equal(np.asarray(π_track)[-1], np.argmax(Q, axis=2))
+    np.testing.assert_array_equal(Q[:, [0, 6]], 0.)  # terminal states are never updated
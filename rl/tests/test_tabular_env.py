@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from mdp import make_gridworld, make_random_mdp
+from tabular_env import VectorizedTabularEnv, build_alias_tables
+from utils import TabularPolicy
+
+
+def alias_probabilities(threshold, alias):
+    """Exact probability of each column of the alias tables: P(column) = (threshold + alias mass) / K"""
+    n_rows, K = threshold.shape
+    probs = threshold / K
+    for r in range(n_rows):
+        np.add.at(probs[r], alias[r], (1 - threshold[r]) / K)
+    return probs
+
+
+def test_alias_tables_are_exact():
+    rng = np.random.default_rng(0)
+    counts = np.array([1, 2, 5, 3, 5, 1])
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    probs = np.concatenate([rng.dirichlet(np.ones(c)) for c in counts])
+    probs[indptr[2]:indptr[3]] = [0.5, 0.5, 0., 0., 0.]  # zero probabilities are never sampled
+
+    threshold, alias = build_alias_tables(indptr, probs)
+    expected = np.zeros(threshold.shape)
+    expected[np.arange(threshold.shape[1]) < counts[:, None]] = probs
+    np.testing.assert_allclose(alias_probabilities(threshold, alias), expected, atol=1e-12)
+
+
+def test_sampled_frequencies_match_probs():
+    mdp = make_random_mdp(4, 2, branching=5, seed=3)
+    env = VectorizedTabularEnv(mdp, n_envs=1, seed=0)
+    n = 200_000
+    for row in range(mdp.nS * mdp.nA):
+        transitions = env.sample_transitions(np.full(n, row))
+        first, last = mdp.indptr[row], mdp.indptr[row + 1]
+        frequencies = np.bincount(transitions - first, minlength=last - first) / n
+        # 5 standard deviations of a binomial frequency
+        tolerance = 5 * np.sqrt(mdp.probs[first:last] * (1 - mdp.probs[first:last]) / n)
+        assert np.all(np.abs(frequencies - mdp.probs[first:last]) <= tolerance + 1e-12)
+
+
+def test_step_autoreset_and_truncation():
+    grid = make_gridworld(2, 2, slip_prob=0.)
+    env = VectorizedTabularEnv(grid, n_envs=3, initial_states=0, max_steps=2, seed=0)
+    states = env.reset()
+    np.testing.assert_array_equal(states, 0)
+
+    # right then down: the goal (3) is reached at the 2nd step, terminal before the time limit
+    next_states, rewards, terminals, truncated = env.step(np.array([2, 0, 2]))
+    np.testing.assert_array_equal(next_states, [1, 0, 1])
+    next_states, rewards, terminals, truncated = env.step(np.array([1, 0, 3]))
+    np.testing.assert_array_equal(next_states, [3, 0, 1])
+    np.testing.assert_array_equal(terminals, [True, False, False])
+    np.testing.assert_array_equal(truncated, [False, True, True])
+    assert rewards[0] == 1.
+    np.testing.assert_array_equal(env.states, 0)  # every episode ended, all restarted
+
+
+def test_estimate_returns_matches_policy_values():
+    grid = make_gridworld(3, 3)
+    π = TabularPolicy(np.full(grid.nS, 2))
+    T_π, R_π = grid.policy_model(π)
+    V_π = np.linalg.solve(np.eye(grid.nS) - 0.9 * T_π.toarray(), R_π)
+
+    env = VectorizedTabularEnv(grid, n_envs=20_000, initial_states=0, seed=0)
+    _, returns = env.estimate_returns(π, gamma=0.9)
+    assert returns.mean() == pytest.approx(V_π[0], abs=5 * returns.std() / np.sqrt(len(returns)))
+
+
+# the initial state distribution attribute of gym >= 0.21 toy text envs, and of the older ones
+@pytest.mark.parametrize("attribute", ["initial_state_distrib", "isd"])
+def test_from_env_initial_distribution(attribute):
+    P = {0: {0: [(1., 1, 0., False)]}, 1: {0: [(1., 1, 1., True)]}}
+    env = SimpleNamespace(unwrapped=SimpleNamespace(P=P, **{attribute: np.array([0., 1.])}))
+    vectorized = VectorizedTabularEnv.from_env(env, n_envs=4, seed=0)
+    np.testing.assert_array_equal(vectorized.reset(), 1)
+
+
+def test_from_env_without_initial_distribution():
+    env = SimpleNamespace(unwrapped=SimpleNamespace(P={0: {0: [(1., 0, 0., True)]}}))
+    with pytest.raises(ValueError, match="initial_state_distrib"):
+        VectorizedTabularEnv.from_env(env, n_envs=1)
@@ -1,4 +1,4 @@
-from itertools import count
+from pathlib import Path
 
 import numpy as np
 
@@ -40,6 +40,22 @@ def epsilon_greedy(state, Q, eps):
         return np.random.randint(len(Q[state]))
 
 
+def epsilon_greedy_batch(Q, states, eps, rng):
+    """
+    Epsilon greedy actions of n seeds at once: Q [n, nS, nA], states [n], eps a float or [n].
+    The greedy action is the first argmax, as in epsilon_greedy.
+    """
+    return epsilon_greedy_rows(Q[np.arange(len(states)), states], eps, rng)
+
+
+def epsilon_greedy_rows(Q_rows, eps, rng):
+    """Epsilon greedy actions from the Q rows of the current states [n, nA] (e.g. of a few seeds)"""
+    n, nA = Q_rows.shape
+    greedy = np.argmax(Q_rows, axis=1)
+    explore = rng.random(n) <= eps
+    return np.where(explore, rng.integers(nA, size=n), greedy)
+
+
 def decay_schedule(init_value, min_value, decay_ratio, max_steps, log_start=-2, log_base=10):
     """Learning rate decay algorithm for learning"""
     decay_steps = int(max_steps * decay_ratio)
@@ -52,25 +68,141 @@ def decay_schedule(init_value, min_value, decay_ratio, max_steps, log_start=-2,
     return values
 
 
-def generate_trajectory(Q, eps, env, max_steps=200):
-    """Generate set of experience tuple for 1 episode"""
-    done, trajectory = False, []
-    
-    while not done:
-        state = env.reset()
+class TabularPolicy():
+    """
+    Deterministic policy of a tabular MDP: the greedy action of every state, stored once in an int
+    array [nS]. Lookups are O(1) and vectorized:
+        π(s) or π[s] -> int action of the state s
+        π(states)    -> array of actions of an array of states
+    It also compares equal to another TabularPolicy, an array or a {s: a} dict with the same
+    actions, and is saved as a .npy file.
+    """
+    __slots__ = ("actions",)
+
+    def __init__(self, actions):
+        self.actions = np.asarray(actions, dtype=np.int64)
+
+    @classmethod
+    def from_Q(cls, Q):
+        """Greedy policy of an action-value function Q [nS, nA]"""
+        return cls(np.argmax(Q, axis=1))
+
+    @classmethod
+    def from_dict(cls, π):
+        return cls(np.fromiter((π[s] for s in range(len(π))), dtype=np.int64, count=len(π)))
+
+    def __call__(self, s):
+        a = self.actions[s]
+        return int(a) if np.ndim(a) == 0 else a
+
+    __getitem__ = __call__
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __array__(self, dtype=None):
+        return self.actions if dtype is None else self.actions.astype(dtype)
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            other = TabularPolicy.from_dict(other)
+        return np.array_equal(self.actions, np.asarray(other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"TabularPolicy({self.actions.tolist()})"
+
+    def to_dict(self):
+        return dict(enumerate(self.actions.tolist()))
+
+    def save(self, filepath):
+        np.save(Path(filepath), self.actions)
+
+    @classmethod
+    def load(cls, filepath):
+        return cls(np.load(Path(filepath)))
+
+
+class GymEnvBatch():
+    """
+    n copies of a gym env stepped in lockstep, for the multi-seed (batched) learners. The copies
+    are seeded with `seeds` on their first reset. Works with the gym >= 0.26 API and the old one
+    (gym_walk envs: reset() -> state, step() -> 4-tuple).
+
+    step(actions, active) only steps the envs of the boolean mask `active` (the episodes still
+    running), the inactive ones keep their last state.
+    """
+
+    def __init__(self, env_fn, n_envs, seeds=None):
+        self.envs = [env_fn() for _ in range(n_envs)]
+        self.n_envs = n_envs
+        self.seeds = list(seeds) if seeds is not None else [None] * n_envs
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.states = np.zeros(n_envs, dtype=np.int64)
+        self._seeded = False
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            seed = None if self._seeded else self.seeds[i]
+            try:
+                out = env.reset(seed=seed)
+            except TypeError:  # old API, no seed argument
+                if seed is not None: env.seed(seed)
+                out = env.reset()
+            self.states[i] = out[0] if isinstance(out, tuple) else out
+        self._seeded = True
+        return self.states.copy()
+
+    def step(self, actions, active=None):
+        """Return next_states, rewards, terminals (no bootstrap) and truncated, arrays of [n]"""
+        rewards = np.zeros(self.n_envs)
+        terminals = np.zeros(self.n_envs, dtype=bool)
+        truncated = np.zeros(self.n_envs, dtype=bool)
+        indices = range(self.n_envs) if active is None else np.flatnonzero(active)
+
+        for i in indices:
+            out = self.envs[i].step(actions[i])
+            if len(out) == 5:
+                self.states[i], rewards[i], terminals[i], truncated[i], _ = out
+            else:
+                self.states[i], rewards[i], done, info = out
+                truncated[i] = done and info.get("TimeLimit.truncated", False)
+                terminals[i] = done and not truncated[i]
+        return self.states.copy(), rewards, terminals, truncated
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+# one step of a trajectory, `done` is False on the last step of a truncated episode
+TRAJECTORY_DTYPE = np.dtype([
+    ("state", np.int64), ("action", np.int64), ("reward", np.float64), ("next_state", np.int64), ("done", np.bool_)])
 
-        for t in count():  # equivalent of a while True : t+=1
-            action = epsilon_greedy(state, Q, eps)
-            next_state, reward, done, _ = env.step(action)
 
-            experience = (state, action, reward, next_state, done)
-            trajectory.append(experience)
-
-            if done: break
-
-            if t >= max_steps - 1: # No trajectory generated in the required window so we RETRY.
-                trajectory = []
-                break
-
-            state = next_state
-    return np.array(trajectory, np.object)
\ No newline at end of file
+def generate_trajectory(Q, eps, env, max_steps=200):
+    """
+    Set of experience tuple for 1 episode, as a structured array of TRAJECTORY_DTYPE (trajectory["reward"]
+    is a float array...). An episode still running after max_steps is truncated, not retried.
+    """
+    trajectory = np.empty(max_steps, dtype=TRAJECTORY_DTYPE)
+    state = env.reset()
+    state = state[0] if isinstance(state, tuple) else state  # gym >= 0.26: (state, info)
+
+    for t in range(max_steps):
+        action = epsilon_greedy(state, Q, eps)
+        out = env.step(action)
+        if len(out) == 5:
+            next_state, reward, done, truncated, _ = out
+        else:
+            next_state, reward, ended, info = out
+            truncated = ended and info.get("TimeLimit.truncated", False)
+            done = ended and not truncated
+
+        trajectory[t] = (state, action, reward, next_state, done)  # a truncation is not terminal
+        if done or truncated:
+            return trajectory[:t + 1]
+        state = next_state
+    return trajectory
\ No newline at end of file